@@ -4,9 +4,17 @@ import datetime
 import csv
 import traceback
 import logging
+import math
+import io
+import json
+import time
+import uuid
+import zipfile
+from concurrent.futures import ThreadPoolExecutor
 
-from flask import Flask, request, jsonify
+from flask import Flask, Response, g, request, jsonify, stream_with_context
 from flask_cors import CORS
+from werkzeug.datastructures import FileStorage
 from werkzeug.utils import secure_filename
 from werkzeug.exceptions import RequestEntityTooLarge
 
@@ -20,6 +28,8 @@ IMAGES_DIR_DEFAULT = os.path.join(PROJECT_ROOT, "images")
 LOG_CSV = os.path.join(PROJECT_ROOT, "predictions_log.csv")
 DB_PATH = os.path.join(PROJECT_ROOT, "predictions.db")
 
+VIDEO_EXT = (".mp4", ".avi", ".mov", ".mkv", ".webm")
+
 # App-level defaults (can be overridden via app.config)
 DEFAULTS = {
     "MIN_CONFIDENCE": 0.18,  # Lowered to 0.18 for ambiguous cases (was 0.20, originally 0.5)
@@ -28,21 +38,122 @@ DEFAULTS = {
     "IMAGES_DIR": IMAGES_DIR_DEFAULT,
     "ALLOWED_EXT": (".jpg", ".jpeg", ".png"),
     "CORS_ORIGINS": "*",  # Can be overridden for production
+    "ADMIN_TOKEN": os.environ.get("ADMIN_TOKEN"),  # Admin endpoints are disabled when unset
+    "MODEL_WATCH_INTERVAL": float(os.environ.get("MODEL_WATCH_INTERVAL", "0")),  # Seconds; 0 disables checkpoint watching
+    # Tiered inference (/detect?model=tiered): escalate to the ViT below these.
+    # Overridden by the file written by scripts/calibrate_cascade.py when present.
+    "CASCADE_MIN_CONFIDENCE": 0.6,
+    "CASCADE_MIN_MARGIN": 0.2,
+    "CASCADE_CALIBRATION_FILE": os.path.join(PROJECT_ROOT, "models", "cascade_calibration.json"),
+    # Prediction cache: in-memory LRU entries (0 disables) and optional persistent directory
+    "PREDICTION_CACHE_SIZE": int(os.environ.get("PREDICTION_CACHE_SIZE", "512")),
+    "PREDICTION_CACHE_DIR": os.environ.get("PREDICTION_CACHE_DIR") or None,
+    # Shadow evaluation: score this variant ("fine-tuned", "fast") on sampled /detect traffic (unset = off)
+    "SHADOW_MODEL": os.environ.get("SHADOW_MODEL") or None,
+    "SHADOW_SAMPLE_RATE": float(os.environ.get("SHADOW_SAMPLE_RATE", "0.1")),
+    "SHADOW_QUEUE_SIZE": int(os.environ.get("SHADOW_QUEUE_SIZE", "32")),
+    # ViT inference precision: "fp32", "bf16" (falls back to fp32 on CPUs without AVX512-BF16/AMX) or "int8"
+    "VIT_PRECISION": os.environ.get("VIT_PRECISION", "fp32"),
+    # torch intra-op threads per worker (0 = torch default); set by scripts/calibrate_serving.py
+    "TORCH_NUM_THREADS": int(os.environ.get("TORCH_NUM_THREADS", "0")),
+    # Per-model inference executors: concurrent forwards per model. INFERENCE_EXECUTORS overrides
+    # per variant, e.g. {"base": {"workers": 2}}. Keras models always get 1 worker.
+    # torch's intra-op pool is process-wide: INFERENCE_INTRA_OP_THREADS sets it once at startup
+    # for every executor (0 = TORCH_NUM_THREADS / torch default).
+    "INFERENCE_WORKERS": int(os.environ.get("INFERENCE_WORKERS", "1")),
+    "INFERENCE_INTRA_OP_THREADS": int(os.environ.get("INFERENCE_INTRA_OP_THREADS", "0")),
+    "INFERENCE_EXECUTORS": {},
+    # Share of each model per priority lane when all lanes have queued work (weighted fair
+    # queuing; clients within a lane share equally), e.g. {"interactive": 8, "batch": 2, "shadow": 1}
+    "INFERENCE_LANE_WEIGHTS": {},
+    # /detect admission control: reject with 503 + Retry-After when predicted latency
+    # exceeds this (0 disables); concurrency defaults to the base model's inference workers
+    "ADMISSION_SLO_MS": float(os.environ.get("ADMISSION_SLO_MS", "10000")),
+    "ADMISSION_CONCURRENCY": int(os.environ.get("ADMISSION_CONCURRENCY", "0")),
+    # /detect image storage + prediction logging: "async" runs them after the response on a
+    # bounded background queue (full queue = run inline), "sync" before it; failed steps are retried
+    "SIDE_EFFECTS_MODE": os.environ.get("SIDE_EFFECTS_MODE", "async"),
+    "SIDE_EFFECTS_QUEUE_SIZE": int(os.environ.get("SIDE_EFFECTS_QUEUE_SIZE", "256")),
+    "SIDE_EFFECTS_RETRIES": int(os.environ.get("SIDE_EFFECTS_RETRIES", "3")),
+    # Quality profiles (?profile= or X-Quality-Profile: fast|balanced|accurate|...): per-profile
+    # overrides of the built-ins in app/quality_profiles.py, plus an optional JSON file of the same shape
+    "QUALITY_PROFILES": {},
+    "QUALITY_PROFILES_FILE": os.environ.get("QUALITY_PROFILES_FILE") or None,
+    "QUALITY_PROFILE_DEFAULT": os.environ.get("QUALITY_PROFILE_DEFAULT", "balanced"),
+    # Router mode: N inference worker processes (each pinned to a share of the cores) serve
+    # all models over Unix sockets; this process keeps HTTP, face detection and the DB (0 = off).
+    # SPAWN=0 connects to workers started with `python -m app.inference_worker --workers N`.
+    "INFERENCE_ROUTER_WORKERS": int(os.environ.get("INFERENCE_ROUTER_WORKERS", "0")),
+    "INFERENCE_ROUTER_SOCKET_DIR": os.environ.get("INFERENCE_ROUTER_SOCKET_DIR", "/tmp/emotion-router"),
+    "INFERENCE_ROUTER_SPAWN": os.environ.get("INFERENCE_ROUTER_SPAWN", "1") not in ("0", "false", "False"),
+    # Per-request timeout: base + per crop (doubled with tta). Timeouts fail the request only;
+    # worker health comes from the pings
+    "INFERENCE_ROUTER_TIMEOUT_S": float(os.environ.get("INFERENCE_ROUTER_TIMEOUT_S", "30")),
+    "INFERENCE_ROUTER_TIMEOUT_PER_IMAGE_S": float(os.environ.get("INFERENCE_ROUTER_TIMEOUT_PER_IMAGE_S", "1")),
+    # ASGI mode (uvicorn asgi:app): threads running /detect* views and all other views;
+    # connections and request bodies are handled on the event loop without a thread
+    "ASGI_INFERENCE_THREADS": int(os.environ.get("ASGI_INFERENCE_THREADS", "32")),
+    "ASGI_IO_THREADS": int(os.environ.get("ASGI_IO_THREADS", "16")),
+    # Request bodies larger than this are spooled to a temp file instead of held in memory
+    "ASGI_BODY_SPOOL_BYTES": int(os.environ.get("ASGI_BODY_SPOOL_BYTES", str(1024 * 1024))),
+    # Write-behind prediction logging: batch rows into one transaction every N rows or M ms
+    # (0 = insert and commit each row on its own)
+    "DB_WRITE_BEHIND": os.environ.get("DB_WRITE_BEHIND", "1") not in ("0", "false", "False"),
+    "DB_WRITE_BATCH_ROWS": int(os.environ.get("DB_WRITE_BATCH_ROWS", "64")),
+    "DB_WRITE_FLUSH_MS": float(os.environ.get("DB_WRITE_FLUSH_MS", "200")),
+    "DB_WRITE_QUEUE_SIZE": int(os.environ.get("DB_WRITE_QUEUE_SIZE", "4096")),
+    # Face preprocessing in worker processes (0 = in the request thread)
+    "PREPROCESS_WORKERS": int(os.environ.get("PREPROCESS_WORKERS", "0")),
+    # /detect/batch: images accepted per request and threads decoding / detecting faces
+    "BATCH_MAX_IMAGES": int(os.environ.get("BATCH_MAX_IMAGES", "32")),
+    "BATCH_PREPROCESS_WORKERS": int(os.environ.get("BATCH_PREPROCESS_WORKERS", "4")),
+    # Offline jobs (/jobs): worker threads (0 disables), images per batched forward,
+    # extraction directory, server-side folder jobs may read (unset = uploads only),
+    # seconds a job waits for a reloading model before failing
+    "JOBS_WORKERS": int(os.environ.get("JOBS_WORKERS", "1")),
+    "JOBS_BATCH_SIZE": int(os.environ.get("JOBS_BATCH_SIZE", "16")),
+    "JOBS_DIR": os.environ.get("JOBS_DIR", os.path.join(PROJECT_ROOT, "jobs")),
+    "JOBS_INPUT_ROOT": os.environ.get("JOBS_INPUT_ROOT") or None,
+    "JOBS_MAX_IMAGES": int(os.environ.get("JOBS_MAX_IMAGES", "100000")),
+    "JOBS_MAX_UPLOAD_SIZE": int(os.environ.get("JOBS_MAX_UPLOAD_MB", "500")) * 1024 * 1024,
+    "JOBS_MODEL_WAIT": float(os.environ.get("JOBS_MODEL_WAIT", "600")),
+    # /detect/stream: fraction of streamed frames stored and logged like /detect (0 = none)
+    "STREAM_LOG_SAMPLE_RATE": float(os.environ.get("STREAM_LOG_SAMPLE_RATE", "0")),
+    # Motion gating: reuse the last result while the frame changes less than this
+    # (mean abs difference of a 32x32 grayscale thumbnail, 0..1; 0 disables), for at most N seconds
+    "STREAM_MOTION_THRESHOLD": float(os.environ.get("STREAM_MOTION_THRESHOLD", "0.02")),
+    "STREAM_MOTION_MAX_REUSE_S": float(os.environ.get("STREAM_MOTION_MAX_REUSE_S", "5")),
+    # /detect/video: analyse every Nth frame, crops per batched forward, cap on
+    # analysed frames per request (longer videos are truncated) and upload size
+    "VIDEO_FRAME_STRIDE": int(os.environ.get("VIDEO_FRAME_STRIDE", "5")),
+    "VIDEO_BATCH_SIZE": int(os.environ.get("VIDEO_BATCH_SIZE", "16")),
+    "VIDEO_MAX_SAMPLED_FRAMES": int(os.environ.get("VIDEO_MAX_SAMPLED_FRAMES", "1800")),
+    "VIDEO_MAX_SIZE": int(os.environ.get("VIDEO_MAX_MB", "200")) * 1024 * 1024,
+    # Default token-merging ratio per ViT variant (0 = off); ?merge_ratio= overrides per request
+    "TOKEN_MERGE_RATIOS": {
+        "base": float(os.environ.get("TOKEN_MERGE_RATIO_BASE", "0")),
+        "fine-tuned": float(os.environ.get("TOKEN_MERGE_RATIO_FINETUNED", "0")),
+    },
 }
 
-# Ensure directories exist
-os.makedirs(DEFAULTS["TMP_DIR"], exist_ok=True)
-os.makedirs(DEFAULTS["IMAGES_DIR"], exist_ok=True)
 
-# Ensure CSV header exists (helpful for older logs)
-if not os.path.exists(LOG_CSV):
-    try:
-        with open(LOG_CSV, "w", newline="", encoding="utf-8") as f:
-            writer = csv.writer(f)
-            writer.writerow(["timestamp", "filename", "emotion", "confidence"])
-    except Exception:
-        # Non-fatal — keep module import light.
-        pass
+def _ensure_runtime_files():
+    """
+    Create the default directories and the CSV header. Called from create_app,
+    not at import: spawned preprocess workers import this package too.
+    """
+    os.makedirs(DEFAULTS["TMP_DIR"], exist_ok=True)
+    os.makedirs(DEFAULTS["IMAGES_DIR"], exist_ok=True)
+
+    # Ensure CSV header exists (helpful for older logs)
+    if not os.path.exists(LOG_CSV):
+        try:
+            with open(LOG_CSV, "w", newline="", encoding="utf-8") as f:
+                writer = csv.writer(f)
+                writer.writerow(["timestamp", "filename", "emotion", "confidence"])
+        except Exception:
+            # Non-fatal
+            pass
 
 
 # ----------------------------
@@ -58,6 +169,7 @@ def create_app(config: dict | None = None):
     cfg = DEFAULTS.copy()
     if config:
         cfg.update(config)
+    _ensure_runtime_files()
 
     app = Flask(__name__)
     
@@ -104,18 +216,37 @@ def create_app(config: dict | None = None):
     app.config["IMAGES_DIR"] = cfg.get("IMAGES_DIR", DEFAULTS["IMAGES_DIR"])
     app.config["ALLOWED_EXT"] = cfg["ALLOWED_EXT"]
     app.config["MIN_CONFIDENCE"] = cfg["MIN_CONFIDENCE"]
-    
+    app.config["ADMIN_TOKEN"] = cfg.get("ADMIN_TOKEN")
+    app.config["TOKEN_MERGE_RATIOS"] = cfg.get("TOKEN_MERGE_RATIOS", DEFAULTS["TOKEN_MERGE_RATIOS"])
+    app.config["BATCH_MAX_IMAGES"] = cfg.get("BATCH_MAX_IMAGES", DEFAULTS["BATCH_MAX_IMAGES"])
+    app.config["JOBS_MAX_UPLOAD_SIZE"] = cfg.get("JOBS_MAX_UPLOAD_SIZE", DEFAULTS["JOBS_MAX_UPLOAD_SIZE"])
 
     # Ensure tmp directory exists (again, per app)
     os.makedirs(app.config["TMP_DIR"], exist_ok=True)
 
     # Local (deferred) imports — avoid import-time side effects
     from .model_loader import load_emotion_model
-    from .db_logger import init_db, log_prediction, get_metrics, tail_rows, get_total_count, delete_prediction
+    from .db_logger import init_db, PredictionLogWriter, log_prediction, log_predictions, get_metrics, tail_rows, get_total_count, delete_prediction, get_shadow_summary, get_job, iter_job_results
     from .utils import preprocess_face
-    from .image_storage import save_image, get_image_path, ensure_images_dir
-    from .validators import validate_image_file, validate_pagination_params, validate_confidence_range
-    from .rate_limiter import detect_limiter, logs_limiter, images_limiter, get_client_identifier
+    from .image_storage import save_image, move_image, discard_file, generate_unique_filename, get_image_path, ensure_images_dir
+    from .validators import validate_image_file, validate_pagination_params, validate_confidence_range, validate_date_range
+    from .rate_limiter import detect_limiter, logs_limiter, images_limiter, batch_limiter, jobs_limiter, get_client_identifier
+    from .model_registry import ModelHandle, ModelSlot, ModelWatcher, unpack_model_result
+    from .inference import predict_face, predict_faces, cascade_predict, compare_predict, load_cascade_thresholds, CascadeStats
+    from .token_merging import validate_merge_ratio
+    from .prediction_cache import PredictionCache, hash_file, make_cache_key
+    from .shadow import ShadowEvaluator
+    from .jobs import JobRunner, JobError
+    from .streaming import StreamSession, StreamStats
+    from .video import MIN_SEGMENT_SECONDS, analyze_video
+    try:
+        from flask_sock import Sock, ConnectionClosed
+    except ImportError:
+        Sock = None
+    from .inference_executor import InferenceExecutor, inference_priority
+    from .admission import AdmissionController
+    from .side_effects import SideEffectQueue
+    from .quality_profiles import load_quality_profiles, preprocess_options
 
     # Initialize DB
     try:
@@ -124,6 +255,40 @@ def create_app(config: dict | None = None):
     except Exception:
         app.logger.exception("Failed to initialize DB at startup")
 
+    # Process-wide setting shared by every executor thread
+    torch_threads = cfg.get("INFERENCE_INTRA_OP_THREADS", 0) or cfg.get("TORCH_NUM_THREADS", 0) or 0
+    if torch_threads > 0:
+        try:
+            import torch
+            torch.set_num_threads(torch_threads)
+            print(f"[APP] torch intra-op threads: {torch_threads}")
+        except ImportError:
+            pass
+
+    # Pick the ViT precision once per process; unsupported bf16 falls back to fp32
+    from .hardware import resolve_precision
+    vit_precision, precision_reason = resolve_precision(cfg.get("VIT_PRECISION", DEFAULTS["VIT_PRECISION"]))
+    if vit_precision != str(cfg.get("VIT_PRECISION", "fp32")).lower():
+        app.logger.warning("VIT_PRECISION=%s not available (%s); using fp32", cfg.get("VIT_PRECISION"), precision_reason)
+    app.config["VIT_PRECISION"] = vit_precision
+    print(f"[APP] ViT precision: {vit_precision}")
+
+    # Router mode: models live in N inference worker processes; the slots below hold
+    # RemoteModel handles and load_emotion_model only describes / reloads worker variants
+    router = None
+    if cfg.get("INFERENCE_ROUTER_WORKERS", DEFAULTS["INFERENCE_ROUTER_WORKERS"]) > 0:
+        from .inference_router import InferenceRouter
+        router = InferenceRouter(
+            cfg["INFERENCE_ROUTER_WORKERS"],
+            cfg.get("INFERENCE_ROUTER_SOCKET_DIR", DEFAULTS["INFERENCE_ROUTER_SOCKET_DIR"]),
+            spawn=cfg.get("INFERENCE_ROUTER_SPAWN", DEFAULTS["INFERENCE_ROUTER_SPAWN"]),
+            precision=vit_precision,
+            timeout=cfg.get("INFERENCE_ROUTER_TIMEOUT_S", DEFAULTS["INFERENCE_ROUTER_TIMEOUT_S"]),
+            timeout_per_image=cfg.get("INFERENCE_ROUTER_TIMEOUT_PER_IMAGE_S", DEFAULTS["INFERENCE_ROUTER_TIMEOUT_PER_IMAGE_S"]),
+        ).start()
+        load_emotion_model = router.load_variant
+    app.config["INFERENCE_ROUTER"] = router
+
     # Load model & labels. Keep these local to the factory (no module-level side effects).
     # We'll load models on-demand based on request parameter
     base_model = None
@@ -138,25 +303,9 @@ def create_app(config: dict | None = None):
     # Load base model by default
     try:
         # load_emotion_model returns (model, labels, version, model_type)
-        res = load_emotion_model(force_model='base')
-        if isinstance(res, tuple) and len(res) == 4:
-            base_model, base_labels, base_model_version, base_model_type = res
-        elif isinstance(res, tuple) and len(res) == 3:
-            base_model, base_labels, base_model_version = res
-            base_model_type = "keras"  # Default for old format
-        elif isinstance(res, tuple) and len(res) == 2:
-            base_model, base_labels = res
-            base_model_type = "keras"  # Default for old format
-        else:
-            # Unexpected return shape - try to be permissive
-            try:
-                base_model = res
-                base_labels = None
-                base_model_type = "keras"
-            except Exception:
-                base_model = None
-                base_labels = None
-                base_model_type = "unknown"
+        base_model, base_labels, base_model_version, base_model_type = unpack_model_result(
+            load_emotion_model(force_model='base', precision=vit_precision)
+        )
         app.logger.info("Base model loaded: %s (version=%s, type=%s)", bool(base_model), base_model_version, base_model_type)
         print(f"[APP] Base model loaded: type={base_model_type}, version={base_model_version}, labels={len(base_labels) if base_labels else 0}")
     except Exception as exc:
@@ -168,15 +317,11 @@ def create_app(config: dict | None = None):
     
     # Try to load fine-tuned model
     try:
-        res = load_emotion_model(force_model='fine-tuned')
-        if isinstance(res, tuple) and len(res) == 4:
-            finetuned_model, finetuned_labels, finetuned_model_version, finetuned_model_type = res
-        elif isinstance(res, tuple) and len(res) == 3:
-            finetuned_model, finetuned_labels, finetuned_model_version = res
-            finetuned_model_type = "keras"
-        elif isinstance(res, tuple) and len(res) == 2:
-            finetuned_model, finetuned_labels = res
-            finetuned_model_type = "keras"
+        # A delta-stored fine-tuned model shares the base model's tensors
+        finetuned_model, finetuned_labels, finetuned_model_version, finetuned_model_type = unpack_model_result(
+            load_emotion_model(force_model='fine-tuned', base_model=base_model if base_model_type == "vit" else None,
+                               precision=vit_precision)
+        )
         app.logger.info("Asripa model loaded: %s (version=%s, type=%s)", bool(finetuned_model), finetuned_model_version, finetuned_model_type)
         print(f"[APP] Asripa model loaded: type={finetuned_model_type}, version={finetuned_model_version}")
     except Exception as exc:
@@ -186,6 +331,20 @@ def create_app(config: dict | None = None):
         finetuned_model_version = "not-available"
         finetuned_model_type = "unknown"
 
+    # Try to load the distilled student ("fast" tier); optional
+    fast_model = None
+    fast_labels = None
+    fast_model_version = "not-available"
+    fast_model_type = "unknown"
+    try:
+        fast_model, fast_labels, fast_model_version, fast_model_type = unpack_model_result(
+            load_emotion_model(force_model='fast')
+        )
+        app.logger.info("Fast student model loaded (version=%s)", fast_model_version)
+        print(f"[APP] Fast student model loaded: version={fast_model_version}")
+    except Exception as exc:
+        app.logger.info("Fast student model not available: %s", exc)
+
     # Store in app.config - default to base model
     app.config["BASE_MODEL"] = base_model
     app.config["BASE_LABELS"] = base_labels
@@ -195,12 +354,225 @@ def create_app(config: dict | None = None):
     app.config["FINETUNED_LABELS"] = finetuned_labels
     app.config["FINETUNED_MODEL_VERSION"] = finetuned_model_version
     app.config["FINETUNED_MODEL_TYPE"] = finetuned_model_type
+    app.config["FAST_MODEL"] = fast_model
+    app.config["FAST_LABELS"] = fast_labels
+    app.config["FAST_MODEL_VERSION"] = fast_model_version
+    app.config["FAST_MODEL_TYPE"] = fast_model_type
     # Default to base model
     app.config["MODEL"] = base_model
     app.config["LABELS"] = base_labels
     app.config["MODEL_VERSION"] = base_model_version
     app.config["MODEL_TYPE"] = base_model_type
 
+    # Content-addressed prediction cache (keys include the model version; cleared on every swap)
+    prediction_cache = None
+    if cfg.get("PREDICTION_CACHE_SIZE", 0) > 0:
+        prediction_cache = PredictionCache(
+            max_entries=cfg["PREDICTION_CACHE_SIZE"],
+            disk_dir=cfg.get("PREDICTION_CACHE_DIR"),
+        )
+    app.config["PREDICTION_CACHE"] = prediction_cache
+
+    # Swappable handles used by /detect. Reloads update the app.config keys above
+    # so existing readers keep seeing the active model.
+    def _on_model_swap(name, handle):
+        prefix = {"base": "BASE", "fine-tuned": "FINETUNED", "fast": "FAST"}[name]
+        app.config[f"{prefix}_MODEL"] = handle.model
+        app.config[f"{prefix}_LABELS"] = handle.labels
+        app.config[f"{prefix}_MODEL_VERSION"] = handle.version
+        app.config[f"{prefix}_MODEL_TYPE"] = handle.model_type
+        if name == "base":
+            app.config["MODEL"] = handle.model
+            app.config["LABELS"] = handle.labels
+            app.config["MODEL_VERSION"] = handle.version
+            app.config["MODEL_TYPE"] = handle.model_type
+        if prediction_cache is not None:
+            prediction_cache.invalidate()
+        # A delta variant still points at the old base tensors; rebuild it on the new base
+        finetuned_slot = model_slots.get("fine-tuned")
+        if name == "base" and finetuned_slot is not None and finetuned_slot.current is not None \
+                and isinstance(finetuned_slot.current.model, dict) and finetuned_slot.current.model.get("delta"):
+            finetuned_slot.reload()
+
+    def _current_base_vit():
+        current = model_slots["base"].current
+        return current.model if current is not None and current.model_type == "vit" else None
+
+    model_slots = {
+        "base": ModelSlot(
+            "base",
+            lambda: load_emotion_model(force_model='base', precision=vit_precision),
+            ModelHandle(base_model, base_labels, base_model_version, base_model_type) if base_model is not None else None,
+            on_swap=_on_model_swap,
+        ),
+        "fine-tuned": ModelSlot(
+            "fine-tuned",
+            lambda: load_emotion_model(force_model='fine-tuned', base_model=_current_base_vit(), precision=vit_precision),
+            ModelHandle(finetuned_model, finetuned_labels, finetuned_model_version, finetuned_model_type) if finetuned_model is not None else None,
+            on_swap=_on_model_swap,
+        ),
+        "fast": ModelSlot(
+            "fast",
+            lambda: load_emotion_model(force_model='fast'),
+            ModelHandle(fast_model, fast_labels, fast_model_version, fast_model_type) if fast_model is not None else None,
+            on_swap=_on_model_swap,
+        ),
+    }
+    app.config["MODEL_SLOTS"] = model_slots
+
+    cascade_thresholds = load_cascade_thresholds(
+        cfg.get("CASCADE_CALIBRATION_FILE"),
+        cfg.get("CASCADE_MIN_CONFIDENCE", DEFAULTS["CASCADE_MIN_CONFIDENCE"]),
+        cfg.get("CASCADE_MIN_MARGIN", DEFAULTS["CASCADE_MIN_MARGIN"]),
+    )
+    app.config["CASCADE_THRESHOLDS"] = cascade_thresholds
+    cascade_stats = CascadeStats(cascade_thresholds.get("full_latency_ms"))
+    app.config["CASCADE_STATS"] = cascade_stats
+
+    # One executor per model variant; request threads submit forwards and wait on futures
+    executors = {}
+    for name, model_slot in model_slots.items():
+        overrides = (cfg.get("INFERENCE_EXECUTORS") or {}).get(name, {})
+        workers = overrides.get("workers", cfg.get("INFERENCE_WORKERS", DEFAULTS["INFERENCE_WORKERS"]))
+        if model_slot.current is not None and model_slot.current.model_type == "keras":
+            workers = 1  # Keras predict() is not guaranteed to be thread-safe
+        if router is not None:
+            workers = router.size  # front threads only wait on the workers' sockets
+        executors[name] = InferenceExecutor(
+            name,
+            workers=workers,
+            lane_weights=cfg.get("INFERENCE_LANE_WEIGHTS") or None,
+        )
+    app.config["MODEL_EXECUTORS"] = executors
+
+    admission = AdmissionController(
+        cfg.get("ADMISSION_SLO_MS", DEFAULTS["ADMISSION_SLO_MS"]),
+        concurrency=cfg.get("ADMISSION_CONCURRENCY", DEFAULTS["ADMISSION_CONCURRENCY"]) or executors["base"].workers,
+    )
+    app.config["ADMISSION"] = admission
+
+    # Optional process pool for decode + face detection; crops come back via shared memory
+    preprocess_pool = None
+    if cfg.get("PREPROCESS_WORKERS", DEFAULTS["PREPROCESS_WORKERS"]) > 0:
+        from .preprocess_pool import PreprocessPool
+        preprocess_pool = PreprocessPool(cfg["PREPROCESS_WORKERS"])
+        print(f"[APP] Face preprocessing in {preprocess_pool.workers} worker processes")
+    app.config["PREPROCESS_POOL"] = preprocess_pool
+
+    # Write-behind prediction log: rows are batched into one transaction per N rows / M ms
+    prediction_writer = None
+    if cfg.get("DB_WRITE_BEHIND", DEFAULTS["DB_WRITE_BEHIND"]):
+        prediction_writer = PredictionLogWriter(
+            DB_PATH,
+            batch_rows=cfg.get("DB_WRITE_BATCH_ROWS", DEFAULTS["DB_WRITE_BATCH_ROWS"]),
+            flush_ms=cfg.get("DB_WRITE_FLUSH_MS", DEFAULTS["DB_WRITE_FLUSH_MS"]),
+            queue_size=cfg.get("DB_WRITE_QUEUE_SIZE", DEFAULTS["DB_WRITE_QUEUE_SIZE"]),
+        )
+    app.config["PREDICTION_WRITER"] = prediction_writer
+
+    # Created after the writer: exit hooks run in reverse, so queued side effects reach the writer before it flushes
+    side_effects = SideEffectQueue(
+        cfg.get("SIDE_EFFECTS_MODE", DEFAULTS["SIDE_EFFECTS_MODE"]),
+        queue_size=cfg.get("SIDE_EFFECTS_QUEUE_SIZE", DEFAULTS["SIDE_EFFECTS_QUEUE_SIZE"]),
+        retries=cfg.get("SIDE_EFFECTS_RETRIES", DEFAULTS["SIDE_EFFECTS_RETRIES"]),
+    )
+    app.config["SIDE_EFFECTS"] = side_effects
+
+    def _record_prediction(tmp_path, used_filename, emotion, confidence):
+        """
+        Store the upload and log the prediction via the side-effect pipeline.
+        Returns (stored filename, correlation id of the prediction row).
+        """
+        images_dir = app.config.get("IMAGES_DIR", IMAGES_DIR_DEFAULT)
+        # Generated up front so the response and the DB row agree before the file lands
+        stored_filename = generate_unique_filename(used_filename)
+        # Unique pending name: tmp_path is per upload name and the next request may reuse it
+        pending_path = os.path.join(os.path.dirname(tmp_path), f".pending_{stored_filename}")
+        try:
+            os.replace(tmp_path, pending_path)
+        except OSError:
+            app.logger.exception("Failed to hand off upload, continuing without storage")
+            stored_filename = None
+        correlation_id = uuid.uuid4().hex
+
+        def log_row():
+            # A move that still failed after its retries leaves no file: log NULL, not a dangling name
+            stored = stored_filename
+            if stored is not None and not os.path.exists(os.path.join(images_dir, stored)):
+                app.logger.warning("Image %s was not stored; logging prediction %s without it", stored, correlation_id)
+                stored = None
+            if prediction_writer is not None:
+                prediction_writer.submit(used_filename, emotion, confidence, stored, correlation_id)
+            else:
+                log_prediction(DB_PATH, used_filename, emotion, confidence, stored, correlation_id)
+
+        steps = [(log_row, ())]
+        if stored_filename is not None:
+            steps[:0] = [(move_image, (pending_path, images_dir, stored_filename)), (discard_file, (pending_path,))]
+        side_effects.submit("detect", *steps)
+        return stored_filename, correlation_id
+
+    quality_profiles = load_quality_profiles(cfg.get("QUALITY_PROFILES"), cfg.get("QUALITY_PROFILES_FILE"),
+                                             weight_precision=vit_precision)
+    default_profile = cfg.get("QUALITY_PROFILE_DEFAULT", DEFAULTS["QUALITY_PROFILE_DEFAULT"])
+    if default_profile not in quality_profiles:
+        raise ValueError(f"QUALITY_PROFILE_DEFAULT={default_profile!r} is not a defined quality profile")
+    app.config["QUALITY_PROFILES"] = quality_profiles
+
+    def _face_crop(path, options=None):
+        """224x224 face crop for an image file (worker processes when enabled), or None."""
+        from app.vit_utils import preprocess_face_for_vit
+        if preprocess_pool is not None:
+            return preprocess_pool.crop_file(path, options)
+        return preprocess_face_for_vit(path, **(options or {}))[0]
+
+    # Decode + face detection for /detect/batch runs on a small shared pool
+    batch_pool = ThreadPoolExecutor(
+        max_workers=max(1, cfg.get("BATCH_PREPROCESS_WORKERS", DEFAULTS["BATCH_PREPROCESS_WORKERS"])),
+        thread_name_prefix="batch-preprocess",
+    )
+
+    shadow = None
+    shadow_name = (cfg.get("SHADOW_MODEL") or "").lower().replace("finetuned", "fine-tuned")
+    if shadow_name:
+        if shadow_name in model_slots and model_slots[shadow_name].current is not None:
+            shadow = ShadowEvaluator(
+                model_slots[shadow_name],
+                DB_PATH,
+                sample_rate=cfg.get("SHADOW_SAMPLE_RATE", DEFAULTS["SHADOW_SAMPLE_RATE"]),
+                queue_size=cfg.get("SHADOW_QUEUE_SIZE", DEFAULTS["SHADOW_QUEUE_SIZE"]),
+                executor=executors[shadow_name],
+            ).start()
+            print(f"[SHADOW] Scoring '{shadow_name}' on {shadow.sample_rate:.0%} of /detect requests")
+        else:
+            app.logger.warning("SHADOW_MODEL=%s is not a loaded model variant; shadow mode disabled", shadow_name)
+    app.config["SHADOW_EVALUATOR"] = shadow
+
+    # Offline jobs share the model executors; queued/interrupted jobs resume on startup
+    job_runner = None
+    if cfg.get("JOBS_WORKERS", DEFAULTS["JOBS_WORKERS"]) > 0:
+        job_runner = JobRunner(
+            DB_PATH,
+            cfg.get("JOBS_DIR", DEFAULTS["JOBS_DIR"]),
+            model_slots,
+            executors,
+            workers=cfg.get("JOBS_WORKERS", DEFAULTS["JOBS_WORKERS"]),
+            batch_size=cfg.get("JOBS_BATCH_SIZE", DEFAULTS["JOBS_BATCH_SIZE"]),
+            input_root=cfg.get("JOBS_INPUT_ROOT"),
+            max_images=cfg.get("JOBS_MAX_IMAGES", DEFAULTS["JOBS_MAX_IMAGES"]),
+            max_file_size=cfg["MAX_FILE_SIZE"],
+            allowed_extensions=cfg["ALLOWED_EXT"],
+            model_wait=cfg.get("JOBS_MODEL_WAIT", DEFAULTS["JOBS_MODEL_WAIT"]),
+        ).start()
+    app.config["JOB_RUNNER"] = job_runner
+    stream_stats = StreamStats()
+
+    watch_interval = cfg.get("MODEL_WATCH_INTERVAL", 0) or 0
+    if watch_interval > 0:
+        fine_tuned_dir = os.path.join(PROJECT_ROOT, "models", "fine_tuned_vit")
+        app.config["MODEL_WATCHER"] = ModelWatcher(model_slots["fine-tuned"], fine_tuned_dir, interval=watch_interval).start()
+        app.logger.info("Watching %s for new checkpoints every %.1fs", fine_tuned_dir, watch_interval)
+
     # ----------------------------
     # Error handlers (import before routes to ensure proper handling)
     # ----------------------------
@@ -233,13 +605,20 @@ def create_app(config: dict | None = None):
         """
         try:
             # Quick check - don't do expensive operations
-            model_loaded = bool(app.config.get("MODEL"))
-            model_type = app.config.get("MODEL_TYPE", "unknown")
-            model_version = app.config.get("MODEL_VERSION", "unknown")
+            # The live base handle: its version carries the checkpoint fingerprint, so it
+            # changes when an admin or watcher reload swaps in new weights
+            base_handle = app.config.get("MODEL_SLOTS", {}).get("base")
+            base_handle = base_handle.current if base_handle is not None else None
+            model_loaded = base_handle is not None and base_handle.model is not None
+            model_type = base_handle.model_type if base_handle is not None else "unknown"
+            model_version = base_handle.version if base_handle is not None else "unknown"
             
             # Get labels count quickly
             labels_obj = app.config.get("LABELS")
             labels_count = len(labels_obj) if labels_obj and hasattr(labels_obj, "__len__") else 0
+
+            # Per-variant status, including the last hot reload
+            models_status = {name: slot.status() for name, slot in app.config.get("MODEL_SLOTS", {}).items()}
             
             return jsonify(
                 {
@@ -248,6 +627,8 @@ def create_app(config: dict | None = None):
                     "model_type": model_type,
                     "model_version": model_version,
                     "labels_count": labels_count,
+                    "models": models_status,
+                    "precision": app.config.get("VIT_PRECISION", "fp32"),
                 }
             ), 200
         except Exception as e:
@@ -270,6 +651,23 @@ def create_app(config: dict | None = None):
         try:
             m = get_metrics(DB_PATH)
             recent = tail_rows(DB_PATH, limit=10)
+            m["cascade"] = {**cascade_stats.snapshot(), "thresholds": app.config["CASCADE_THRESHOLDS"]}
+            if prediction_cache is not None:
+                m["prediction_cache"] = prediction_cache.stats()
+            m["executors"] = {name: ex.stats() for name, ex in executors.items()}
+            if shadow is not None:
+                m["shadow"] = {**shadow.stats(), **get_shadow_summary(DB_PATH)}
+            if job_runner is not None:
+                m["jobs"] = job_runner.stats()
+            m["streams"] = stream_stats.snapshot()
+            m["admission"] = admission.stats()
+            if router is not None:
+                m["router"] = router.stats()
+            m["side_effects"] = side_effects.stats()
+            if prediction_writer is not None:
+                m["db_writer"] = prediction_writer.stats()
+            if preprocess_pool is not None:
+                m["preprocess_pool"] = preprocess_pool.stats()
             return jsonify({"ok": True, "metrics": m, "recent": recent}), 200
         except Exception as exc:
             app.logger.exception("Failed to fetch metrics")
@@ -316,8 +714,12 @@ def create_app(config: dict | None = None):
             else:
                 emotion_filter = None
             
-            date_from = request.args.get("date_from", None)
-            date_to = request.args.get("date_to", None)
+            date_from, date_to, date_error = validate_date_range(
+                request.args.get("date_from"),
+                request.args.get("date_to"),
+            )
+            if date_error:
+                return jsonify({"error": date_error}), 400
             
             # Fetch data
             rows = tail_rows(
@@ -343,7 +745,18 @@ def create_app(config: dict | None = None):
             # Convert to list of dicts
             result = []
             for r in rows:
-                if len(r) == 6:
+                if len(r) == 7:
+                    _id, ts, filename, image_path, emotion, confidence, correlation_id = r
+                    record = {
+                        "id": _id,
+                        "ts": ts,
+                        "filename": filename,
+                        "image_path": image_path or filename,  # Fallback to filename if no image_path
+                        "emotion": emotion,
+                        "confidence": confidence,
+                        "correlation_id": correlation_id,
+                    }
+                elif len(r) == 6:
                     _id, ts, filename, image_path, emotion, confidence = r
                     record = {
                         "id": _id,
@@ -439,34 +852,62 @@ def create_app(config: dict | None = None):
                 "detail": f"Maximum {detect_limiter.max_requests} requests per {detect_limiter.window_seconds} seconds",
                 "retry_after": detect_limiter.window_seconds,
             }), 429
-        
-        # Get model selection from query parameter (default: 'base')
-        model_selection = request.args.get("model", "base").lower()
+
+        # Admission control: fail fast when the predicted latency exceeds the SLO
+        ticket, retry_after = admission.try_admit()
+        if ticket is None:
+            raise ServiceUnavailableError(
+                "Server is overloaded, retry later",
+                details={"retry_after": retry_after},
+                headers={"Retry-After": str(retry_after)},
+            )
+        try:
+            with inference_priority("interactive", client_id):
+                return _detect_admitted()
+        finally:
+            # Only requests that ran the model say anything about service time
+            admission.release(ticket, reached_model=g.get("reached_model", False))
+
+    def _detect_admitted():
+        # Quality profile: detector depth, decode resolution, model, precision, TTA
+        profile_name = (request.args.get("profile") or request.headers.get("X-Quality-Profile") or default_profile).lower()
+        profile = quality_profiles.get(profile_name)
+        if profile is None:
+            raise ValidationError(f"Unknown quality profile '{profile_name}'. Available: {', '.join(sorted(quality_profiles))}")
+
+        # Get model selection from query parameter (default: the profile's model, else 'base')
+        model_selection = (request.args.get("model") or profile["model"] or "base").lower()
+        model_slots = app.config["MODEL_SLOTS"]
+        # Tiered mode: the base model is the full tier, the fast student (if loaded) answers first
+        tiered = model_selection == "tiered"
+        # Side-by-side mode: one decode + face detection, base and fine-tuned run concurrently
+        compare = model_selection == "both"
         if model_selection == "fine-tuned" or model_selection == "finetuned":
-            model_local = app.config.get("FINETUNED_MODEL")
-            labels_local = app.config.get("FINETUNED_LABELS") or []
-            model_type = app.config.get("FINETUNED_MODEL_TYPE", "keras")
-            model_version = app.config.get("FINETUNED_MODEL_VERSION", "unknown")
-            if model_local is None:
+            slot = model_slots["fine-tuned"]
+            if slot.current is None:
                 app.logger.warning("Asripa model requested but not available, using base model")
-                model_local = app.config.get("BASE_MODEL")
-                labels_local = app.config.get("BASE_LABELS") or []
-                model_type = app.config.get("BASE_MODEL_TYPE", "keras")
-                model_version = app.config.get("BASE_MODEL_VERSION", "unknown")
+                slot = model_slots["base"]
+        elif model_selection == "fast":
+            slot = model_slots["fast"]
+            if slot.current is None:
+                app.logger.warning("Fast student model requested but not available, using base model")
+                slot = model_slots["base"]
         else:
             # Use base model (default)
-            model_local = app.config.get("BASE_MODEL")
-            labels_local = app.config.get("BASE_LABELS") or []
-            model_type = app.config.get("BASE_MODEL_TYPE", "keras")
-            model_version = app.config.get("BASE_MODEL_VERSION", "unknown")
-        
-        app.logger.info(f"Using model: {model_selection} (version: {model_version})")
+            slot = model_slots["base"]
 
-        if model_local is None:
+        if slot.current is None:
             app.logger.error("Detect called but model not loaded")
             raise ServiceUnavailableError("Model not loaded on server")
-        
-        print(f"[DETECT] Using model type: {model_type}")
+
+        # Token merging: per-request ?merge_ratio= or the variant's configured default
+        if request.args.get("merge_ratio") not in (None, ""):
+            merge_ratio, merge_error = validate_merge_ratio(request.args.get("merge_ratio"))
+            if merge_error:
+                raise ValidationError(merge_error)
+        else:
+            merge_ratio = float(app.config["TOKEN_MERGE_RATIOS"].get(slot.name, 0.0) or 0.0)
+        merge_override = request.args.get("merge_ratio") not in (None, "")
 
         # Validate upload presence
         if "image" not in request.files:
@@ -488,6 +929,23 @@ def create_app(config: dict | None = None):
         tmp_path = os.path.join(tmp_dir, filename)
         used_filename = filename
 
+        # Pin the active model for the rest of the request; a concurrent hot
+        # reload swaps the slot but keeps this handle alive until we release it.
+        handle = slot.acquire()
+        if handle is None:
+            raise ServiceUnavailableError("Model not loaded on server")
+        model_local = handle.model
+        labels_local = handle.labels or []
+        model_type = handle.model_type
+        model_version = handle.version
+        fast_handle = model_slots["fast"].acquire() if tiered and model_type == "vit" else None
+        compare_handle = model_slots["fine-tuned"].acquire() if compare and model_type in ("vit", "student") else None
+        if compare and compare_handle is None:
+            app.logger.warning("Side-by-side mode requested but fine-tuned model not available, using base model only")
+
+        app.logger.info(f"Using model: {model_selection} (version: {model_version})")
+        print(f"[DETECT] Using model type: {model_type}")
+
         try:
             # Save file and verify it was saved
             file.save(tmp_path)
@@ -507,19 +965,104 @@ def create_app(config: dict | None = None):
             import numpy as np
 
             # Handle ViT and Keras models differently
-            if model_type == "vit":
+            if model_type in ("vit", "student"):
                 # Vision Transformer model - needs RGB PIL Image
-                from app.vit_utils import preprocess_face_for_vit, predict_with_vit
+                # (the distilled student reuses the same face crop)
                 from PIL import Image
-                
-                face_image, used_filename = preprocess_face_for_vit(tmp_path)
-                if face_image is None:
+
+                def _predict_crop(face_image):
+                    g.reached_model = True
+                    # Run ViT (or student) prediction
+                    if compare_handle is not None:
+                        compare_merge = merge_ratio if merge_override else \
+                            float(app.config["TOKEN_MERGE_RATIOS"].get("fine-tuned", 0.0) or 0.0)
+                        side_by_side = compare_predict(
+                            {
+                                "base": (model_local, model_type, labels_local, merge_ratio),
+                                "fine-tuned": (compare_handle.model, compare_handle.model_type,
+                                               compare_handle.labels or [], compare_merge),
+                            },
+                            face_image,
+                            {"base": executors[slot.name], "fine-tuned": executors["fine-tuned"]},
+                            precision=profile["precision"],
+                            tta=profile["tta"],
+                        )
+                        print("[DETECT] Side-by-side: " + ", ".join(
+                            f"{name}={r['emotion']} ({r['confidence']:.3f}, {r['latency_ms']} ms)" for name, r in side_by_side.items()))
+                        primary = side_by_side["base"]
+                        return {
+                            "emotion": primary["emotion"],
+                            "confidence": primary["confidence"],
+                            "all_probs": primary["all_probs"],
+                            "models": side_by_side,
+                        }
+                    if fast_handle is not None:
+                        thresholds = app.config["CASCADE_THRESHOLDS"]
+                        result = cascade_predict(
+                            (fast_handle.model, fast_handle.model_type, fast_handle.labels or []),
+                            (model_local, model_type, labels_local),
+                            face_image,
+                            thresholds["min_confidence"],
+                            thresholds["min_margin"],
+                            cascade_stats,
+                            merge_ratio=merge_ratio,
+                            executors=(executors["fast"], executors[slot.name]),
+                            precision=profile["precision"],
+                            tta=profile["tta"],
+                        )
+                        print(f"[DETECT] Tiered: answered by {result['tier']} tier (latency ms: {result['latency_ms']})")
+                        return result
+                    emotion, confidence, all_probs = executors[slot.name].run(
+                        predict_face, model_local, model_type, face_image, labels_local, merge_ratio=merge_ratio,
+                        precision=profile["precision"], tta=profile["tta"],
+                    )
+                    result = {"emotion": emotion, "confidence": confidence, "all_probs": all_probs}
+                    if tiered:
+                        # No cheap tier loaded - the full model answers every request
+                        result.update({"tier": "full", "escalated": False, "latency_ms": {}})
+                    return result
+
+                def _run_prediction():
+                    face_image = _face_crop(tmp_path, preprocess_options(profile))
+                    if face_image is None:
+                        return {"no_face": True}
+                    result = _predict_crop(face_image)
+                    # Hand the crop to the shadow model (sampled, non-blocking, dropped when busy)
+                    if shadow is not None and compare_handle is None and slot.name != shadow.slot.name:
+                        shadow.submit(face_image, {
+                            "filename": used_filename,
+                            "model_version": model_version,
+                            "emotion": result["emotion"],
+                            "confidence": result["confidence"],
+                        })
+                    return result
+
+                # Identical bytes + model version + parameters -> reuse the earlier result
+                cache_source = None
+                if prediction_cache is not None:
+                    cache_key = make_cache_key(hash_file(tmp_path), model_version, {
+                        "model": model_selection,
+                        "fast_version": fast_handle.version if fast_handle is not None else None,
+                        "thresholds": app.config["CASCADE_THRESHOLDS"] if fast_handle is not None else None,
+                        "compare_version": compare_handle.version if compare_handle is not None else None,
+                        "merge_ratio": merge_ratio,
+                        # Serving config that changes the logits; the disk tier outlives restarts
+                        "precision": app.config["VIT_PRECISION"],
+                        "merge_ratios": app.config["TOKEN_MERGE_RATIOS"],
+                        "preprocess": "vit-224",
+                        "profile": profile,
+                    })
+                    prediction, cache_source = prediction_cache.get_or_compute(cache_key, _run_prediction)
+                else:
+                    prediction = _run_prediction()
+
+                if prediction.get("no_face"):
                     app.logger.warning("No face detected for file %s (size: %d bytes)", filename, file_size)
                     raise ValidationError("No face detected in image. Please ensure your face is clearly visible, well-lit, and facing the camera.")
-                
-                # Run ViT prediction
-                idx, confidence, all_probs = predict_with_vit(model_local, face_image, labels_local)
-                emotion = labels_local[idx] if idx < len(labels_local) else str(idx)
+
+                emotion, confidence, all_probs = prediction["emotion"], prediction["confidence"], prediction["all_probs"]
+                cascade = prediction if "tier" in prediction else None
+                side_by_side = prediction.get("models")
                 
                 # Debug output
                 sorted_probs = sorted(all_probs.items(), key=lambda x: x[1], reverse=True)
@@ -540,9 +1083,12 @@ def create_app(config: dict | None = None):
                 probs = np.array([all_probs.get(labels_local[i] if i < len(labels_local) else f"class_{i}", 0.0) 
                                  for i in range(len(labels_local))])
             else:
-                # Keras model - existing code path
+                cascade = None
+                side_by_side = None
+                cache_source = None
+                # Keras model - existing code path (not cached)
                 # Preprocess face - preprocess_face is imported above in factory scope
-                res = preprocess_face(tmp_path)
+                res = preprocess_face(tmp_path, detect_max_dim=profile["detect_max_dim"])
                 if isinstance(res, tuple):
                     face_array, used_filename = res
                 else:
@@ -589,8 +1135,9 @@ def create_app(config: dict | None = None):
                     return jsonify({"error": "Preprocessed face contains invalid numeric values."}), 500
 
                 # Run prediction
+                g.reached_model = True
                 try:
-                    preds = model_local.predict(face_input, verbose=0)
+                    preds = executors[slot.name].run(model_local.predict, face_input, verbose=0)
                 except Exception as exc:
                     app.logger.exception("Model predict failed for file %s", filename)
                     return jsonify({"error": "Prediction failed", "detail": str(exc)}), 500
@@ -650,38 +1197,37 @@ def create_app(config: dict | None = None):
                 
                 print(f"[DETECT] Mapped emotion label: {emotion}")
 
-            # Save image even for low confidence (for debugging/analysis)
-            images_dir = app.config.get("IMAGES_DIR", IMAGES_DIR_DEFAULT)
-            stored_filename = None
-            try:
-                stored_filename = save_image(tmp_path, images_dir, used_filename)
-            except Exception:
-                app.logger.exception("Failed to save image, continuing without storage")
-            
             # Confidence threshold - slightly lower for better detection in challenging conditions
             # But still maintain quality standards
             min_conf = app.config.get("MIN_CONFIDENCE", DEFAULTS["MIN_CONFIDENCE"])
+
+            # Store the image (even for low confidence, for debugging/analysis) and log the
+            # prediction; deferred until after the response unless SIDE_EFFECTS_MODE=sync
+            stored_filename, correlation_id = _record_prediction(
+                tmp_path, used_filename, "low_confidence" if confidence < min_conf else emotion, confidence
+            )
+
             # Allow slightly lower confidence (0.45) but warn user
             if confidence < min_conf:
-                try:
-                    log_prediction(DB_PATH, used_filename, "low_confidence", confidence, stored_filename)
-                except Exception:
-                    app.logger.exception("Failed logging low-confidence prediction")
-                return jsonify({
+                low_conf_payload = {
                     "error": "low confidence",
                     "confidence": round(confidence, 3),
                     "filename": stored_filename or used_filename,
-                }), 422
-
-            # Log and respond (image already saved above)
-            try:
-                log_prediction(DB_PATH, used_filename, emotion, confidence, stored_filename)
-            except Exception:
-                app.logger.exception("Failed to log prediction to DB")
+                    "profile": profile_name,
+                    "correlation_id": correlation_id,
+                }
+                if cascade is not None:
+                    low_conf_payload["tier"] = cascade["tier"]
+                if side_by_side is not None:
+                    low_conf_payload["models"] = {
+                        name: {"emotion": r["emotion"], "confidence": round(r["confidence"], 3)}
+                        for name, r in side_by_side.items()
+                    }
+                return jsonify(low_conf_payload), 422
 
             # Return all probabilities for debugging (frontend can use this to show top emotions)
             all_emotion_probs = {}
-            if model_type == "vit":
+            if model_type in ("vit", "student"):
                 # For ViT, all_probs already contains the dict
                 all_emotion_probs = {k: round(v, 4) for k, v in all_probs.items()}
             else:
@@ -693,14 +1239,44 @@ def create_app(config: dict | None = None):
                         label_key = str(i) if str(i) in labels_local else i if i in labels_local else f"class_{i}"
                         all_emotion_probs[label_key] = round(float(probs[i]), 4)
             
-            return jsonify({
+            payload = {
                 "emotion": emotion,
                 "confidence": round(confidence, 3),
                 "filename": stored_filename or used_filename,
                 "all_probabilities": all_emotion_probs,  # Include all probabilities for debugging
                 "model": model_selection,
                 "model_version": model_version,
-            }), 200
+                "profile": profile_name,
+                "correlation_id": correlation_id,
+            }
+            if model_type == "vit":
+                # What ran, which can differ from what the profile asked for (see quality_profiles)
+                payload["precision"] = profile["precision"]
+            if cache_source is not None:
+                payload["cached"] = cache_source != "computed"
+            if merge_ratio > 0 and model_type == "vit":
+                payload["merge_ratio"] = merge_ratio
+            if cascade is not None:
+                payload["tier"] = cascade["tier"]
+                payload["escalated"] = cascade["escalated"]
+                payload["latency_ms"] = cascade["latency_ms"]
+                if cascade["tier"] == "fast" and fast_handle is not None:
+                    payload["model_version"] = fast_handle.version
+            if side_by_side is not None:
+                # Top-level fields stay the base answer; "models" holds each variant
+                versions = {"base": model_version, "fine-tuned": compare_handle.version if compare_handle is not None else None}
+                payload["models"] = {
+                    name: {
+                        "emotion": r["emotion"],
+                        "confidence": round(r["confidence"], 3),
+                        "all_probabilities": {k: round(v, 4) for k, v in r["all_probs"].items()},
+                        "model_version": versions.get(name),
+                        "latency_ms": r["latency_ms"],
+                    }
+                    for name, r in side_by_side.items()
+                }
+                payload["agreement"] = len({r["emotion"] for r in side_by_side.values()}) == 1
+            return jsonify(payload), 200
 
         except (ValidationError, APIError, NotFoundError, ServiceUnavailableError) as exc:
             # Let Flask's error handler process these
@@ -711,13 +1287,430 @@ def create_app(config: dict | None = None):
             return jsonify({"error": "internal error", "detail": str(exc), "trace": tb}), 500
 
         finally:
-            # cleanup tmp file (image is already saved to images/ if successful)
+            handle.release()
+            if fast_handle is not None:
+                fast_handle.release()
+            if compare_handle is not None:
+                compare_handle.release()
+            # cleanup tmp file (already handed to the side-effect pipeline if a prediction was made)
             try:
                 if os.path.exists(tmp_path):
                     os.remove(tmp_path)
             except Exception:
                 app.logger.exception("failed removing tmp file")
 
+    @app.route("/detect/batch", methods=["POST"])
+    def detect_batch():
+        """
+        POST form-data: image files under key 'images' (repeated), or one .zip under key 'archive'
+        Query: ?model=base|fine-tuned|fast, ?merge_ratio=
+        Returns: JSON {model, model_version, count, succeeded, failed, results: [...], latency_ms}
+
+        Images are decoded and face-detected in parallel, then classified with
+        one batched forward. A bad image fails only its own entry in `results`.
+        """
+        client_id = get_client_identifier(request)
+        is_allowed, remaining = batch_limiter.is_allowed(client_id)
+        if not is_allowed:
+            return jsonify({
+                "error": "Rate limit exceeded",
+                "detail": f"Maximum {batch_limiter.max_requests} batches per {batch_limiter.window_seconds} seconds",
+                "retry_after": batch_limiter.window_seconds,
+            }), 429
+
+        model_selection = request.args.get("model", "base").lower().replace("finetuned", "fine-tuned")
+        model_slots = app.config["MODEL_SLOTS"]
+        slot = model_slots.get(model_selection) or model_slots["base"]
+        if slot.current is None:
+            app.logger.warning("Model %s requested for batch but not available, using base model", model_selection)
+            slot = model_slots["base"]
+
+        if request.args.get("merge_ratio") not in (None, ""):
+            merge_ratio, merge_error = validate_merge_ratio(request.args.get("merge_ratio"))
+            if merge_error:
+                raise ValidationError(merge_error)
+        else:
+            merge_ratio = float(app.config["TOKEN_MERGE_RATIOS"].get(slot.name, 0.0) or 0.0)
+
+        max_images = app.config.get("BATCH_MAX_IMAGES", DEFAULTS["BATCH_MAX_IMAGES"])
+        max_size = app.config.get("MAX_CONTENT_LENGTH", DEFAULTS["MAX_FILE_SIZE"])
+        allowed_ext = app.config.get("ALLOWED_EXT", DEFAULTS["ALLOWED_EXT"])
+        # MAX_CONTENT_LENGTH is per image here; the body may carry a full batch (Flask 3.1+)
+        request.max_content_length = max_size * max_images
+
+        # Collect (original name, file-like) pairs from the multipart fields or the zip
+        uploads = []
+        archive = request.files.get("archive")
+        if archive is not None and archive.filename:
+            try:
+                with zipfile.ZipFile(archive.stream) as zf:
+                    for info in zf.infolist():
+                        name = os.path.basename(info.filename)
+                        if info.is_dir() or not name or info.filename.startswith("__MACOSX/") or name.startswith("."):
+                            continue
+                        if len(uploads) >= max_images:
+                            raise ValidationError(f"Too many images in archive. Maximum: {max_images}")
+                        if info.file_size > max_size:
+                            # Checked before extracting so a zip bomb never gets decompressed
+                            uploads.append((name, None, f"File too large. Maximum size: {max_size / (1024 * 1024):.1f}MB"))
+                            continue
+                        uploads.append((name, FileStorage(stream=io.BytesIO(zf.read(info)), filename=name), None))
+            except zipfile.BadZipFile:
+                raise ValidationError("Invalid zip archive")
+        else:
+            files = request.files.getlist("images") + request.files.getlist("image")
+            uploads = [(f.filename, f, None) for f in files]
+        if not uploads:
+            raise ValidationError("No images provided")
+        if len(uploads) > max_images:
+            raise ValidationError(f"Too many images. Maximum: {max_images}")
+
+        handle = slot.acquire()
+        if handle is None:
+            raise ServiceUnavailableError("Model not loaded on server")
+        if handle.model_type not in ("vit", "student"):
+            handle.release()
+            raise ServiceUnavailableError("Batch detection requires the ViT or student model")
+        labels_local = handle.labels or []
+        print(f"[BATCH] {len(uploads)} images | model={slot.name} ({handle.version})")
+
+        tmp_dir = app.config.get("TMP_DIR", TMP_DIR_DEFAULT)
+        images_dir = app.config.get("IMAGES_DIR", IMAGES_DIR_DEFAULT)
+        min_conf = app.config.get("MIN_CONFIDENCE", DEFAULTS["MIN_CONFIDENCE"])
+        tmp_paths = []
+
+        def _prepare(index, name, file, error):
+            if error is None:
+                is_valid, error, filename = validate_image_file(file, max_size=max_size, allowed_extensions=allowed_ext)
+            if error is not None:
+                return {"index": index, "filename": name, "error": error, "status": 400}
+            # Unique tmp name: many entries in one batch can share a filename
+            tmp_path = os.path.join(tmp_dir, f"{uuid.uuid4().hex}_{filename}")
+            tmp_paths.append(tmp_path)
+            file.save(tmp_path)
+            face_image = _face_crop(tmp_path)
+            if face_image is None:
+                return {"index": index, "filename": filename, "error": "No face detected in image", "status": 400}
+            return {"index": index, "filename": filename, "tmp_path": tmp_path, "face": face_image}
+
+        started = time.perf_counter()
+        try:
+            prepared = list(batch_pool.map(lambda args: _prepare(*args), [(i, *u) for i, u in enumerate(uploads)]))
+            preprocessed = time.perf_counter()
+
+            ready = [p for p in prepared if "face" in p]
+            predictions = []
+            if ready:
+                with inference_priority("batch", client_id):
+                    predictions = executors[slot.name].run(
+                        predict_faces, handle.model, handle.model_type, [p["face"] for p in ready], labels_local,
+                        merge_ratio=merge_ratio,
+                    )
+            inferred = time.perf_counter()
+
+            results = {p["index"]: p for p in prepared if "face" not in p}
+            rows = []
+            for item, (emotion, confidence, all_probs) in zip(ready, predictions):
+                try:
+                    stored_filename = save_image(item["tmp_path"], images_dir, item["filename"])
+                except Exception:
+                    app.logger.exception("Failed to save image, continuing without storage")
+                    stored_filename = None
+                if confidence < min_conf:
+                    rows.append((item["filename"], "low_confidence", confidence, stored_filename))
+                    results[item["index"]] = {
+                        "index": item["index"],
+                        "filename": stored_filename or item["filename"],
+                        "error": "low confidence",
+                        "confidence": round(confidence, 3),
+                        "status": 422,
+                    }
+                    continue
+                rows.append((item["filename"], emotion, confidence, stored_filename))
+                results[item["index"]] = {
+                    "index": item["index"],
+                    "filename": stored_filename or item["filename"],
+                    "emotion": emotion,
+                    "confidence": round(confidence, 3),
+                    "all_probabilities": {k: round(v, 4) for k, v in all_probs.items()},
+                }
+
+            # One transaction for the whole batch
+            try:
+                log_predictions(DB_PATH, rows)
+            except Exception:
+                app.logger.exception("Failed to log batch predictions to DB")
+
+            ordered = [results[i] for i in range(len(uploads))]
+            succeeded = sum(1 for r in ordered if "emotion" in r)
+            finished = time.perf_counter()
+            print(f"[BATCH] {succeeded}/{len(ordered)} succeeded | preprocess {(preprocessed - started) * 1000:.0f} ms, "
+                  f"inference {(inferred - preprocessed) * 1000:.0f} ms")
+            payload = {
+                "model": slot.name,
+                "model_version": handle.version,
+                "count": len(ordered),
+                "succeeded": succeeded,
+                "failed": len(ordered) - succeeded,
+                "results": ordered,
+                "latency_ms": {
+                    "preprocess": round((preprocessed - started) * 1000.0, 1),
+                    "inference": round((inferred - preprocessed) * 1000.0, 1),
+                    "total": round((finished - started) * 1000.0, 1),
+                },
+            }
+            if merge_ratio > 0 and handle.model_type == "vit":
+                payload["merge_ratio"] = merge_ratio
+            return jsonify(payload), 200
+
+        except (ValidationError, APIError, NotFoundError, ServiceUnavailableError):
+            raise
+        except Exception as exc:
+            app.logger.exception("batch detection error")
+            return jsonify({"error": "internal error", "detail": str(exc), "trace": traceback.format_exc()}), 500
+
+        finally:
+            handle.release()
+            for tmp_path in tmp_paths:
+                try:
+                    if os.path.exists(tmp_path):
+                        os.remove(tmp_path)
+                except Exception:
+                    app.logger.exception("failed removing tmp file")
+
+    @app.route("/detect/video", methods=["POST"])
+    def detect_video():
+        """
+        POST form-data: video file under key 'video'
+        Query: ?model=base|fine-tuned|fast, ?stride=<analyse every Nth frame>,
+               ?segment=<seconds per timeline segment>, ?frames=0 (segments only)
+        Returns: JSON emotion timeline {segments: [...], frames: [...], ...}
+        """
+        client_id = get_client_identifier(request)
+        is_allowed, remaining = batch_limiter.is_allowed(client_id)
+        if not is_allowed:
+            return jsonify({
+                "error": "Rate limit exceeded",
+                "detail": f"Maximum {batch_limiter.max_requests} requests per {batch_limiter.window_seconds} seconds",
+                "retry_after": batch_limiter.window_seconds,
+            }), 429
+
+        model_selection = request.args.get("model", "base").lower().replace("finetuned", "fine-tuned")
+        model_slots = app.config["MODEL_SLOTS"]
+        slot = model_slots.get(model_selection) or model_slots["base"]
+        if slot.current is None:
+            app.logger.warning("Model %s requested for video but not available, using base model", model_selection)
+            slot = model_slots["base"]
+        try:
+            stride = int(request.args.get("stride", cfg.get("VIDEO_FRAME_STRIDE", DEFAULTS["VIDEO_FRAME_STRIDE"])))
+            segment_seconds = float(request.args.get("segment", "1.0"))
+        except ValueError:
+            raise ValidationError("stride must be an integer and segment a number")
+        if stride < 1 or not math.isfinite(segment_seconds) or segment_seconds < MIN_SEGMENT_SECONDS:
+            raise ValidationError(f"stride must be >= 1 and segment >= {MIN_SEGMENT_SECONDS} seconds")
+
+        request.max_content_length = cfg.get("VIDEO_MAX_SIZE", DEFAULTS["VIDEO_MAX_SIZE"])
+        file = request.files.get("video")
+        if file is None or not file.filename:
+            raise ValidationError("No video provided")
+        filename = secure_filename(file.filename)
+        if os.path.splitext(filename)[1].lower() not in VIDEO_EXT:
+            raise ValidationError(f"Unsupported video type. Allowed: {', '.join(VIDEO_EXT)}")
+
+        handle = slot.acquire()
+        if handle is None:
+            raise ServiceUnavailableError("Model not loaded on server")
+        if handle.model_type not in ("vit", "student"):
+            handle.release()
+            raise ServiceUnavailableError("Video detection requires the ViT or student model")
+
+        # cv2.VideoCapture needs a path; the upload is streamed to tmp once
+        tmp_path = os.path.join(app.config.get("TMP_DIR", TMP_DIR_DEFAULT), f"{uuid.uuid4().hex}_{filename}")
+        try:
+            file.save(tmp_path)
+            started = time.perf_counter()
+            try:
+                with inference_priority("batch", client_id):
+                    timeline = analyze_video(
+                        tmp_path,
+                        handle,
+                        executors[slot.name],
+                        stride=stride,
+                        segment_seconds=segment_seconds,
+                        batch_size=cfg.get("VIDEO_BATCH_SIZE", DEFAULTS["VIDEO_BATCH_SIZE"]),
+                        max_frames=cfg.get("VIDEO_MAX_SAMPLED_FRAMES", DEFAULTS["VIDEO_MAX_SAMPLED_FRAMES"]),
+                        include_frames=request.args.get("frames", "1") not in ("0", "false"),
+                    )
+            except ValueError as exc:
+                raise ValidationError(str(exc))
+            elapsed_ms = (time.perf_counter() - started) * 1000.0
+            print(f"[VIDEO] {filename}: {timeline['frames_sampled']} frames sampled (stride {stride}), "
+                  f"{timeline['frames_with_face']} with a face, {elapsed_ms:.0f} ms")
+            return jsonify({
+                "model": slot.name,
+                "model_version": handle.version,
+                "filename": filename,
+                **timeline,
+                "latency_ms": round(elapsed_ms, 1),
+            }), 200
+        finally:
+            handle.release()
+            try:
+                if os.path.exists(tmp_path):
+                    os.remove(tmp_path)
+            except Exception:
+                app.logger.exception("failed removing tmp file")
+
+    # ----------------------------
+    # Webcam streaming (WebSocket)
+    # ----------------------------
+    if Sock is not None:
+        sock = Sock(app)
+
+        @sock.route("/detect/stream")
+        def detect_stream(ws):
+            """
+            WebSocket /detect/stream?model=base|fine-tuned|fast
+
+            Binary messages are frames (JPEG by default). A text message such as
+            {"format": "raw", "width": 640, "height": 480} switches to raw RGB/RGBA
+            frames. Each processed frame is answered with a JSON text message;
+            frames arriving while the previous one is still running are dropped
+            so the newest frame always wins.
+            """
+            model_selection = request.args.get("model", "base").lower().replace("finetuned", "fine-tuned")
+            model_slots = app.config["MODEL_SLOTS"]
+            slot = model_slots.get(model_selection) or model_slots["base"]
+            if slot.current is None:
+                slot = model_slots["base"]
+            if slot.current is None or slot.current.model_type not in ("vit", "student"):
+                ws.send(json.dumps({"error": "Streaming requires the ViT or student model"}))
+                return
+
+            session = StreamSession(
+                slot,
+                executors[slot.name],
+                ws.send,
+                stream_stats,
+                db_path=DB_PATH,
+                images_dir=app.config.get("IMAGES_DIR", IMAGES_DIR_DEFAULT),
+                log_sample_rate=cfg.get("STREAM_LOG_SAMPLE_RATE", DEFAULTS["STREAM_LOG_SAMPLE_RATE"]),
+                min_confidence=app.config.get("MIN_CONFIDENCE", DEFAULTS["MIN_CONFIDENCE"]),
+                motion_threshold=cfg.get("STREAM_MOTION_THRESHOLD", DEFAULTS["STREAM_MOTION_THRESHOLD"]),
+                max_reuse_seconds=cfg.get("STREAM_MOTION_MAX_REUSE_S", DEFAULTS["STREAM_MOTION_MAX_REUSE_S"]),
+                client=get_client_identifier(request),
+            ).start()
+            print(f"[STREAM] Session opened (model={slot.name})")
+            try:
+                while True:
+                    message = ws.receive()
+                    if message is None:
+                        break
+                    if isinstance(message, str):
+                        try:
+                            session.configure(json.loads(message))
+                        except (ValueError, AttributeError):
+                            ws.send(json.dumps({"error": "Invalid options message"}))
+                        continue
+                    session.push(message)
+            except ConnectionClosed:
+                pass
+            finally:
+                session.close()
+                print(f"[STREAM] Session closed after {session.seq} frames ({session.mailbox.dropped} dropped)")
+    else:
+        print("[STREAM] flask-sock not installed - /detect/stream disabled (pip install flask-sock)")
+
+    # ----------------------------
+    # Offline jobs
+    # ----------------------------
+    @app.route("/jobs", methods=["POST"])
+    def jobs_create():
+        """
+        POST form-data: a .zip of images under key 'archive', or
+        POST JSON / form: {"folder": "<path under JOBS_INPUT_ROOT>"}
+        Query: ?model=base|fine-tuned|fast
+        Returns: 202 with the job (poll GET /jobs/<id>, read GET /jobs/<id>/results)
+        """
+        if job_runner is None:
+            raise ServiceUnavailableError("Offline jobs are disabled (JOBS_WORKERS=0)")
+        client_id = get_client_identifier(request)
+        is_allowed, remaining = jobs_limiter.is_allowed(client_id)
+        if not is_allowed:
+            return jsonify({
+                "error": "Rate limit exceeded",
+                "detail": f"Maximum {jobs_limiter.max_requests} jobs per {jobs_limiter.window_seconds} seconds",
+                "retry_after": jobs_limiter.window_seconds,
+            }), 429
+
+        model_selection = request.args.get("model", "base").lower().replace("finetuned", "fine-tuned")
+        if model_selection not in app.config["MODEL_SLOTS"]:
+            raise ValidationError(f"Unknown model: {model_selection}")
+        # Archives are far larger than a single /detect upload
+        request.max_content_length = app.config["JOBS_MAX_UPLOAD_SIZE"]
+        try:
+            archive = request.files.get("archive")
+            if archive is not None and archive.filename:
+                job = job_runner.create_from_archive(archive, model_selection)
+            else:
+                body = request.get_json(silent=True) or request.form
+                if not body.get("folder"):
+                    raise ValidationError("Provide a .zip under 'archive' or a 'folder'")
+                job = job_runner.create_from_folder(body["folder"], model_selection)
+        except JobError as exc:
+            raise ValidationError(str(exc))
+        return jsonify({"ok": True, "job": job}), 202
+
+    @app.route("/jobs/<job_id>", methods=["GET"])
+    def jobs_status(job_id):
+        """Job status and progress."""
+        job = get_job(DB_PATH, job_id)
+        if job is None:
+            raise NotFoundError("Job not found")
+        job.pop("job_dir", None)
+        job["progress"] = round(job["processed"] / job["total"], 4) if job["total"] else 0.0
+        return jsonify({"ok": True, "job": job}), 200
+
+    @app.route("/jobs/<job_id>/results", methods=["GET"])
+    def jobs_results(job_id):
+        """Stream results as NDJSON (one line per image, input order; partial while running)."""
+        if get_job(DB_PATH, job_id) is None:
+            raise NotFoundError("Job not found")
+
+        def generate():
+            for _, _, result in iter_job_results(DB_PATH, job_id):
+                yield result + "\n"
+
+        return Response(stream_with_context(generate()), mimetype="application/x-ndjson")
+
+    # ----------------------------
+    # Admin endpoints
+    # ----------------------------
+    @app.route("/admin/reload", methods=["POST"])
+    def admin_reload():
+        """
+        POST /admin/reload?model=fine-tuned
+
+        Reload a model variant in the background and swap it in once warmed up.
+        Requires the X-Admin-Token header to match ADMIN_TOKEN.
+        """
+        expected = app.config.get("ADMIN_TOKEN")
+        if not expected:
+            return jsonify({"error": "Admin endpoints are disabled (ADMIN_TOKEN not set)"}), 403
+        if request.headers.get("X-Admin-Token") != expected:
+            return jsonify({"error": "Invalid admin token"}), 401
+
+        model_name = request.args.get("model", "fine-tuned").lower()
+        if model_name == "finetuned":
+            model_name = "fine-tuned"
+        slot = app.config["MODEL_SLOTS"].get(model_name)
+        if slot is None:
+            raise ValidationError(f"Unknown model: {model_name}")
+
+        if not slot.reload():
+            return jsonify({"error": "Reload already in progress", "model": model_name}), 409
+        return jsonify({"ok": True, "model": model_name, "reloading": True}), 202
+
     # ----------------------------
     # Image serving endpoint
     # ----------------------------
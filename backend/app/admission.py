@@ -0,0 +1,100 @@
+"""
+Admission control for /detect.
+
+Tracks requests in flight and a moving average of measured service time. A
+new request's latency is predicted as
+
+    service_ms * (1 + in_flight / concurrency)
+
+i.e. its own service time plus its share of the work already admitted. When
+that exceeds the SLO the request is rejected immediately (503 with a
+Retry-After computed from how long the backlog needs to drain) instead of
+queueing until gunicorn's timeout.
+"""
+import math
+import threading
+import time
+from typing import Any, Dict, Optional, Tuple
+
+
+class AdmissionController:
+    """
+    Thread-safe in-flight counter + service-time EWMA with an SLO check.
+    """
+
+    def __init__(self, slo_ms: float, concurrency: int = 1, alpha: float = 0.1, max_retry_after: int = 60):
+        """
+        Args:
+            slo_ms: Reject when predicted latency exceeds this (0 disables admission control)
+            concurrency: Requests served in parallel (inference workers for the model)
+            alpha: EWMA weight of each new service-time sample
+            max_retry_after: Upper bound for the Retry-After header (seconds)
+        """
+        self.slo_ms = slo_ms
+        self.concurrency = max(1, concurrency)
+        self.alpha = alpha
+        self.max_retry_after = max_retry_after
+        self.lock = threading.Lock()
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.admitted = 0
+        self.rejected = 0
+        # No estimate until the first request completes; until then everything is admitted
+        self.service_ms: Optional[float] = None
+
+    def _predicted_ms(self) -> float:
+        if self.service_ms is None:
+            return 0.0
+        return self.service_ms * (1.0 + self.in_flight / self.concurrency)
+
+    def try_admit(self) -> Tuple[Optional[Tuple[float, int]], int]:
+        """
+        Returns:
+            (ticket, retry_after) - ticket is None when the request is rejected;
+            pass an admitted ticket to release() when the request finishes
+        """
+        with self.lock:
+            predicted = self._predicted_ms()
+            # An idle server always admits, even if one request alone exceeds the SLO
+            if self.slo_ms > 0 and self.in_flight > 0 and predicted > self.slo_ms:
+                self.rejected += 1
+                retry_after = math.ceil((predicted - self.slo_ms) / 1000.0)
+                return None, max(1, min(self.max_retry_after, retry_after))
+            ahead = self.in_flight
+            self.in_flight += 1
+            self.max_in_flight = max(self.max_in_flight, self.in_flight)
+            self.admitted += 1
+            return (time.perf_counter(), ahead), 0
+
+    def release(self, ticket: Tuple[float, int], reached_model: bool = True):
+        """
+        Finish an admitted request. Pass reached_model=False when it never ran the
+        model (cache hit, validation error) so its time stays out of the estimate.
+        """
+        started, ahead = ticket
+        elapsed_ms = (time.perf_counter() - started) * 1000.0
+        # The measured latency includes waiting behind the `ahead` requests admitted
+        # earlier; invert the prediction model to get a per-request service time
+        sample = elapsed_ms / (1.0 + ahead / self.concurrency)
+        with self.lock:
+            self.in_flight -= 1
+            if not reached_model:
+                return
+            if self.service_ms is None:
+                self.service_ms = sample
+            else:
+                self.service_ms = (1 - self.alpha) * self.service_ms + self.alpha * sample
+
+    def stats(self) -> Dict[str, Any]:
+        with self.lock:
+            return {
+                "slo_ms": self.slo_ms,
+                "concurrency": self.concurrency,
+                "in_flight": self.in_flight,
+                "queue_depth": max(0, self.in_flight - self.concurrency),
+                "max_in_flight": self.max_in_flight,
+                "admitted": self.admitted,
+                "rejected": self.rejected,
+                "service_ms": round(self.service_ms, 1) if self.service_ms is not None else None,
+                "predicted_wait_ms": round(self._predicted_ms(), 1),
+            }
@@ -0,0 +1,247 @@
+"""
+ASGI serving mode: the same API behind an async server (uvicorn asgi:app).
+
+Under gunicorn's gthread worker a slow uploader or a long-polling client
+holds a thread for as long as its socket is open. Here the event loop owns
+the connections, and a thread is only used once a request is ready to run:
+
+  * Request bodies are read asynchronously and size-capped before any thread
+    is involved, so slow uploads cost no thread. Bodies above
+    ASGI_BODY_SPOOL_BYTES are spooled to a temp file rather than kept in memory.
+  * /detect* (decode, face detection, waiting on the inference executors)
+    runs the Flask view on a bounded "inference" thread pool.
+  * Response bodies are sent chunk by chunk as the view yields them, so
+    streamed responses (NDJSON /jobs/<id>/results) stay streamed.
+  * Everything else (/logs and /metrics DB reads, /jobs, admin, ...) runs on a
+    separate bounded "io" thread pool, so DB reads never queue behind model
+    work.
+  * /images/<filename> is served natively: a rate-limit check and a stat on
+    the loop, then the file is streamed in chunks without a thread. It gets
+    the same CORS_ORIGINS policy as the Flask routes.
+
+The Flask app from create_app() is reused as-is: routes, validation,
+admission control, lanes and the model executors are identical in both
+modes. Model capacity is still set by INFERENCE_WORKERS and admission
+control. The pool sizes only cap how many ready requests run at once.
+The WebSocket /detect/stream needs a WSGI server (flask-sock) and is not
+available in this mode.
+
+Needs `starlette` and an ASGI server (`uvicorn`); both are optional.
+"""
+import asyncio
+import sys
+import logging
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+from types import SimpleNamespace
+from typing import IO, Any, Callable, Dict, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+def _wsgi_environ(scope: Dict[str, Any], body: IO[bytes], size: int) -> Dict[str, Any]:
+    """PEP 3333 environ for an ASGI HTTP scope whose body has already been read into a file."""
+    server = scope.get("server") or ("localhost", 80)
+    client = scope.get("client") or ("", 0)
+    environ = {
+        "REQUEST_METHOD": scope["method"],
+        "SCRIPT_NAME": scope.get("root_path", "").encode("utf-8").decode("latin-1"),
+        "PATH_INFO": scope["path"].encode("utf-8").decode("latin-1"),
+        "QUERY_STRING": scope.get("query_string", b"").decode("latin-1"),
+        "SERVER_NAME": server[0],
+        "SERVER_PORT": str(server[1]),
+        "SERVER_PROTOCOL": f"HTTP/{scope.get('http_version', '1.1')}",
+        "REMOTE_ADDR": client[0],
+        "CONTENT_LENGTH": str(size),
+        "wsgi.version": (1, 0),
+        "wsgi.url_scheme": scope.get("scheme", "http"),
+        "wsgi.input": body,
+        "wsgi.errors": sys.stderr,
+        "wsgi.multithread": True,
+        "wsgi.multiprocess": True,
+        "wsgi.run_once": False,
+    }
+    for raw_name, raw_value in scope.get("headers", []):
+        name = raw_name.decode("latin-1").upper().replace("-", "_")
+        value = raw_value.decode("latin-1")
+        if name == "CONTENT_TYPE":
+            environ["CONTENT_TYPE"] = value
+        elif name != "CONTENT_LENGTH":
+            key = f"HTTP_{name}"
+            environ[key] = f"{environ[key]},{value}" if key in environ else value
+    return environ
+
+
+def _run_wsgi(wsgi_app, environ: Dict[str, Any], send: Callable[[Dict[str, Any]], None]):
+    """
+    Run the WSGI app in the calling (pool) thread, passing each body chunk to
+    send() as it is produced. send blocks until the loop has written the
+    message, so a slow client slows the producer instead of buffering.
+    """
+    started: Dict[str, Any] = {}
+
+    def start_response(status, headers, exc_info=None):
+        started["status"] = int(status.split(" ", 1)[0])
+        started["headers"] = [(k.lower().encode("latin-1"), v.encode("latin-1")) for k, v in headers]
+
+    def send_start():
+        send({"type": "http.response.start", "status": started["status"], "headers": started["headers"]})
+        started["sent"] = True
+
+    result = wsgi_app(environ, start_response)
+    try:
+        for chunk in result:
+            if not chunk:
+                continue
+            if "sent" not in started:
+                send_start()
+            send({"type": "http.response.body", "body": chunk, "more_body": True})
+        if "sent" not in started:
+            send_start()
+        send({"type": "http.response.body", "body": b"", "more_body": False})
+    finally:
+        if hasattr(result, "close"):
+            result.close()
+
+
+def create_asgi_app(config: Optional[dict] = None, flask_app=None):
+    """
+    Build the ASGI application around create_app(config) (or an existing Flask app).
+    """
+    try:
+        from starlette.middleware.cors import CORSMiddleware
+        from starlette.responses import FileResponse, JSONResponse
+        from starlette.routing import Match, Route
+    except ImportError as exc:
+        raise ImportError("ASGI mode needs starlette (pip install starlette uvicorn)") from exc
+
+    from . import create_app, DEFAULTS, IMAGES_DIR_DEFAULT
+    from .image_storage import get_image_path
+    from .rate_limiter import get_client_identifier, images_limiter
+
+    cfg = DEFAULTS.copy()
+    if config:
+        cfg.update(config)
+    if flask_app is None:
+        flask_app = create_app(config)
+    wsgi_app = flask_app.wsgi_app
+
+    inference_pool = ThreadPoolExecutor(
+        max_workers=max(1, cfg.get("ASGI_INFERENCE_THREADS", DEFAULTS["ASGI_INFERENCE_THREADS"])),
+        thread_name_prefix="asgi-inference",
+    )
+    io_pool = ThreadPoolExecutor(
+        max_workers=max(1, cfg.get("ASGI_IO_THREADS", DEFAULTS["ASGI_IO_THREADS"])),
+        thread_name_prefix="asgi-io",
+    )
+    # Largest body any route accepts; each Flask route still enforces its own limit
+    max_body = max(
+        flask_app.config["MAX_CONTENT_LENGTH"] * flask_app.config["BATCH_MAX_IMAGES"],
+        flask_app.config["JOBS_MAX_UPLOAD_SIZE"],
+        cfg.get("VIDEO_MAX_SIZE", DEFAULTS["VIDEO_MAX_SIZE"]),
+    ) + 1024 * 1024
+
+    spool_bytes = cfg.get("ASGI_BODY_SPOOL_BYTES", DEFAULTS["ASGI_BODY_SPOOL_BYTES"])
+
+    async def _read_body(scope, receive) -> Optional[Tuple[IO[bytes], int]]:
+        """
+        Whole request body as (file, size), rewound, or None once it exceeds
+        max_body. The file stays in memory up to spool_bytes and then rolls
+        over to disk; the caller closes it.
+        """
+        for name, value in scope.get("headers", []):
+            if name == b"content-length" and value.isdigit() and int(value) > max_body:
+                return None
+        body = tempfile.SpooledTemporaryFile(max_size=spool_bytes)
+        size = 0
+        try:
+            while True:
+                message = await receive()
+                if message["type"] == "http.disconnect":
+                    raise ConnectionResetError("Client disconnected during upload")
+                chunk = message.get("body", b"")
+                size += len(chunk)
+                if size > max_body:
+                    body.close()
+                    return None
+                body.write(chunk)
+                if not message.get("more_body", False):
+                    body.seek(0)
+                    return body, size
+        except BaseException:
+            body.close()
+            raise
+
+    async def bridge(scope, receive, send):
+        """Any route of the Flask app: read the body here, run the view on the matching pool."""
+        try:
+            body = await _read_body(scope, receive)
+        except ConnectionResetError:
+            return
+        if body is None:
+            response = JSONResponse({"error": "Request body too large"}, status_code=413)
+            await response(scope, receive, send)
+            return
+        pool = inference_pool if scope["path"].startswith("/detect") else io_pool
+        loop = asyncio.get_running_loop()
+
+        def send_from_thread(message):
+            asyncio.run_coroutine_threadsafe(send(message), loop).result()
+
+        body_file, size = body
+        try:
+            await loop.run_in_executor(pool, _run_wsgi, wsgi_app, _wsgi_environ(scope, body_file, size),
+                                       send_from_thread)
+        finally:
+            body_file.close()
+
+    async def serve_image(request):
+        client_id = get_client_identifier(SimpleNamespace(
+            headers=request.headers, remote_addr=request.client.host if request.client else None,
+        ))
+        is_allowed, _ = images_limiter.is_allowed(client_id)
+        if not is_allowed:
+            return JSONResponse({
+                "error": "Rate limit exceeded",
+                "detail": f"Maximum {images_limiter.max_requests} requests per {images_limiter.window_seconds} seconds",
+                "retry_after": images_limiter.window_seconds,
+            }, status_code=429)
+        image_path = get_image_path(flask_app.config.get("IMAGES_DIR", IMAGES_DIR_DEFAULT), request.path_params["filename"])
+        if not image_path:
+            return JSONResponse({"error": "Not found"}, status_code=404)
+        return FileResponse(image_path)
+
+    async def lifespan(receive, send):
+        while True:
+            message = await receive()
+            if message["type"] == "lifespan.startup":
+                await send({"type": "lifespan.startup.complete"})
+            elif message["type"] == "lifespan.shutdown":
+                inference_pool.shutdown(wait=False, cancel_futures=True)
+                io_pool.shutdown(wait=False, cancel_futures=True)
+                await send({"type": "lifespan.shutdown.complete"})
+                return
+
+    images_route = Route("/images/{filename}", serve_image, methods=["GET"])
+    # Flask-CORS never sees this route, so apply CORS_ORIGINS here the same way create_app does
+    cors_origins = cfg.get("CORS_ORIGINS", DEFAULTS["CORS_ORIGINS"])
+    if cors_origins == "*":
+        cors_origins = ["*"]
+    elif isinstance(cors_origins, str):
+        cors_origins = cors_origins.split(",")
+    images_handler = CORSMiddleware(images_route.handle, allow_origins=list(cors_origins), allow_methods=["GET"])
+
+    async def app(scope, receive, send):
+        if scope["type"] == "lifespan":
+            await lifespan(receive, send)
+            return
+        if scope["type"] != "http":
+            return  # WebSockets (/detect/stream) need the WSGI server
+        match, child_scope = images_route.matches(scope)
+        if match == Match.FULL:
+            await images_handler({**scope, **child_scope}, receive, send)
+        else:
+            await bridge(scope, receive, send)
+
+    app.flask_app = flask_app
+    return app
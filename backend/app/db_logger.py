@@ -1,25 +1,71 @@
 
 import sqlite3
 import os
+import time
+import uuid
+import queue
+import atexit
+import logging
 import datetime
-from typing import Dict, Tuple, List, Optional
+from typing import Any, Dict, Tuple, List, Optional
 import threading
 
+logger = logging.getLogger(__name__)
+
 SCHEMA = """
 PRAGMA foreign_keys = ON;
+-- Original layout; later columns and indexes come from MIGRATIONS below
 CREATE TABLE IF NOT EXISTS predictions (
     id INTEGER PRIMARY KEY AUTOINCREMENT,
     ts TEXT NOT NULL,
     filename TEXT,
-    image_path TEXT,
     emotion TEXT,
     confidence REAL
 );
-
--- Indexes for better query performance
-CREATE INDEX IF NOT EXISTS idx_predictions_ts ON predictions(ts DESC);
-CREATE INDEX IF NOT EXISTS idx_predictions_emotion ON predictions(emotion);
 CREATE INDEX IF NOT EXISTS idx_predictions_confidence ON predictions(confidence);
+
+-- Shadow evaluation: a candidate model scored on sampled live traffic
+CREATE TABLE IF NOT EXISTS shadow_predictions (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    ts TEXT NOT NULL,
+    filename TEXT,
+    primary_model_version TEXT,
+    shadow_model_version TEXT,
+    primary_emotion TEXT,
+    primary_confidence REAL,
+    shadow_emotion TEXT,
+    shadow_confidence REAL,
+    agreement INTEGER,
+    confidence_delta REAL,
+    shadow_latency_ms REAL
+);
+CREATE INDEX IF NOT EXISTS idx_shadow_predictions_ts ON shadow_predictions(ts DESC);
+
+-- Offline jobs (/jobs): one row per job, one result row per input image
+CREATE TABLE IF NOT EXISTS jobs (
+    id TEXT PRIMARY KEY,
+    created_at TEXT NOT NULL,
+    started_at TEXT,
+    finished_at TEXT,
+    status TEXT NOT NULL,
+    model TEXT,
+    source TEXT,
+    job_dir TEXT NOT NULL,
+    total INTEGER NOT NULL DEFAULT 0,
+    processed INTEGER NOT NULL DEFAULT 0,
+    succeeded INTEGER NOT NULL DEFAULT 0,
+    worker TEXT,
+    heartbeat REAL,
+    error TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_jobs_status ON jobs(status, created_at);
+CREATE TABLE IF NOT EXISTS job_results (
+    job_id TEXT NOT NULL,
+    idx INTEGER NOT NULL,
+    path TEXT,
+    result TEXT NOT NULL,
+    PRIMARY KEY (job_id, idx)
+);
 """
 
 # Connection pool for better performance
@@ -47,22 +93,90 @@ def get_connection(db_path: str, timeout: int = 10) -> sqlite3.Connection:
         return _connection_pool[key]
 
 
+def _add_column(conn: sqlite3.Connection, table: str, column: str, decl: str):
+    # Databases from before migrations existed may already have the column
+    if column not in {row[1] for row in conn.execute(f"PRAGMA table_info({table})")}:
+        conn.execute(f"ALTER TABLE {table} ADD COLUMN {column} {decl}")
+
+
+def _migrate_image_path(conn: sqlite3.Connection):
+    _add_column(conn, "predictions", "image_path", "TEXT")
+
+
+def _migrate_correlation_id(conn: sqlite3.Connection):
+    _add_column(conn, "predictions", "correlation_id", "TEXT")
+
+
+def _migrate_ts_epoch(conn: sqlite3.Connection):
+    _add_column(conn, "predictions", "ts_epoch", "INTEGER")
+    # strftime parses the stored ISO strings (fraction and +00:00 offset included)
+    conn.execute("UPDATE predictions SET ts_epoch = CAST(strftime('%s', ts) AS INTEGER) WHERE ts_epoch IS NULL")
+
+
+def _migrate_log_indexes(conn: sqlite3.Connection):
+    # /logs filters on emotion and/or a date range and pages by id DESC
+    conn.execute("DROP INDEX IF EXISTS idx_predictions_ts")
+    conn.execute("DROP INDEX IF EXISTS idx_predictions_emotion")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_predictions_emotion_id ON predictions(emotion, id)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_predictions_ts_epoch_id ON predictions(ts_epoch, id)")
+
+
+def _migrate_null_image_path(conn: sqlite3.Connection):
+    # Older writers stored "" for "no stored image"
+    conn.execute("UPDATE predictions SET image_path = NULL WHERE image_path = ''")
+
+
+# Ordered schema migrations; the index + 1 of the last applied one is stored in PRAGMA user_version.
+# Append only: never reorder or edit a migration that has shipped.
+MIGRATIONS = [
+    ("add predictions.image_path", _migrate_image_path),
+    ("add predictions.correlation_id", _migrate_correlation_id),
+    ("add predictions.ts_epoch (backfilled from ts)", _migrate_ts_epoch),
+    ("composite indexes for /logs filters", _migrate_log_indexes),
+    ("empty predictions.image_path -> NULL", _migrate_null_image_path),
+]
+
+
+def migrate(conn: sqlite3.Connection) -> int:
+    """
+    Apply pending MIGRATIONS in order, each in its own transaction together
+    with the user_version bump. Returns the resulting schema version.
+    """
+    for version, (description, migration) in enumerate(MIGRATIONS, start=1):
+        # BEGIN IMMEDIATE takes the write lock before re-reading the version, so
+        # several workers starting at once apply each migration exactly once
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            if conn.execute("PRAGMA user_version").fetchone()[0] >= version:
+                conn.execute("ROLLBACK")
+                continue
+            migration(conn)
+            conn.execute(f"PRAGMA user_version = {version}")
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        print(f"[DB] Applied migration {version}: {description}")
+    return conn.execute("PRAGMA user_version").fetchone()[0]
+
+
 def init_db(db_path: str):
     db_dir = os.path.dirname(db_path)
     if db_dir and not os.path.exists(db_dir):
         os.makedirs(db_dir, exist_ok=True)
 
-    conn = sqlite3.connect(db_path, timeout=10)
+    conn = sqlite3.connect(db_path, timeout=10, isolation_level=None)
     try:
         conn.execute("PRAGMA journal_mode=WAL;")
         conn.execute("PRAGMA synchronous=NORMAL;")
         conn.execute("PRAGMA cache_size=10000;")
         conn.executescript(SCHEMA)
-        conn.commit()
+        migrate(conn)
     finally:
         conn.close()
 
-def log_prediction(db_path: str, filename: str, emotion: str, confidence: float, image_path: Optional[str] = None):
+def log_prediction(db_path: str, filename: str, emotion: str, confidence: float, image_path: Optional[str] = None,
+                   correlation_id: Optional[str] = None):
     """
     Logs a prediction row. This function ensures ts is a string and that
     values bound to SQLite are primitive types (no functions or callables).
@@ -73,6 +187,7 @@ def log_prediction(db_path: str, filename: str, emotion: str, confidence: float,
         emotion: Detected emotion
         confidence: Confidence score
         image_path: Path to stored image file (optional)
+        correlation_id: Caller-side id for the row (optional)
     """
     # Defensive conversions
     try:
@@ -80,6 +195,7 @@ def log_prediction(db_path: str, filename: str, emotion: str, confidence: float,
     except Exception:
         # fallback to str(datetime)
         ts = str(datetime.datetime.utcnow())
+    ts_epoch = int(time.time())
 
     if filename is None:
         filename = ""
@@ -91,10 +207,8 @@ def log_prediction(db_path: str, filename: str, emotion: str, confidence: float,
     else:
         emotion = str(emotion)
 
-    if image_path is None:
-        image_path = ""
-    else:
-        image_path = str(image_path)
+    # NULL (not "") when no image was stored, like every other writer
+    image_path = str(image_path) if image_path else None
 
     try:
         confidence_val = float(confidence or 0.0)
@@ -104,18 +218,10 @@ def log_prediction(db_path: str, filename: str, emotion: str, confidence: float,
     conn = get_connection(db_path)
     try:
         cur = conn.cursor()
-        # Check if image_path column exists, if not, add it
-        cur.execute("PRAGMA table_info(predictions)")
-        columns = [row[1] for row in cur.fetchall()]
-        
-        if "image_path" not in columns:
-            # Migrate schema - add image_path column
-            cur.execute("ALTER TABLE predictions ADD COLUMN image_path TEXT")
-            conn.commit()
-        
         cur.execute(
-            "INSERT INTO predictions (ts, filename, image_path, emotion, confidence) VALUES (?, ?, ?, ?, ?)",
-            (ts, filename, image_path, emotion, confidence_val)
+            "INSERT INTO predictions (ts, ts_epoch, filename, image_path, emotion, confidence, correlation_id) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?)",
+            (ts, ts_epoch, filename, image_path, emotion, confidence_val, correlation_id)
         )
         conn.commit()
         return cur.lastrowid
@@ -132,6 +238,162 @@ def log_prediction(db_path: str, filename: str, emotion: str, confidence: float,
                 del _connection_pool[key]
         raise
 
+def log_predictions(db_path: str, rows: List[Tuple[str, str, float, Optional[str]]]) -> int:
+    """
+    Log many predictions in a single transaction.
+
+    Args:
+        db_path: Path to SQLite database
+        rows: [(filename, emotion, confidence, image_path), ...]
+
+    Returns:
+        Number of rows inserted
+    """
+    if not rows:
+        return 0
+    now = datetime.datetime.now(datetime.UTC)
+    return _insert_predictions(db_path, [
+        _prediction_params(now, filename, emotion, confidence, image_path, None)
+        for filename, emotion, confidence, image_path in rows
+    ])
+
+
+def _prediction_params(now: datetime.datetime, filename, emotion, confidence, image_path, correlation_id) -> tuple:
+    return (now.isoformat(), int(now.timestamp()), str(filename or ""), str(image_path) if image_path else None,
+            str(emotion or ""), float(confidence or 0.0), correlation_id)
+
+
+def _insert_predictions(db_path: str, params: List[tuple]) -> int:
+    """executemany INSERT of _prediction_params rows in one transaction."""
+    conn = get_connection(db_path)
+    try:
+        with conn:  # one transaction for the whole batch
+            conn.executemany(
+                "INSERT INTO predictions (ts, ts_epoch, filename, image_path, emotion, confidence, correlation_id) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                params,
+            )
+        return len(params)
+    except Exception:
+        _drop_connection(db_path)
+        raise
+
+
+class _Flush:
+    def __init__(self):
+        self.done = threading.Event()
+
+
+class PredictionLogWriter:
+    """
+    Write-behind prediction logger.
+
+    submit() stamps the row, gives it a correlation id and puts it on a bounded
+    queue (blocking when full, so overload slows callers instead of losing
+    rows). One background thread inserts queued rows with executemany in a
+    single transaction per batch: once `batch_rows` rows are waiting or
+    `flush_ms` after the first row of a batch arrived, whichever comes first.
+    A failed batch is retried; rows still pending at exit are flushed.
+    """
+
+    def __init__(self, db_path: str, batch_rows: int = 64, flush_ms: float = 200.0, queue_size: int = 4096,
+                 retries: int = 3):
+        self.db_path = db_path
+        self.batch_rows = max(1, batch_rows)
+        self.flush_seconds = max(0.0, flush_ms) / 1000.0
+        self.retries = max(0, retries)
+        self.queue: "queue.Queue" = queue.Queue(maxsize=max(1, queue_size))
+        self.lock = threading.Lock()
+        self.submitted = 0
+        self.written = 0
+        self.batches = 0
+        self.failed_rows = 0
+        self.max_depth = 0
+        self._closed = False
+        self._thread = threading.Thread(target=self._run, name="db-writer", daemon=True)
+        self._thread.start()
+        atexit.register(self.close)
+
+    def submit(self, filename: str, emotion: str, confidence: float, image_path: Optional[str] = None,
+               correlation_id: Optional[str] = None) -> str:
+        """Queue one prediction row; returns its correlation id (generated if not given)."""
+        correlation_id = correlation_id or uuid.uuid4().hex
+        now = datetime.datetime.now(datetime.UTC)
+        self.queue.put(_prediction_params(now, filename, emotion, confidence, image_path, correlation_id))
+        with self.lock:
+            self.submitted += 1
+            self.max_depth = max(self.max_depth, self.queue.qsize())
+        return correlation_id
+
+    def flush(self, timeout: float = 10.0) -> bool:
+        """Write everything queued so far; False if that took longer than timeout."""
+        marker = _Flush()
+        try:
+            self.queue.put(marker, timeout=timeout)
+        except queue.Full:
+            return False
+        return marker.done.wait(timeout)
+
+    def close(self):
+        if not self._closed:
+            self._closed = True
+            if not self.flush():
+                logger.warning("Prediction log writer closed with rows still queued")
+
+    def _run(self):
+        while True:
+            item = self.queue.get()
+            batch, markers = [], []
+            deadline = time.monotonic() + self.flush_seconds
+            while True:
+                if isinstance(item, _Flush):
+                    markers.append(item)
+                    break  # flush now, don't wait for the batch to fill
+                batch.append(item)
+                if len(batch) >= self.batch_rows:
+                    break
+                remaining = deadline - time.monotonic()
+                try:
+                    item = self.queue.get(timeout=remaining) if remaining > 0 else self.queue.get_nowait()
+                except queue.Empty:
+                    break
+            if batch:
+                self._write(batch)
+            for marker in markers:
+                marker.done.set()
+
+    def _write(self, batch: List[tuple]):
+        delay = 0.05
+        for attempt in range(self.retries + 1):
+            try:
+                _insert_predictions(self.db_path, batch)
+                with self.lock:
+                    self.written += len(batch)
+                    self.batches += 1
+                return
+            except Exception:
+                if attempt == self.retries:
+                    logger.exception("Dropping %d prediction rows after %d failed attempts", len(batch), attempt + 1)
+                    with self.lock:
+                        self.failed_rows += len(batch)
+                    return
+                time.sleep(delay)
+                delay *= 2
+
+    def stats(self) -> Dict[str, Any]:
+        with self.lock:
+            return {
+                "queue_depth": self.queue.qsize(),
+                "max_queue_depth": self.max_depth,
+                "submitted": self.submitted,
+                "written": self.written,
+                "batches": self.batches,
+                "avg_batch_rows": round(self.written / self.batches, 1) if self.batches else 0.0,
+                "failed_rows": self.failed_rows,
+                "batch_rows": self.batch_rows,
+                "flush_ms": self.flush_seconds * 1000.0,
+            }
+
 def get_metrics(db_path: str) -> Dict:
     conn = get_connection(db_path)
     try:
@@ -156,20 +418,20 @@ def get_metrics(db_path: str) -> Dict:
 
 def tail_rows(db_path: str, limit: int = 10, offset: int = 0, emotion_filter: Optional[str] = None, 
               min_confidence: Optional[float] = None, max_confidence: Optional[float] = None,
-              date_from: Optional[str] = None, date_to: Optional[str] = None) -> Tuple:
+              date_from: Optional[int] = None, date_to: Optional[int] = None) -> Tuple:
     """
     Fetch rows from predictions table with filtering and pagination.
+    date_from / date_to are inclusive Unix epoch seconds.
     
     Returns:
-        List of tuples: (id, ts, filename, image_path, emotion, confidence) or 
-        (ts, filename, image_path, emotion, confidence) depending on query
+        List of tuples: (id, ts, filename, image_path, emotion, confidence, correlation_id)
     """
     conn = get_connection(db_path)
     try:
         cur = conn.cursor()
         
         # Build query with filters
-        query = "SELECT id, ts, filename, image_path, emotion, confidence FROM predictions WHERE 1=1"
+        query = "SELECT id, ts, filename, image_path, emotion, confidence, correlation_id FROM predictions WHERE 1=1"
         params = []
         
         if emotion_filter:
@@ -184,12 +446,12 @@ def tail_rows(db_path: str, limit: int = 10, offset: int = 0, emotion_filter: Op
             query += " AND confidence <= ?"
             params.append(max_confidence)
         
-        if date_from:
-            query += " AND ts >= ?"
+        if date_from is not None:
+            query += " AND ts_epoch >= ?"
             params.append(date_from)
         
-        if date_to:
-            query += " AND ts <= ?"
+        if date_to is not None:
+            query += " AND ts_epoch <= ?"
             params.append(date_to)
         
         query += " ORDER BY id DESC LIMIT ? OFFSET ?"
@@ -242,7 +504,7 @@ def delete_prediction(db_path: str, prediction_id: int) -> bool:
 
 def get_total_count(db_path: str, emotion_filter: Optional[str] = None,
                    min_confidence: Optional[float] = None, max_confidence: Optional[float] = None,
-                   date_from: Optional[str] = None, date_to: Optional[str] = None) -> int:
+                   date_from: Optional[int] = None, date_to: Optional[int] = None) -> int:
     """Get total count of predictions matching filters."""
     conn = get_connection(db_path)
     try:
@@ -263,12 +525,12 @@ def get_total_count(db_path: str, emotion_filter: Optional[str] = None,
             query += " AND confidence <= ?"
             params.append(max_confidence)
         
-        if date_from:
-            query += " AND ts >= ?"
+        if date_from is not None:
+            query += " AND ts_epoch >= ?"
             params.append(date_from)
         
-        if date_to:
-            query += " AND ts <= ?"
+        if date_to is not None:
+            query += " AND ts_epoch <= ?"
             params.append(date_to)
         
         cur.execute(query, params)
@@ -284,3 +546,226 @@ def get_total_count(db_path: str, emotion_filter: Optional[str] = None,
                     pass
                 del _connection_pool[key]
         raise
+
+
+def log_shadow_prediction(db_path: str, record: Dict):
+    """
+    Log one shadow comparison row.
+
+    Args:
+        db_path: Path to SQLite database
+        record: Dict with filename, primary/shadow model versions, emotions,
+            confidences and the shadow model's latency in ms
+    """
+    ts = datetime.datetime.now(datetime.UTC).isoformat()
+    primary_conf = float(record.get("primary_confidence") or 0.0)
+    shadow_conf = float(record.get("shadow_confidence") or 0.0)
+    conn = get_connection(db_path)
+    try:
+        cur = conn.cursor()
+        cur.execute(
+            """INSERT INTO shadow_predictions (ts, filename, primary_model_version, shadow_model_version,
+                   primary_emotion, primary_confidence, shadow_emotion, shadow_confidence,
+                   agreement, confidence_delta, shadow_latency_ms)
+               VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)""",
+            (
+                ts,
+                str(record.get("filename") or ""),
+                str(record.get("primary_model_version") or ""),
+                str(record.get("shadow_model_version") or ""),
+                str(record.get("primary_emotion") or ""),
+                primary_conf,
+                str(record.get("shadow_emotion") or ""),
+                shadow_conf,
+                int(record.get("primary_emotion") == record.get("shadow_emotion")),
+                shadow_conf - primary_conf,
+                float(record.get("shadow_latency_ms") or 0.0),
+            ),
+        )
+        conn.commit()
+        return cur.lastrowid
+    except Exception:
+        _drop_connection(db_path)
+        raise
+
+
+def get_shadow_summary(db_path: str) -> Dict:
+    """Aggregate agreement, confidence delta and latency over all shadow rows."""
+    conn = get_connection(db_path)
+    try:
+        cur = conn.cursor()
+        cur.execute(
+            """SELECT COUNT(*), AVG(agreement), AVG(confidence_delta), AVG(shadow_latency_ms)
+               FROM shadow_predictions"""
+        )
+        total, agreement, delta, latency = cur.fetchone()
+        return {
+            "total": total or 0,
+            "agreement_rate": round(agreement, 4) if agreement is not None else None,
+            "mean_confidence_delta": round(delta, 4) if delta is not None else None,
+            "mean_shadow_latency_ms": round(latency, 2) if latency is not None else None,
+        }
+    except Exception:
+        _drop_connection(db_path)
+        raise
+
+
+def _drop_connection(db_path: str):
+    """Close and forget this thread's pooled connection (after an error)."""
+    with _db_lock:
+        key = f"{db_path}_{threading.get_ident()}"
+        if key in _connection_pool:
+            try:
+                _connection_pool[key].close()
+            except Exception:
+                pass
+            del _connection_pool[key]
+
+
+_JOB_COLUMNS = ("id", "created_at", "started_at", "finished_at", "status", "model", "source",
+                "job_dir", "total", "processed", "succeeded", "worker", "heartbeat", "error")
+
+
+def create_job(db_path: str, job_id: str, model: str, source: str, job_dir: str, total: int):
+    """Insert a queued job."""
+    ts = datetime.datetime.now(datetime.UTC).isoformat()
+    conn = get_connection(db_path)
+    try:
+        with conn:
+            conn.execute(
+                "INSERT INTO jobs (id, created_at, status, model, source, job_dir, total) VALUES (?, ?, 'queued', ?, ?, ?, ?)",
+                (job_id, ts, model, source, job_dir, int(total)),
+            )
+    except Exception:
+        _drop_connection(db_path)
+        raise
+
+
+def get_job(db_path: str, job_id: str) -> Optional[Dict]:
+    conn = get_connection(db_path)
+    try:
+        cur = conn.cursor()
+        cur.execute(f"SELECT {', '.join(_JOB_COLUMNS)} FROM jobs WHERE id = ?", (job_id,))
+        row = cur.fetchone()
+        return dict(zip(_JOB_COLUMNS, row)) if row else None
+    except Exception:
+        _drop_connection(db_path)
+        raise
+
+
+def claim_next_job(db_path: str, worker: str, stale_after: float) -> Optional[Dict]:
+    """
+    Atomically take the oldest queued job, or a running job whose worker
+    stopped heartbeating more than stale_after seconds ago (server restart).
+    Safe across gunicorn worker processes sharing the database.
+    """
+    now = datetime.datetime.now(datetime.UTC)
+    conn = get_connection(db_path)
+    try:
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            cur = conn.cursor()
+            cur.execute(
+                """SELECT id FROM jobs
+                   WHERE status = 'queued' OR (status = 'running' AND COALESCE(heartbeat, 0) < ?)
+                   ORDER BY created_at LIMIT 1""",
+                (now.timestamp() - stale_after,),
+            )
+            row = cur.fetchone()
+            if row is None:
+                conn.execute("COMMIT")
+                return None
+            conn.execute(
+                """UPDATE jobs SET status = 'running', worker = ?, heartbeat = ?,
+                       started_at = COALESCE(started_at, ?) WHERE id = ?""",
+                (worker, now.timestamp(), now.isoformat(), row[0]),
+            )
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        return get_job(db_path, row[0])
+    except Exception:
+        _drop_connection(db_path)
+        raise
+
+
+def get_job_done_indices(db_path: str, job_id: str) -> set:
+    """Indices of a job's inputs that already have a result (for resuming)."""
+    conn = get_connection(db_path)
+    try:
+        cur = conn.cursor()
+        cur.execute("SELECT idx FROM job_results WHERE job_id = ?", (job_id,))
+        return {row[0] for row in cur.fetchall()}
+    except Exception:
+        _drop_connection(db_path)
+        raise
+
+
+def log_job_results(db_path: str, job_id: str, rows: List[Tuple[int, str, str]], succeeded: int):
+    """
+    Store a chunk of results and advance the job's progress in one transaction.
+
+    Args:
+        rows: [(idx, path, result_json), ...]
+        succeeded: How many of the rows are successful predictions
+    """
+    conn = get_connection(db_path)
+    try:
+        with conn:
+            conn.executemany(
+                "INSERT OR REPLACE INTO job_results (job_id, idx, path, result) VALUES (?, ?, ?, ?)",
+                [(job_id, idx, path, result) for idx, path, result in rows],
+            )
+            conn.execute(
+                "UPDATE jobs SET processed = processed + ?, succeeded = succeeded + ?, heartbeat = ? WHERE id = ?",
+                (len(rows), int(succeeded), datetime.datetime.now(datetime.UTC).timestamp(), job_id),
+            )
+    except Exception:
+        _drop_connection(db_path)
+        raise
+
+
+def heartbeat_job(db_path: str, job_id: str):
+    """Refresh a running job's heartbeat (keeps the claim while the worker waits)."""
+    conn = get_connection(db_path)
+    try:
+        with conn:
+            conn.execute("UPDATE jobs SET heartbeat = ? WHERE id = ?",
+                         (datetime.datetime.now(datetime.UTC).timestamp(), job_id))
+    except Exception:
+        _drop_connection(db_path)
+        raise
+
+
+def finish_job(db_path: str, job_id: str, status: str, error: Optional[str] = None):
+    """Mark a job done or failed."""
+    ts = datetime.datetime.now(datetime.UTC).isoformat()
+    conn = get_connection(db_path)
+    try:
+        with conn:
+            conn.execute("UPDATE jobs SET status = ?, finished_at = ?, error = ? WHERE id = ?", (status, ts, error, job_id))
+    except Exception:
+        _drop_connection(db_path)
+        raise
+
+
+def iter_job_results(db_path: str, job_id: str, page_size: int = 500):
+    """Yield (idx, path, result_json) in input order, a page at a time."""
+    last = -1
+    while True:
+        conn = get_connection(db_path)
+        try:
+            cur = conn.cursor()
+            cur.execute(
+                "SELECT idx, path, result FROM job_results WHERE job_id = ? AND idx > ? ORDER BY idx LIMIT ?",
+                (job_id, last, page_size),
+            )
+            rows = cur.fetchall()
+        except Exception:
+            _drop_connection(db_path)
+            raise
+        if not rows:
+            return
+        yield from rows
+        last = rows[-1][0]
@@ -10,11 +10,13 @@ class APIError(Exception):
     status_code = 500
     message = "An error occurred"
     
-    def __init__(self, message: str = None, status_code: int = None, details: Dict[str, Any] = None):
+    def __init__(self, message: str = None, status_code: int = None, details: Dict[str, Any] = None,
+                 headers: Dict[str, str] = None):
         super().__init__()
         self.message = message or self.message
         self.status_code = status_code or self.status_code
         self.details = details or {}
+        self.headers = headers or {}
     
     def to_dict(self) -> Dict[str, Any]:
         return {
@@ -48,6 +50,8 @@ def register_error_handlers(app):
     def handle_api_error(error: APIError):
         response = jsonify(error.to_dict())
         response.status_code = error.status_code
+        for name, value in error.headers.items():
+            response.headers[name] = value
         return response
     
     @app.errorhandler(404)
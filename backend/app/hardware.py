@@ -0,0 +1,69 @@
+"""
+CPU capability checks used to pick an inference precision at startup.
+"""
+import platform
+from typing import Set, Tuple
+
+PRECISIONS = ("fp32", "bf16", "int8")
+
+_flags_cache = None
+
+
+def cpu_flags() -> Set[str]:
+    """CPU feature flags from /proc/cpuinfo (empty set where unavailable)."""
+    global _flags_cache
+    if _flags_cache is None:
+        flags = set()
+        try:
+            with open("/proc/cpuinfo", "r", encoding="utf-8") as f:
+                for line in f:
+                    if line.startswith("flags"):
+                        flags.update(line.split(":", 1)[1].split())
+                        break
+        except OSError:
+            pass
+        _flags_cache = flags
+    return _flags_cache
+
+
+def supports_bf16() -> bool:
+    """
+    True when the CPU has native bf16 matmul support (AVX512-BF16 or AMX).
+    Without it, bf16 runs through slow emulation and is usually slower than fp32.
+    """
+    flags = cpu_flags()
+    if flags:
+        return bool({"avx512_bf16", "amx_bf16"} & flags)
+    # No /proc/cpuinfo (macOS, Windows): ask oneDNN instead
+    try:
+        import torch
+        return bool(torch.backends.mkldnn.is_available() and torch.ops.mkldnn._is_mkldnn_bf16_supported())
+    except Exception:
+        return False
+
+
+def supports_int8() -> bool:
+    """True when torch has a dynamic-quantization engine (fbgemm on x86, qnnpack on ARM)."""
+    try:
+        import torch
+        return bool(torch.backends.quantized.supported_engines and
+                    set(torch.backends.quantized.supported_engines) - {"none"})
+    except Exception:
+        return False
+
+
+def resolve_precision(requested: str) -> Tuple[str, str]:
+    """
+    Map a requested precision to what this host can run.
+
+    Returns:
+        (precision, reason) - precision is 'fp32', 'bf16' or 'int8'
+    """
+    requested = (requested or "fp32").lower()
+    if requested not in PRECISIONS:
+        return "fp32", f"unknown precision {requested!r}"
+    if requested == "bf16" and not supports_bf16():
+        return "fp32", f"CPU ({platform.processor() or platform.machine()}) has no AVX512-BF16/AMX"
+    if requested == "int8" and not supports_int8():
+        return "fp32", "torch has no quantized engine on this platform"
+    return requested, "ok"
@@ -13,7 +13,8 @@ logger = logging.getLogger(__name__)
 
 def get_referenced_images(db_path: str) -> Set[str]:
     """
-    Get set of all image filenames referenced in the database.
+    Get set of all image filenames referenced in the database
+    (image_path is guaranteed by init_db's migrations).
     
     Returns:
         Set of image filenames (basenames only)
@@ -22,14 +23,6 @@ def get_referenced_images(db_path: str) -> Set[str]:
     try:
         cur = conn.cursor()
         
-        # Check if image_path column exists
-        cur.execute("PRAGMA table_info(predictions)")
-        columns = [row[1] for row in cur.fetchall()]
-        
-        if "image_path" not in columns:
-            # Column doesn't exist yet, return empty set
-            return set()
-        
         # Get all non-empty image_path values
         cur.execute("SELECT DISTINCT image_path FROM predictions WHERE image_path IS NOT NULL AND image_path != ''")
         rows = cur.fetchall()
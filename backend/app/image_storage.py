@@ -63,6 +63,31 @@ def save_image(source_path: str, images_dir: str, original_filename: str) -> Opt
         return None
 
 
+def move_image(source_path: str, images_dir: str, stored_filename: str) -> str:
+    """
+    Move an image into images_dir under a filename chosen by the caller.
+    Unlike save_image, errors are raised so callers can retry.
+    
+    Args:
+        source_path: Path to source image file (removed on success)
+        images_dir: Directory to save images to
+        stored_filename: Name from generate_unique_filename()
+    
+    Returns:
+        Stored filename
+    """
+    ensure_images_dir(images_dir)
+    # A rename when tmp and images share a filesystem, copy + delete otherwise
+    shutil.move(source_path, os.path.join(images_dir, stored_filename))
+    return stored_filename
+
+
+def discard_file(path: str):
+    """Remove a leftover file if it still exists."""
+    if os.path.exists(path):
+        os.remove(path)
+
+
 def get_image_path(images_dir: str, filename: str) -> Optional[str]:
     """
     Get full path to an image file if it exists.
@@ -0,0 +1,252 @@
+"""
+Model-agnostic prediction on an already detected face crop, plus the
+confidence-tiered cascade (cheap model first, ViT only when unsure) and
+side-by-side comparison of several models on the same crop.
+"""
+import json
+import os
+import threading
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+from PIL import Image
+
+from app.inference_executor import InferenceExecutor, run_on
+from app.inference_router import RemoteModel
+
+
+def predict_face(
+    model_local: Any,
+    model_type: str,
+    face_image: Image.Image,
+    labels: list,
+    merge_ratio: float = 0.0,
+    precision: Optional[str] = None,
+    tta: bool = False,
+) -> Tuple[str, float, Dict[str, float]]:
+    """
+    Run one face crop through a ViT or student model.
+    merge_ratio (token merging), precision and tta (flip averaging) apply to
+    ViT models and are ignored by the student.
+
+    Returns:
+        (emotion, confidence, all_probabilities_dict)
+    """
+    if isinstance(model_local, RemoteModel):
+        return model_local.predict_faces([face_image], merge_ratio=merge_ratio, precision=precision, tta=tta)[0]
+    if model_type == "student":
+        from app.student_model import predict_with_student
+        idx, confidence, all_probs = predict_with_student(model_local, face_image, labels)
+    elif model_type == "vit":
+        from app.vit_utils import predict_with_vit
+        idx, confidence, all_probs = predict_with_vit(
+            model_local, face_image, labels, merge_ratio=merge_ratio, precision=precision, tta=tta
+        )
+    else:
+        raise ValueError(f"predict_face does not support model type {model_type!r}")
+    emotion = labels[idx] if idx < len(labels) else str(idx)
+    return emotion, confidence, all_probs
+
+
+def predict_faces(
+    model_local: Any,
+    model_type: str,
+    face_images: List[Image.Image],
+    labels: list,
+    merge_ratio: float = 0.0,
+    precision: Optional[str] = None,
+) -> List[Tuple[str, float, Dict[str, float]]]:
+    """
+    Batched predict_face: one forward for all crops.
+
+    Returns:
+        [(emotion, confidence, all_probabilities_dict), ...] in input order
+    """
+    if isinstance(model_local, RemoteModel):
+        return model_local.predict_faces(face_images, merge_ratio=merge_ratio, precision=precision)
+    if model_type == "student":
+        from app.student_model import predict_batch_with_student
+        results = predict_batch_with_student(model_local, face_images, labels)
+    elif model_type == "vit":
+        from app.vit_utils import predict_batch_with_vit
+        results = predict_batch_with_vit(model_local, face_images, labels, merge_ratio=merge_ratio, precision=precision)
+    else:
+        raise ValueError(f"predict_faces does not support model type {model_type!r}")
+    return [
+        (labels[idx] if idx < len(labels) else str(idx), confidence, all_probs)
+        for idx, confidence, all_probs in results
+    ]
+
+
+def top_margin(all_probs: Dict[str, float]) -> float:
+    """Difference between the two highest probabilities."""
+    top = sorted(all_probs.values(), reverse=True)
+    if not top:
+        return 0.0
+    return top[0] - (top[1] if len(top) > 1 else 0.0)
+
+
+def load_cascade_thresholds(path: str, default_confidence: float, default_margin: float) -> Dict[str, Any]:
+    """
+    Read thresholds written by scripts/calibrate_cascade.py, falling back to defaults.
+    """
+    thresholds = {"min_confidence": default_confidence, "min_margin": default_margin, "source": "defaults"}
+    if path and os.path.exists(path):
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            thresholds["min_confidence"] = float(data.get("min_confidence", default_confidence))
+            thresholds["min_margin"] = float(data.get("min_margin", default_margin))
+            thresholds["source"] = path
+            if data.get("full_latency_ms"):
+                thresholds["full_latency_ms"] = float(data["full_latency_ms"])
+        except Exception:
+            pass
+    return thresholds
+
+
+class CascadeStats:
+    """
+    Thread-safe counters for tiered inference: escalation rate and estimated latency saved.
+    """
+
+    def __init__(self, full_latency_ms: Optional[float] = None):
+        self.lock = threading.Lock()
+        self.requests = 0
+        self.escalations = 0
+        self.latency_saved_ms = 0.0
+        # Moving average of a full-tier forward, used to estimate savings
+        self.full_latency_ms = full_latency_ms
+
+    def record(self, escalated: bool, fast_ms: float, full_ms: Optional[float] = None):
+        with self.lock:
+            self.requests += 1
+            if escalated:
+                self.escalations += 1
+                if full_ms is not None:
+                    if self.full_latency_ms is None:
+                        self.full_latency_ms = full_ms
+                    else:
+                        self.full_latency_ms = 0.9 * self.full_latency_ms + 0.1 * full_ms
+            elif self.full_latency_ms is not None:
+                self.latency_saved_ms += max(0.0, self.full_latency_ms - fast_ms)
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self.lock:
+            return {
+                "requests": self.requests,
+                "escalations": self.escalations,
+                "escalation_rate": round(self.escalations / self.requests, 4) if self.requests else 0.0,
+                "latency_saved_ms": round(self.latency_saved_ms, 1),
+                "full_latency_ms": round(self.full_latency_ms, 1) if self.full_latency_ms is not None else None,
+            }
+
+
+def cascade_predict(
+    fast: Tuple[Any, str, list],
+    full: Tuple[Any, str, list],
+    face_image: Image.Image,
+    min_confidence: float,
+    min_margin: float,
+    stats: Optional[CascadeStats] = None,
+    merge_ratio: float = 0.0,
+    executors: Tuple[Optional[InferenceExecutor], Optional[InferenceExecutor]] = (None, None),
+    precision: Optional[str] = None,
+    tta: bool = False,
+) -> Dict[str, Any]:
+    """
+    Answer with the cheap model unless its top-1 confidence or margin is below
+    threshold, in which case escalate to the full model.
+
+    Args:
+        fast / full: (model, model_type, labels) for each tier
+        face_image: Face crop shared by both tiers
+        merge_ratio: Token merging ratio for the full (ViT) tier
+        executors: (fast, full) executors to run each tier on (None = inline)
+        precision / tta: Quality-profile settings, applied to whichever tier is a ViT
+
+    Returns:
+        Dict with emotion, confidence, all_probs, tier ('fast' or 'full'),
+        escalated and per-tier latencies in ms.
+    """
+    started = time.perf_counter()
+    emotion, confidence, all_probs = run_on(executors[0], predict_face, fast[0], fast[1], face_image, fast[2],
+                                            precision=precision, tta=tta)
+    fast_ms = (time.perf_counter() - started) * 1000.0
+    margin = top_margin(all_probs)
+
+    result = {
+        "emotion": emotion,
+        "confidence": confidence,
+        "all_probs": all_probs,
+        "tier": "fast",
+        "escalated": False,
+        "fast_confidence": confidence,
+        "fast_margin": margin,
+        "latency_ms": {"fast": round(fast_ms, 2)},
+    }
+
+    if confidence >= min_confidence and margin >= min_margin:
+        if stats is not None:
+            stats.record(False, fast_ms)
+        return result
+
+    started = time.perf_counter()
+    emotion, confidence, all_probs = run_on(
+        executors[1], predict_face, full[0], full[1], face_image, full[2], merge_ratio=merge_ratio,
+        precision=precision, tta=tta,
+    )
+    full_ms = (time.perf_counter() - started) * 1000.0
+    if stats is not None:
+        stats.record(True, fast_ms, full_ms)
+
+    result.update({
+        "emotion": emotion,
+        "confidence": confidence,
+        "all_probs": all_probs,
+        "tier": "full",
+        "escalated": True,
+    })
+    result["latency_ms"]["full"] = round(full_ms, 2)
+    return result
+
+
+def compare_predict(
+    models: Dict[str, Tuple[Any, str, list, float]],
+    face_image: Image.Image,
+    executors: Optional[Dict[str, InferenceExecutor]] = None,
+    precision: Optional[str] = None,
+    tta: bool = False,
+) -> Dict[str, Dict[str, Any]]:
+    """
+    Run the same face crop through several models at once (side-by-side mode).
+
+    Args:
+        models: Ordered {name: (model, model_type, labels, merge_ratio)}
+        face_image: Face crop shared by every model
+        executors: Per-model executors; every model with one runs concurrently,
+            the rest run sequentially on the calling thread
+        precision: Per-request ViT precision (quality profile), applied to every model
+        tta: Flip test-time augmentation for every model
+
+    Returns:
+        {name: {emotion, confidence, all_probs, latency_ms}} in the input order.
+    """
+    def _run(entry):
+        model, model_type, labels, merge_ratio = entry
+        started = time.perf_counter()
+        emotion, confidence, all_probs = predict_face(model, model_type, face_image, labels, merge_ratio=merge_ratio,
+                                                      precision=precision, tta=tta)
+        return {
+            "emotion": emotion,
+            "confidence": confidence,
+            "all_probs": all_probs,
+            "latency_ms": round((time.perf_counter() - started) * 1000.0, 2),
+        }
+
+    executors = executors or {}
+    futures = {name: executors[name].submit(_run, entry) for name, entry in models.items() if executors.get(name)}
+    return {
+        name: futures[name].result() if name in futures else _run(entry)
+        for name, entry in models.items()
+    }
@@ -0,0 +1,217 @@
+"""
+Per-model inference executors.
+
+Every loaded model variant runs behind its own small pool of worker threads.
+Request threads submit work and wait on a future instead of calling the model
+directly, so the number of concurrent forwards per model is fixed by
+configuration rather than by how many gthread workers happen to be busy.
+torch's intra-op thread count is process-wide and set once at startup, so
+all workers share one pool. Keras models are always served by a single
+worker because they are not guaranteed to be thread-safe.
+
+Queued work is scheduled with weighted fair queuing at two levels: across
+priority lanes (interactive, batch, shadow; weighted by LANE_WEIGHTS) and,
+within a lane, equally across clients. The lane and client come from the
+submitting context:
+
+    with inference_priority("batch", client_id):
+        executor.run(predict_faces, ...)
+"""
+import contextvars
+import heapq
+import itertools
+import threading
+import time
+import logging
+from collections import deque
+from concurrent.futures import Future
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+LANES = ("interactive", "batch", "shadow")
+LANE_WEIGHTS = {"interactive": 8.0, "batch": 2.0, "shadow": 1.0}
+
+_priority = contextvars.ContextVar("inference_priority", default=("interactive", "-"))
+
+
+@contextmanager
+def inference_priority(lane: str, client: str = "-"):
+    """Schedule executor work submitted inside this block on `lane`, fairly per `client`."""
+    token = _priority.set((lane if lane in LANES else "interactive", client or "-"))
+    try:
+        yield
+    finally:
+        _priority.reset(token)
+
+
+class FairQueue:
+    """
+    Self-clocked weighted fair queue: each item is tagged with its flow's
+    virtual finish time (max(virtual time, flow's last tag) + 1 / weight) and
+    the smallest tag is served first. FIFO within a flow.
+    """
+
+    def __init__(self):
+        self._heap = []
+        self._last: Dict[Any, float] = {}
+        self._vtime = 0.0
+        self._seq = itertools.count()
+
+    def __len__(self):
+        return len(self._heap)
+
+    def push(self, flow, item, weight: float = 1.0):
+        tag = max(self._vtime, self._last.get(flow, 0.0)) + 1.0 / max(weight, 1e-6)
+        self._last[flow] = tag
+        heapq.heappush(self._heap, (tag, next(self._seq), flow, item))
+
+    def pop(self) -> Tuple[Any, Any]:
+        tag, _, flow, item = heapq.heappop(self._heap)
+        self._vtime = tag
+        if len(self._last) > 1024:
+            # Idle flows restart from the virtual time anyway
+            self._last = {f: t for f, t in self._last.items() if t > self._vtime}
+        return flow, item
+
+
+class InferenceExecutor:
+    """
+    Fixed pool of worker threads for one model variant, with timing stats.
+    """
+
+    def __init__(self, name: str, workers: int = 1, lane_weights: Optional[Dict[str, float]] = None):
+        """
+        Args:
+            name: Model variant served (for thread names / metrics)
+            workers: Concurrent forwards allowed for this model
+            lane_weights: Overrides for LANE_WEIGHTS (share of the model per lane when all are busy)
+        """
+        self.name = name
+        self.workers = max(1, workers)
+        self.lane_weights = dict(LANE_WEIGHTS, **(lane_weights or {}))
+        # Lane-level queue holds one token per item; the item itself waits in its lane's client queue
+        self._lanes = FairQueue()
+        self._clients = {lane: FairQueue() for lane in LANES}
+        self._queued = {lane: 0 for lane in LANES}
+        self._lane_waits = {lane: deque(maxlen=1000) for lane in LANES}
+        self._lane_submitted = {lane: 0 for lane in LANES}
+        self._stopping = False
+        self._lock = threading.Lock()
+        self._not_empty = threading.Condition(self._lock)
+        self._worker_idents = set()
+        self.submitted = 0
+        self.completed = 0
+        self.failed = 0
+        self.in_flight = 0
+        self.max_queue_depth = 0
+        self.total_wait_ms = 0.0
+        self.total_run_ms = 0.0
+        self._threads = [
+            threading.Thread(target=self._worker, name=f"infer-{name}-{i}", daemon=True)
+            for i in range(self.workers)
+        ]
+        for t in self._threads:
+            t.start()
+
+    def submit(self, fn: Callable, *args, **kwargs) -> Future:
+        """Queue fn(*args, **kwargs) on this model's workers."""
+        future: Future = Future()
+        lane, client = _priority.get()
+        if threading.get_ident() in self._worker_idents:
+            # Already on one of our workers (nested call): run inline instead of deadlocking
+            self._execute(future, fn, args, kwargs, time.perf_counter(), lane)
+            return future
+        with self._lock:
+            self.submitted += 1
+            self._lane_submitted[lane] += 1
+            self._queued[lane] += 1
+            self._lanes.push(lane, None, weight=self.lane_weights.get(lane, 1.0))
+            self._clients[lane].push(client, (future, fn, args, kwargs, time.perf_counter()))
+            self.max_queue_depth = max(self.max_queue_depth, len(self._lanes))
+            self._not_empty.notify()
+        return future
+
+    def run(self, fn: Callable, *args, **kwargs) -> Any:
+        """Submit and wait for the result (exceptions are re-raised in the caller)."""
+        return self.submit(fn, *args, **kwargs).result()
+
+    def _execute(self, future: Future, fn, args, kwargs, enqueued_at: float, lane: str):
+        if not future.set_running_or_notify_cancel():
+            return
+        started = time.perf_counter()
+        wait_ms = (started - enqueued_at) * 1000.0
+        with self._lock:
+            self.in_flight += 1
+            self.total_wait_ms += wait_ms
+            self._lane_waits[lane].append(wait_ms)
+        try:
+            result = fn(*args, **kwargs)
+        except BaseException as exc:
+            with self._lock:
+                self.failed += 1
+            future.set_exception(exc)
+        else:
+            future.set_result(result)
+        finally:
+            with self._lock:
+                self.in_flight -= 1
+                self.completed += 1
+                self.total_run_ms += (time.perf_counter() - started) * 1000.0
+
+    def _worker(self):
+        self._worker_idents.add(threading.get_ident())
+        while True:
+            with self._lock:
+                while not self._lanes and not self._stopping:
+                    self._not_empty.wait()
+                if not self._lanes:
+                    return
+                lane, _ = self._lanes.pop()
+                _, (future, fn, args, kwargs, enqueued_at) = self._clients[lane].pop()
+                self._queued[lane] -= 1
+            self._execute(future, fn, args, kwargs, enqueued_at, lane)
+
+    def queued(self, lane: Optional[str] = None) -> int:
+        """Items waiting (in one lane, or in total)."""
+        with self._lock:
+            return self._queued[lane] if lane else len(self._lanes)
+
+    def shutdown(self):
+        with self._lock:
+            self._stopping = True
+            self._not_empty.notify_all()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            done = max(self.completed, 1)
+            lanes = {}
+            for lane in LANES:
+                waits = sorted(self._lane_waits[lane])
+                lanes[lane] = {
+                    "weight": self.lane_weights.get(lane, 1.0),
+                    "queued": self._queued[lane],
+                    "submitted": self._lane_submitted[lane],
+                    "avg_wait_ms": round(sum(waits) / len(waits), 2) if waits else 0.0,
+                    "p99_wait_ms": round(waits[min(len(waits) - 1, int(len(waits) * 0.99))], 2) if waits else 0.0,
+                }
+            return {
+                "workers": self.workers,
+                "queue_depth": len(self._lanes),
+                "max_queue_depth": self.max_queue_depth,
+                "in_flight": self.in_flight,
+                "submitted": self.submitted,
+                "completed": self.completed,
+                "failed": self.failed,
+                "avg_wait_ms": round(self.total_wait_ms / done, 2),
+                "avg_run_ms": round(self.total_run_ms / done, 2),
+                "lanes": lanes,
+            }
+
+
+def run_on(executor: Optional[InferenceExecutor], fn: Callable, *args, **kwargs) -> Any:
+    """Run fn on `executor` if given, else inline on the calling thread."""
+    if executor is None:
+        return fn(*args, **kwargs)
+    return executor.run(fn, *args, **kwargs)
@@ -0,0 +1,417 @@
+"""
+Router mode: one HTTP front process, N inference worker processes.
+
+Every gunicorn worker holds its own copy of each model, so adding HTTP
+workers multiplies model memory. With INFERENCE_ROUTER_WORKERS = N the front
+keeps validation, rate limiting, face detection and the DB, and holds no
+models. It forwards the 224x224 face crops over Unix domain sockets to N
+worker processes (app/inference_worker.py). Each worker loads the models
+once, is pinned to its own subset of cores and runs torch with that many
+threads.
+
+The front talks to workers through RemoteModel handles placed in the usual
+ModelSlots. predict_face / predict_faces see a RemoteModel and call the
+router, so every endpoint, the inference executors (lanes, fair queuing) and
+admission control work unchanged. Each call goes to the least-loaded healthy
+worker. A health thread pings the workers and restarts any process it
+spawned that has exited. A request that fails on one worker is retried once
+on another when the worker's connection broke; a request that only timed out
+(slow, large batches) fails on its own without marking the worker unhealthy,
+since health is decided by the pings.
+
+Wire format (both directions): an 8-byte header (JSON length, payload length,
+big-endian uint32) followed by a UTF-8 JSON header and the raw payload. The
+payload of a predict request is the crops' uint8 RGB pixels, concatenated.
+Only the socket path is transport-specific, so TCP workers on other nodes
+can be added later.
+"""
+import atexit
+import json
+import os
+import queue
+import socket
+import struct
+import subprocess
+import sys
+import threading
+import time
+import logging
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+_FRAME = struct.Struct(">II")
+
+
+class RouterUnavailable(RuntimeError):
+    """No healthy inference worker could serve the request."""
+
+
+class RouterTimeout(RuntimeError):
+    """A worker did not answer within the request's timeout."""
+
+
+# ----------------------------
+# Wire protocol
+# ----------------------------
+def _recv_exact(sock: socket.socket, size: int) -> bytes:
+    buf = bytearray(size)
+    view = memoryview(buf)
+    got = 0
+    while got < size:
+        n = sock.recv_into(view[got:], size - got)
+        if n == 0:
+            raise ConnectionError("Connection closed by peer")
+        got += n
+    return bytes(buf)
+
+
+def send_message(sock: socket.socket, header: Dict[str, Any], payload: bytes = b""):
+    data = json.dumps(header).encode("utf-8")
+    sock.sendall(_FRAME.pack(len(data), len(payload)) + data + payload)
+
+
+def recv_message(sock: socket.socket) -> Tuple[Dict[str, Any], bytes]:
+    header_len, payload_len = _FRAME.unpack(_recv_exact(sock, _FRAME.size))
+    header = json.loads(_recv_exact(sock, header_len).decode("utf-8"))
+    payload = _recv_exact(sock, payload_len) if payload_len else b""
+    return header, payload
+
+
+def encode_crops(images: List) -> Tuple[List[List[int]], bytes]:
+    """PIL crops -> (shapes, concatenated RGB bytes)."""
+    arrays = [np.asarray(image if image.mode == "RGB" else image.convert("RGB"), dtype=np.uint8) for image in images]
+    return [list(a.shape) for a in arrays], b"".join(a.tobytes() for a in arrays)
+
+
+def decode_crops(shapes: List[List[int]], payload: bytes) -> List:
+    from PIL import Image
+
+    images, offset = [], 0
+    for shape in shapes:
+        size = int(np.prod(shape))
+        images.append(Image.fromarray(np.frombuffer(payload, dtype=np.uint8, count=size, offset=offset).reshape(shape), "RGB"))
+        offset += size
+    return images
+
+
+def split_cores(workers: int, cores: Optional[List[int]] = None) -> List[List[int]]:
+    """Divide the usable cores into `workers` contiguous groups (groups repeat if cores < workers)."""
+    cores = sorted(cores if cores is not None else os.sched_getaffinity(0))
+    per = max(1, len(cores) // workers)
+    return [cores[(i * per) % len(cores):(i * per) % len(cores) + per] for i in range(workers)]
+
+
+# ----------------------------
+# Front side
+# ----------------------------
+class RemoteModel:
+    """Stands in for a model dict in ModelHandle.model; predictions run on the router's workers."""
+
+    def __init__(self, router: "InferenceRouter", variant: str):
+        self.router = router
+        self.variant = variant
+
+    def predict_faces(self, face_images: List, merge_ratio: float = 0.0, precision: Optional[str] = None,
+                      tta: bool = False) -> List[Tuple[str, float, Dict[str, float]]]:
+        return self.router.predict(self.variant, face_images, merge_ratio=merge_ratio, precision=precision, tta=tta)
+
+
+class _Worker:
+    def __init__(self, index: int, socket_path: str, cores: List[int]):
+        self.index = index
+        self.socket_path = socket_path
+        self.cores = cores
+        self.process: Optional[subprocess.Popen] = None
+        self.healthy = False
+        self.in_flight = 0
+        self.requests = 0
+        self.failures = 0
+        self.timeouts = 0
+        self.restarts = 0
+        self.last_error: Optional[str] = None
+        self.idle: "queue.LifoQueue" = queue.LifoQueue()
+
+    def connect(self, timeout: float) -> socket.socket:
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        sock.settimeout(timeout)
+        try:
+            sock.connect(self.socket_path)
+        except OSError:
+            sock.close()
+            raise
+        return sock
+
+    def close_idle(self):
+        while True:
+            try:
+                self.idle.get_nowait().close()
+            except queue.Empty:
+                return
+
+
+class InferenceRouter:
+    """
+    Least-loaded dispatch of face crops to inference worker processes over Unix sockets.
+    """
+
+    def __init__(
+        self,
+        workers: int,
+        socket_dir: str,
+        spawn: bool = True,
+        precision: str = "fp32",
+        timeout: float = 30.0,
+        timeout_per_image: float = 1.0,
+        health_interval: float = 2.0,
+        start_timeout: float = 300.0,
+    ):
+        """
+        Args:
+            workers: Number of inference worker processes
+            socket_dir: Directory holding worker-<i>.sock
+            spawn: Start the workers from this process (False: they are run separately
+                   with `python -m app.inference_worker --workers N`, e.g. for several gunicorn workers)
+            precision: VIT_PRECISION passed to spawned workers
+            timeout: Socket timeout per request (seconds)
+            timeout_per_image: Added to `timeout` for every crop in the request (doubled with tta)
+            health_interval: Seconds between health checks
+            start_timeout: How long start() waits for the workers to load their models
+        """
+        self.socket_dir = socket_dir
+        self.spawn = spawn
+        self.precision = precision
+        self.timeout = timeout
+        self.timeout_per_image = timeout_per_image
+        self.health_interval = health_interval
+        self.start_timeout = start_timeout
+        self.lock = threading.Lock()
+        self._workers = [
+            _Worker(i, os.path.join(socket_dir, f"worker-{i}.sock"), cores)
+            for i, cores in enumerate(split_cores(max(1, workers)))
+        ]
+        self._variants: Dict[str, Dict[str, Any]] = {}
+        self._described: set = set()
+        self.retries = 0
+        self._stopping = False
+
+    @property
+    def size(self) -> int:
+        return len(self._workers)
+
+    def start(self) -> "InferenceRouter":
+        os.makedirs(self.socket_dir, exist_ok=True)
+        if self.spawn:
+            for worker in self._workers:
+                self._spawn(worker)
+            atexit.register(self.shutdown)
+        deadline = time.monotonic() + self.start_timeout
+        while time.monotonic() < deadline:
+            self._check_health()
+            if all(w.healthy for w in self._workers):
+                break
+            if self.spawn and all(w.process is not None and w.process.poll() is not None for w in self._workers):
+                raise RouterUnavailable("All inference workers exited during startup")
+            time.sleep(0.5)
+        ready = [w for w in self._workers if w.healthy]
+        if not ready:
+            raise RouterUnavailable(f"No inference worker answered on {self.socket_dir} within {self.start_timeout:.0f}s")
+        print(f"[ROUTER] {len(ready)}/{self.size} inference workers ready "
+              f"(cores: {', '.join(','.join(map(str, w.cores)) for w in self._workers)})")
+        threading.Thread(target=self._health_loop, name="router-health", daemon=True).start()
+        return self
+
+    def _spawn(self, worker: _Worker):
+        if os.path.exists(worker.socket_path):
+            os.remove(worker.socket_path)
+        backend_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+        worker.process = subprocess.Popen(
+            [sys.executable, "-m", "app.inference_worker",
+             "--socket", worker.socket_path,
+             "--cores", ",".join(map(str, worker.cores)),
+             "--precision", self.precision],
+            cwd=backend_dir,
+        )
+
+    # ----------------------------
+    # Health
+    # ----------------------------
+    def _ping(self, worker: _Worker) -> Dict[str, Any]:
+        sock = worker.connect(timeout=min(self.timeout, 5.0))
+        try:
+            send_message(sock, {"op": "info"})
+            header, _ = recv_message(sock)
+            return header
+        finally:
+            sock.close()
+
+    def _check_health(self):
+        for worker in self._workers:
+            if self.spawn and worker.process is not None and worker.process.poll() is not None and not self._stopping:
+                print(f"[ROUTER] Worker {worker.index} exited (code {worker.process.returncode}); restarting")
+                worker.healthy = False
+                worker.close_idle()
+                worker.restarts += 1
+                self._spawn(worker)
+                continue
+            try:
+                info = self._ping(worker)
+            except OSError as exc:
+                if worker.healthy:
+                    logger.warning("Inference worker %d failed its health check: %s", worker.index, exc)
+                worker.healthy = False
+                worker.last_error = str(exc)
+                worker.close_idle()
+                continue
+            with self.lock:
+                for name, meta in info.get("variants", {}).items():
+                    self._variants.setdefault(name, meta)
+            worker.healthy = True
+
+    def _health_loop(self):
+        while not self._stopping:
+            time.sleep(self.health_interval)
+            try:
+                self._check_health()
+            except Exception:
+                logger.exception("Router health check failed")
+
+    # ----------------------------
+    # Dispatch
+    # ----------------------------
+    def _pick(self, exclude: Optional[_Worker] = None) -> _Worker:
+        with self.lock:
+            candidates = [w for w in self._workers if w.healthy and w is not exclude]
+            if not candidates:
+                raise RouterUnavailable("No healthy inference workers")
+            worker = min(candidates, key=lambda w: (w.in_flight, w.requests))
+            worker.in_flight += 1
+            worker.requests += 1
+            return worker
+
+    def _call_on(self, worker: _Worker, header: Dict[str, Any], payload: bytes, timeout: float) -> Dict[str, Any]:
+        try:
+            try:
+                sock = worker.idle.get_nowait()
+            except queue.Empty:
+                sock = worker.connect(self.timeout)
+            sock.settimeout(timeout)
+            try:
+                send_message(sock, header, payload)
+                reply, _ = recv_message(sock)
+            except BaseException:
+                sock.close()
+                raise
+            worker.idle.put(sock)
+            return reply
+        finally:
+            with self.lock:
+                worker.in_flight -= 1
+
+    def call(self, header: Dict[str, Any], payload: bytes = b"", timeout: Optional[float] = None) -> Dict[str, Any]:
+        """
+        Send one request to the least-loaded worker, retrying once elsewhere on connection errors.
+        A timeout is not retried and leaves the worker healthy: the work is slow, not lost.
+        """
+        timeout = timeout or self.timeout
+        worker = self._pick()
+        try:
+            reply = self._call_on(worker, header, payload, timeout)
+        except socket.timeout as exc:
+            with self.lock:
+                worker.timeouts += 1
+                worker.last_error = f"timed out after {timeout:.1f}s"
+            raise RouterTimeout(f"Inference worker {worker.index} did not answer within {timeout:.1f}s") from exc
+        except (OSError, ValueError) as exc:
+            with self.lock:
+                worker.healthy = False
+                worker.failures += 1
+                worker.last_error = str(exc)
+                self.retries += 1
+            worker.close_idle()
+            logger.warning("Inference worker %d failed (%s); retrying on another worker", worker.index, exc)
+            reply = self._call_on(self._pick(exclude=worker), header, payload, timeout)
+        if "error" in reply:
+            raise RuntimeError(f"Inference worker error: {reply['error']}")
+        return reply
+
+    def predict(self, variant: str, face_images: List, merge_ratio: float = 0.0, precision: Optional[str] = None,
+                tta: bool = False) -> List[Tuple[str, float, Dict[str, float]]]:
+        if not face_images:
+            return []
+        shapes, payload = encode_crops(face_images)
+        per_image = self.timeout_per_image * (2 if tta else 1)
+        reply = self.call({
+            "op": "predict", "model": variant, "shapes": shapes,
+            "merge_ratio": merge_ratio, "precision": precision, "tta": tta,
+        }, payload, timeout=self.timeout + per_image * len(face_images))
+        return [(emotion, confidence, probs) for emotion, confidence, probs in reply["results"]]
+
+    def load_variant(self, force_model: str, **_ignored):
+        """
+        Drop-in for load_emotion_model in the front process: (RemoteModel, labels, version, model_type).
+
+        The first call per variant returns what the workers loaded at startup; later
+        calls (admin reload, checkpoint watcher) make every worker reload it first.
+        """
+        if force_model in self._described:
+            replies = []
+            for worker in [w for w in self._workers if w.healthy]:
+                sock = worker.connect(timeout=self.start_timeout)
+                try:
+                    send_message(sock, {"op": "reload", "model": force_model})
+                    replies.append(recv_message(sock)[0])
+                finally:
+                    sock.close()
+            errors = [r["error"] for r in replies if "error" in r]
+            if errors or not replies:
+                raise RuntimeError(f"Reload of {force_model} failed on workers: {errors or 'no healthy workers'}")
+            with self.lock:
+                self._variants[force_model] = replies[0]["variant"]
+        self._described.add(force_model)
+        meta = self._variants.get(force_model)
+        if meta is None:
+            raise FileNotFoundError(f"Model variant {force_model!r} is not loaded by the inference workers")
+        if meta["model_type"] not in ("vit", "student"):
+            # RemoteModel only implements predict_faces; the Keras path would call .predict on it
+            raise RuntimeError(f"Router mode serves ViT and student models only; {force_model} is {meta['model_type']}")
+        return RemoteModel(self, force_model), meta["labels"], meta["version"], meta["model_type"]
+
+    def shutdown(self):
+        self._stopping = True
+        for worker in self._workers:
+            worker.close_idle()
+            if worker.process is not None and worker.process.poll() is None:
+                worker.process.terminate()
+        for worker in self._workers:
+            if worker.process is not None:
+                try:
+                    worker.process.wait(timeout=5.0)
+                except subprocess.TimeoutExpired:
+                    worker.process.kill()
+
+    def stats(self) -> Dict[str, Any]:
+        with self.lock:
+            return {
+                "workers": [
+                    {
+                        "index": w.index,
+                        "socket": w.socket_path,
+                        "cores": w.cores,
+                        "pid": w.process.pid if w.process is not None else None,
+                        "healthy": w.healthy,
+                        "in_flight": w.in_flight,
+                        "requests": w.requests,
+                        "failures": w.failures,
+                        "timeouts": w.timeouts,
+                        "restarts": w.restarts,
+                        "last_error": w.last_error,
+                    }
+                    for w in self._workers
+                ],
+                "healthy": sum(1 for w in self._workers if w.healthy),
+                "retries": self.retries,
+                "variants": {name: meta["version"] for name, meta in self._variants.items()},
+            }
@@ -0,0 +1,213 @@
+"""
+Inference worker process for router mode (see app/inference_router.py).
+
+Loads the ViT / student variants once, pins itself to its cores and answers
+requests from the HTTP front on a Unix domain socket:
+
+  {"op": "info"}                               -> variants, pid, cores, in_flight
+  {"op": "predict", "model", "shapes", ...}    -> {"results": [[emotion, confidence, probs], ...]}
+  {"op": "reload", "model"}                    -> {"variant": {...}} after reloading it
+
+Started by the front (INFERENCE_ROUTER_SPAWN=1) or on its own, e.g. when
+several gunicorn workers share one set of inference workers:
+
+  python -m app.inference_worker --workers 4 --socket-dir /tmp/emotion-router
+"""
+import argparse
+import os
+import signal
+import socket
+import subprocess
+import sys
+import threading
+import time
+import logging
+from typing import Any, Dict, List
+
+logger = logging.getLogger(__name__)
+
+VARIANTS = ("base", "fine-tuned", "fast")
+
+
+class WorkerState:
+    """Loaded variants of one worker process plus its single inference executor."""
+
+    def __init__(self, cores: List[int], precision: str):
+        from app.hardware import resolve_precision
+        from app.inference_executor import InferenceExecutor
+
+        self.cores = cores
+        self.precision, _ = resolve_precision(precision)
+        self.lock = threading.Lock()
+        self.in_flight = 0
+        self.handles: Dict[str, tuple] = {}
+        # One forward at a time, using all of this worker's cores (torch threads are process-wide)
+        if cores:
+            import torch
+            torch.set_num_threads(len(cores))
+        self.executor = InferenceExecutor("worker", workers=1)
+        for variant in VARIANTS:
+            try:
+                self.load(variant)
+            except Exception as exc:
+                print(f"[WORKER] {variant} model not available: {exc}")
+
+    def load(self, variant: str):
+        from app.model_loader import load_emotion_model
+        from app.model_registry import unpack_model_result
+
+        kwargs = {"force_model": variant}
+        if variant != "fast":
+            kwargs["precision"] = self.precision
+        if variant == "fine-tuned" and "base" in self.handles and self.handles["base"][3] == "vit":
+            kwargs["base_model"] = self.handles["base"][0]
+        model, labels, version, model_type = unpack_model_result(load_emotion_model(**kwargs))
+        if model is None or model_type not in ("vit", "student"):
+            raise RuntimeError(f"{variant} is a {model_type} model; router mode serves ViT and student models")
+        self.handles[variant] = (model, list(labels or []), version, model_type)
+        print(f"[WORKER] {os.getpid()}: {variant} loaded (version={version}, type={model_type})")
+        # A delta fine-tuned variant still points at the old base tensors; rebuild it on the new base
+        finetuned = self.handles.get("fine-tuned")
+        if variant == "base" and finetuned is not None and isinstance(finetuned[0], dict) and finetuned[0].get("delta"):
+            self.load("fine-tuned")
+
+    def describe(self, variant: str) -> Dict[str, Any]:
+        _, labels, version, model_type = self.handles[variant]
+        return {"labels": labels, "version": version, "model_type": model_type}
+
+    def handle(self, header: Dict[str, Any], payload: bytes) -> Dict[str, Any]:
+        op = header.get("op")
+        if op == "info":
+            return {
+                "pid": os.getpid(),
+                "cores": self.cores,
+                "in_flight": self.in_flight,
+                "variants": {name: self.describe(name) for name in self.handles},
+            }
+        if op == "predict":
+            return {"results": self._predict(header, payload)}
+        if op == "reload":
+            self.load(header["model"])
+            return {"variant": self.describe(header["model"])}
+        return {"error": f"unknown op {op!r}"}
+
+    def _predict(self, header: Dict[str, Any], payload: bytes) -> List:
+        from app.inference import predict_face, predict_faces
+        from app.inference_router import decode_crops
+
+        if header["model"] not in self.handles:
+            raise RuntimeError(f"Model {header['model']} not loaded")
+        model, labels, _, model_type = self.handles[header["model"]]
+        images = decode_crops(header["shapes"], payload)
+        merge_ratio = float(header.get("merge_ratio") or 0.0)
+        precision, tta = header.get("precision"), bool(header.get("tta"))
+        with self.lock:
+            self.in_flight += 1
+        try:
+            if tta:
+                return [
+                    self.executor.run(predict_face, model, model_type, image, labels, merge_ratio=merge_ratio,
+                                      precision=precision, tta=True)
+                    for image in images
+                ]
+            return self.executor.run(predict_faces, model, model_type, images, labels, merge_ratio=merge_ratio,
+                                     precision=precision)
+        finally:
+            with self.lock:
+                self.in_flight -= 1
+
+
+def _serve_connection(conn: socket.socket, state: WorkerState):
+    from app.inference_router import send_message, recv_message
+
+    with conn:
+        while True:
+            try:
+                header, payload = recv_message(conn)
+            except (ConnectionError, OSError):
+                return
+            try:
+                reply = state.handle(header, payload)
+            except Exception as exc:
+                logger.exception("Worker request failed")
+                reply = {"error": str(exc)}
+            try:
+                send_message(conn, reply)
+            except OSError:
+                return
+
+
+def serve(socket_path: str, cores: List[int], precision: str):
+    """Load the models and answer requests on socket_path until terminated."""
+    if cores and hasattr(os, "sched_setaffinity"):
+        os.sched_setaffinity(0, cores)
+    # Model loading happens before the socket exists, so the front's health check
+    # only sees this worker once it can actually serve
+    state = WorkerState(cores, precision)
+
+    if os.path.exists(socket_path):
+        os.remove(socket_path)
+    server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    server.bind(socket_path)
+    server.listen(64)
+    print(f"[WORKER] {os.getpid()} serving on {socket_path} (cores {','.join(map(str, cores))})")
+    signal.signal(signal.SIGTERM, lambda *_: sys.exit(0))
+    try:
+        while True:
+            conn, _ = server.accept()
+            threading.Thread(target=_serve_connection, args=(conn, state), daemon=True).start()
+    finally:
+        server.close()
+        if os.path.exists(socket_path):
+            os.remove(socket_path)
+
+
+def supervise(workers: int, socket_dir: str, precision: str):
+    """Run N pinned workers as children, restarting any that exit."""
+    from app.inference_router import split_cores
+
+    os.makedirs(socket_dir, exist_ok=True)
+    groups = split_cores(workers)
+
+    def _start(i):
+        return subprocess.Popen([
+            sys.executable, "-m", "app.inference_worker",
+            "--socket", os.path.join(socket_dir, f"worker-{i}.sock"),
+            "--cores", ",".join(map(str, groups[i])),
+            "--precision", precision,
+        ])
+
+    children = [_start(i) for i in range(workers)]
+    signal.signal(signal.SIGTERM, lambda *_: sys.exit(0))
+    try:
+        while True:
+            time.sleep(1.0)
+            for i, child in enumerate(children):
+                if child.poll() is not None:
+                    print(f"[WORKER] Worker {i} exited (code {child.returncode}); restarting")
+                    children[i] = _start(i)
+    finally:
+        for child in children:
+            child.terminate()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Inference worker(s) for router mode")
+    parser.add_argument("--socket", help="Serve one worker on this Unix socket")
+    parser.add_argument("--cores", default="", help="Comma-separated CPU cores to pin to")
+    parser.add_argument("--workers", type=int, default=0, help="Supervise N workers in --socket-dir instead")
+    parser.add_argument("--socket-dir", default=os.environ.get("INFERENCE_ROUTER_SOCKET_DIR", "/tmp/emotion-router"))
+    parser.add_argument("--precision", default=os.environ.get("VIT_PRECISION", "fp32"))
+    args = parser.parse_args()
+
+    if args.workers > 0:
+        supervise(args.workers, args.socket_dir, args.precision)
+    elif args.socket:
+        cores = [int(c) for c in args.cores.split(",") if c.strip()]
+        serve(args.socket, cores, args.precision)
+    else:
+        parser.error("pass --socket (one worker) or --workers N (supervisor)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,332 @@
+"""
+Offline job queue for workloads too large for one HTTP request.
+
+POST /jobs stores the inputs (an uploaded .zip, extracted to JOBS_DIR/<id>/,
+or a folder under JOBS_INPUT_ROOT) with a manifest, then inserts a queued row
+in the jobs table. JobRunner threads claim jobs from SQLite, run batched
+inference in chunks and commit each chunk's results together with the job's
+progress, so a restarted server resumes a job where it stopped: the claim
+query also picks up running jobs whose worker stopped heartbeating.
+
+Job workers submit on the executor's batch lane and wait while interactive
+work is queued on the model, so live traffic keeps priority. The workers'
+own threads (reading and face detection) run at a lower OS priority; the
+forward runs on the executor, which the nice value does not reach.
+"""
+import json
+import os
+import shutil
+import socket
+import threading
+import time
+import uuid
+import zipfile
+import zlib
+import logging
+from typing import Any, Dict, List, Optional
+
+from werkzeug.utils import secure_filename
+
+from .db_logger import (
+    create_job, get_job, claim_next_job, get_job_done_indices, log_job_results, finish_job, heartbeat_job,
+)
+from .inference_executor import inference_priority
+
+logger = logging.getLogger(__name__)
+
+MANIFEST = "manifest.json"
+
+
+def _lower_thread_priority(niceness: int = 10):
+    """Best effort: raise this thread's nice value (Linux schedules threads individually)."""
+    try:
+        os.setpriority(os.PRIO_PROCESS, threading.get_native_id(), niceness)
+    except (AttributeError, OSError):
+        pass
+
+
+class JobError(Exception):
+    """Invalid job submission (bad archive, folder outside the allowed root, ...)."""
+
+
+def _list_images(root: str, allowed_extensions: tuple) -> List[str]:
+    found = []
+    for dirpath, dirnames, filenames in os.walk(root):
+        dirnames[:] = sorted(d for d in dirnames if not d.startswith(".") and d != "__MACOSX")
+        for name in sorted(filenames):
+            if not name.startswith(".") and os.path.splitext(name)[1].lower() in allowed_extensions:
+                found.append(os.path.join(dirpath, name))
+    return found
+
+
+class JobRunner:
+    """
+    Background workers that drain the SQLite job queue with batched inference.
+    """
+
+    def __init__(
+        self,
+        db_path: str,
+        jobs_dir: str,
+        model_slots: Dict[str, Any],
+        executors: Dict[str, Any],
+        workers: int = 1,
+        batch_size: int = 16,
+        input_root: Optional[str] = None,
+        max_images: int = 100000,
+        max_file_size: int = 5 * 1024 * 1024,
+        allowed_extensions: tuple = (".jpg", ".jpeg", ".png"),
+        poll_interval: float = 1.0,
+        stale_after: float = 120.0,
+        model_wait: float = 600.0,
+    ):
+        """
+        Args:
+            db_path: SQLite database holding the jobs / job_results tables
+            jobs_dir: Where uploaded archives are extracted (one directory per job)
+            model_slots: ModelSlot per variant
+            executors: InferenceExecutor per variant (shared with /detect)
+            workers: Job worker threads (jobs processed concurrently)
+            batch_size: Images per batched forward
+            input_root: Server-side folder jobs may read from (None disables folder jobs)
+            max_images: Maximum inputs per job
+            max_file_size: Per-image size limit for archive entries
+            poll_interval: Seconds between queue polls when idle
+            stale_after: Seconds without a heartbeat before a running job is reclaimed
+            model_wait: How long a chunk waits for its model (e.g. during a hot reload)
+                before the job fails
+        """
+        self.db_path = db_path
+        self.jobs_dir = jobs_dir
+        self.model_slots = model_slots
+        self.executors = executors
+        self.workers = max(1, workers)
+        self.batch_size = max(1, batch_size)
+        self.input_root = os.path.realpath(input_root) if input_root else None
+        self.max_images = max_images
+        self.max_file_size = max_file_size
+        self.allowed_extensions = allowed_extensions
+        self.poll_interval = poll_interval
+        self.stale_after = stale_after
+        self.model_wait = model_wait
+        self.worker_id = f"{socket.gethostname()}:{os.getpid()}"
+        self.lock = threading.Lock()
+        self.active: Dict[str, str] = {}
+        self.images_processed = 0
+        self.yield_waits = 0
+        self.model_waits = 0
+        self._threads: List[threading.Thread] = []
+        os.makedirs(jobs_dir, exist_ok=True)
+
+    def start(self) -> "JobRunner":
+        for i in range(self.workers):
+            t = threading.Thread(target=self._run, name=f"jobs-{i}", daemon=True)
+            t.start()
+            self._threads.append(t)
+        return self
+
+    # ----------------------------
+    # Submission
+    # ----------------------------
+    def create_from_archive(self, file, model: str) -> Dict:
+        """Extract an uploaded .zip into a new job directory and queue it."""
+        job_id = uuid.uuid4().hex
+        input_dir = os.path.join(self.jobs_dir, job_id, "input")
+        os.makedirs(input_dir, exist_ok=True)
+        entries = []
+        try:
+            with zipfile.ZipFile(file.stream) as zf:
+                for info in zf.infolist():
+                    name = os.path.basename(info.filename)
+                    if info.is_dir() or not name or name.startswith(".") or info.filename.startswith("__MACOSX/"):
+                        continue
+                    if os.path.splitext(name)[1].lower() not in self.allowed_extensions:
+                        continue
+                    if len(entries) >= self.max_images:
+                        raise JobError(f"Too many images in archive. Maximum: {self.max_images}")
+                    # Flattened, index-prefixed names: no path traversal, no collisions
+                    target = os.path.join(input_dir, f"{len(entries):06d}_{secure_filename(name) or 'image'}")
+                    if info.file_size > self.max_file_size:
+                        entries.append({"path": info.filename, "file": None, "error": "File too large"})
+                        continue
+                    # The declared size can understate the real one; never store a truncated image.
+                    # zipfile stops at the declared size and then fails the CRC check, so a
+                    # mismatch fails only this entry instead of the whole archive
+                    try:
+                        with zf.open(info) as src:
+                            data = src.read(self.max_file_size + 1)
+                    except (zipfile.BadZipFile, zlib.error, EOFError):
+                        entries.append({"path": info.filename, "file": None,
+                                        "error": "Corrupt archive entry (size or CRC mismatch)"})
+                        continue
+                    if len(data) > self.max_file_size:
+                        entries.append({"path": info.filename, "file": None, "error": "File too large"})
+                        continue
+                    with open(target, "wb") as dst:
+                        dst.write(data)
+                    entries.append({"path": info.filename, "file": target})
+            return self._create(job_id, model, f"upload:{file.filename}", entries)
+        except (zipfile.BadZipFile, JobError) as exc:
+            shutil.rmtree(os.path.join(self.jobs_dir, job_id), ignore_errors=True)
+            if isinstance(exc, zipfile.BadZipFile):
+                raise JobError("Invalid zip archive")
+            raise
+
+    def create_from_folder(self, folder: str, model: str) -> Dict:
+        """Queue every image under a folder inside JOBS_INPUT_ROOT."""
+        if self.input_root is None:
+            raise JobError("Folder jobs are disabled (JOBS_INPUT_ROOT not set)")
+        path = os.path.realpath(os.path.join(self.input_root, folder))
+        if os.path.commonpath([path, self.input_root]) != self.input_root:
+            raise JobError("Folder must be inside JOBS_INPUT_ROOT")
+        if not os.path.isdir(path):
+            raise JobError(f"Folder not found: {folder}")
+        files = _list_images(path, self.allowed_extensions)
+        if len(files) > self.max_images:
+            raise JobError(f"Too many images in folder ({len(files)}). Maximum: {self.max_images}")
+        entries = [{"path": os.path.relpath(f, self.input_root), "file": f} for f in files]
+        return self._create(uuid.uuid4().hex, model, f"folder:{os.path.relpath(path, self.input_root)}", entries)
+
+    def _create(self, job_id: str, model: str, source: str, entries: List[Dict]) -> Dict:
+        if not entries:
+            raise JobError("No images found")
+        job_dir = os.path.join(self.jobs_dir, job_id)
+        os.makedirs(job_dir, exist_ok=True)
+        # The manifest fixes the input order, so a resumed job sees the same indices
+        with open(os.path.join(job_dir, MANIFEST), "w", encoding="utf-8") as f:
+            json.dump(entries, f)
+        create_job(self.db_path, job_id, model, source, job_dir, len(entries))
+        print(f"[JOBS] Queued job {job_id}: {len(entries)} images ({source}, model={model})")
+        return get_job(self.db_path, job_id)
+
+    # ----------------------------
+    # Workers
+    # ----------------------------
+    def _run(self):
+        _lower_thread_priority()
+        while True:
+            try:
+                job = claim_next_job(self.db_path, self.worker_id, self.stale_after)
+            except Exception:
+                logger.exception("Failed to claim a job")
+                job = None
+            if job is None:
+                time.sleep(self.poll_interval)
+                continue
+            with self.lock:
+                self.active[job["id"]] = threading.current_thread().name
+            try:
+                self._process(job)
+                finish_job(self.db_path, job["id"], "done")
+                print(f"[JOBS] Job {job['id']} done")
+            except Exception as exc:
+                logger.exception("Job %s failed", job["id"])
+                try:
+                    finish_job(self.db_path, job["id"], "failed", str(exc))
+                except Exception:
+                    logger.exception("Failed to mark job %s failed", job["id"])
+            finally:
+                with self.lock:
+                    self.active.pop(job["id"], None)
+
+    def _yield_to_interactive(self, executor, max_wait: float = 5.0):
+        """Hold off while /detect requests are queued on this model (bounded, so jobs never starve)."""
+        deadline = time.monotonic() + max_wait
+        waited = False
+        while executor.queued("interactive") > 0 and time.monotonic() < deadline:
+            waited = True
+            time.sleep(0.02)
+        if waited:
+            with self.lock:
+                self.yield_waits += 1
+
+    def _acquire_model(self, slot, job_id: str):
+        """
+        The slot's current handle, waiting with backoff while it has none (a hot
+        reload in progress) and heartbeating so the job is not reclaimed meanwhile.
+        """
+        deadline = time.monotonic() + self.model_wait
+        delay = 0.5
+        handle = slot.acquire()
+        if handle is None:
+            with self.lock:
+                self.model_waits += 1
+            print(f"[JOBS] Job {job_id}: model {slot.name} not loaded, waiting up to {self.model_wait:.0f}s")
+        while handle is None:
+            if time.monotonic() >= deadline:
+                raise RuntimeError(f"Model {slot.name} not loaded after waiting {self.model_wait:.0f}s")
+            time.sleep(delay)
+            delay = min(delay * 2, 10.0)
+            heartbeat_job(self.db_path, job_id)
+            handle = slot.acquire()
+        return handle
+
+    def _process(self, job: Dict):
+        from .inference import predict_faces
+        from .vit_utils import preprocess_face_for_vit
+
+        with open(os.path.join(job["job_dir"], MANIFEST), "r", encoding="utf-8") as f:
+            entries = json.load(f)
+        done = get_job_done_indices(self.db_path, job["id"])
+        pending = [i for i in range(len(entries)) if i not in done]
+        if done:
+            print(f"[JOBS] Resuming job {job['id']}: {len(done)}/{len(entries)} already done")
+        slot = self.model_slots.get(job["model"]) or self.model_slots["base"]
+        executor = self.executors[slot.name]
+
+        for start in range(0, len(pending), self.batch_size):
+            chunk = pending[start:start + self.batch_size]
+            results, ready = {}, []
+            for idx in chunk:
+                entry = entries[idx]
+                if entry.get("error"):
+                    results[idx] = {"error": entry["error"]}
+                    continue
+                try:
+                    face_image, _ = preprocess_face_for_vit(entry["file"])
+                except Exception as exc:
+                    results[idx] = {"error": f"Invalid image file: {exc}"}
+                    continue
+                if face_image is None:
+                    results[idx] = {"error": "No face detected in image"}
+                else:
+                    ready.append((idx, face_image))
+
+            if ready:
+                handle = self._acquire_model(slot, job["id"])
+                try:
+                    if handle.model_type not in ("vit", "student"):
+                        raise RuntimeError("Jobs require the ViT or student model")
+                    self._yield_to_interactive(executor)
+                    with inference_priority("batch", f"job:{job['id']}"):
+                        predictions = executor.run(
+                            predict_faces, handle.model, handle.model_type, [face for _, face in ready], handle.labels or []
+                        )
+                finally:
+                    handle.release()
+                for (idx, _), (emotion, confidence, all_probs) in zip(ready, predictions):
+                    results[idx] = {
+                        "emotion": emotion,
+                        "confidence": round(confidence, 3),
+                        "all_probabilities": {k: round(v, 4) for k, v in all_probs.items()},
+                        "model_version": handle.version,
+                    }
+
+            rows = [
+                (idx, entries[idx]["path"], json.dumps({"index": idx, "path": entries[idx]["path"], **results[idx]}))
+                for idx in chunk
+            ]
+            log_job_results(self.db_path, job["id"], rows, sum(1 for r in results.values() if "emotion" in r))
+            with self.lock:
+                self.images_processed += len(chunk)
+
+    def stats(self) -> Dict[str, Any]:
+        with self.lock:
+            return {
+                "workers": self.workers,
+                "batch_size": self.batch_size,
+                "active_jobs": dict(self.active),
+                "images_processed": self.images_processed,
+                "yield_waits": self.yield_waits,
+                "model_waits": self.model_waits,
+            }
@@ -0,0 +1,164 @@
+"""
+Store and serve a fine-tuned ViT as a delta over the base model.
+
+The fine-tuned checkpoint is reduced to the tensors that differ from the base:
+unchanged tensors are dropped, 2D weights can be stored as a low-rank adapter
+(delta ~= A @ B, truncated SVD), everything else is stored in full. At load
+time the variant is a shallow structural copy of the base model that shares
+every unchanged tensor and swaps in only the changed ones, so base + variant
+take close to the memory of one model.
+
+Files written next to the HF config in the checkpoint directory:
+    model_delta.safetensors   tensors named full.<param>, lora_a.<param>, lora_b.<param>
+    delta_config.json         base model id/version, rank and per-tensor summary
+"""
+import copy
+import json
+import itertools
+from pathlib import Path
+from typing import Any, Dict, Optional, Tuple
+
+import torch
+import torch.nn.functional as F
+from torch import nn
+
+DELTA_WEIGHTS = "model_delta.safetensors"
+DELTA_CONFIG = "delta_config.json"
+
+
+class DeltaLinear(nn.Module):
+    """
+    Linear layer computed as base(x) + (x @ B^T) @ A^T.
+    The wrapped base layer keeps pointing at the shared base tensors.
+    """
+
+    def __init__(self, base: nn.Linear, lora_a: torch.Tensor, lora_b: torch.Tensor):
+        super().__init__()
+        self.base = base
+        self.register_buffer("lora_a", lora_a)  # (out_features, rank)
+        self.register_buffer("lora_b", lora_b)  # (rank, in_features)
+        self.in_features = base.in_features
+        self.out_features = base.out_features
+
+    @property
+    def weight(self) -> torch.Tensor:
+        # Materialized only when something asks for it (e.g. analysis tools)
+        return self.base.weight + self.lora_a @ self.lora_b
+
+    @property
+    def bias(self):
+        return self.base.bias
+
+    def forward(self, x: torch.Tensor) -> torch.Tensor:
+        return self.base(x) + F.linear(F.linear(x, self.lora_b), self.lora_a)
+
+
+def compute_delta(
+    base_state: Dict[str, torch.Tensor],
+    tuned_state: Dict[str, torch.Tensor],
+    rank: Optional[int] = None,
+    atol: float = 0.0,
+) -> Tuple[Dict[str, torch.Tensor], Dict[str, Any]]:
+    """
+    Diff two state dicts.
+
+    Args:
+        base_state / tuned_state: state_dict() of the base and fine-tuned models
+        rank: Store changed 2D weights as rank-`rank` factors (None = store in full)
+        atol: Tensors whose max absolute change is <= atol count as unchanged
+
+    Returns:
+        (tensors, summary) where tensors is ready for safetensors and summary maps
+        each parameter name to 'shared', 'full' or 'lora'
+    """
+    tensors: Dict[str, torch.Tensor] = {}
+    summary: Dict[str, str] = {}
+    for name, tuned in tuned_state.items():
+        base = base_state.get(name)
+        if base is not None and base.shape == tuned.shape and base.dtype == tuned.dtype:
+            diff = tuned.float() - base.float()
+            if diff.abs().max().item() <= atol:
+                summary[name] = "shared"
+                continue
+            if rank and diff.ndim == 2 and name.endswith(".weight") and rank < min(diff.shape) // 2:
+                u, s, vh = torch.linalg.svd(diff, full_matrices=False)
+                tensors[f"lora_a.{name}"] = (u[:, :rank] * s[:rank]).to(tuned.dtype).contiguous()
+                tensors[f"lora_b.{name}"] = vh[:rank].to(tuned.dtype).contiguous()
+                summary[name] = "lora"
+                continue
+        tensors[f"full.{name}"] = tuned.detach().clone().contiguous()
+        summary[name] = "full"
+    return tensors, summary
+
+
+def save_delta(out_dir: str, tensors: Dict[str, torch.Tensor], metadata: Dict[str, Any]):
+    """Write model_delta.safetensors and delta_config.json into out_dir."""
+    from safetensors.torch import save_file
+
+    out = Path(out_dir)
+    out.mkdir(parents=True, exist_ok=True)
+    save_file(tensors, str(out / DELTA_WEIGHTS))
+    with (out / DELTA_CONFIG).open("w", encoding="utf-8") as f:
+        json.dump(metadata, f, indent=2)
+
+
+def has_delta(directory) -> bool:
+    return (Path(directory) / DELTA_WEIGHTS).exists()
+
+
+def _resolve(root: nn.Module, dotted: str) -> Tuple[nn.Module, str]:
+    parent_name, _, attr = dotted.rpartition(".")
+    return (root.get_submodule(parent_name) if parent_name else root), attr
+
+
+def build_delta_variant(base_model: nn.Module, delta_dir: str, config=None) -> nn.Module:
+    """
+    Build the fine-tuned variant on top of `base_model` without copying its tensors.
+
+    Args:
+        base_model: Loaded base model (left untouched)
+        delta_dir: Directory with model_delta.safetensors
+        config: Optional HF config of the fine-tuned model (labels etc.)
+
+    Returns:
+        A model sharing all unchanged parameters and buffers with base_model.
+    """
+    from safetensors.torch import load_file
+
+    tensors = load_file(str(Path(delta_dir) / DELTA_WEIGHTS))
+
+    # Deep-copy the module tree but map every tensor to itself -> shared storage
+    memo = {id(t): t for t in itertools.chain(base_model.parameters(), base_model.buffers())}
+    variant = copy.deepcopy(base_model, memo)
+    if config is not None:
+        variant.config = config
+
+    for key, tensor in tensors.items():
+        kind, _, name = key.partition(".")
+        if kind != "full":
+            continue
+        module, attr = _resolve(variant, name)
+        if attr in module._parameters:
+            module._parameters[attr] = nn.Parameter(tensor, requires_grad=False)
+        elif attr in module._buffers:
+            module._buffers[attr] = tensor
+        else:
+            # e.g. a quantized Linear, whose forward would never read the new tensor
+            raise ValueError(f"{name} is not a float parameter or buffer of the base model")
+
+    for key, lora_a in tensors.items():
+        kind, _, name = key.partition(".")
+        if kind != "lora_a":
+            continue
+        module_name = name[: -len(".weight")]
+        parent, attr = _resolve(variant, module_name)
+        parent._modules[attr] = DeltaLinear(getattr(parent, attr), lora_a, tensors[f"lora_b.{name}"])
+
+    variant.eval()
+    return variant
+
+
+def delta_nbytes(directory) -> int:
+    """Bytes held by the delta tensors (what the variant adds on top of the base)."""
+    p = Path(directory) / DELTA_WEIGHTS
+    return p.stat().st_size if p.exists() else 0
@@ -1,6 +1,7 @@
 # app/model_loader.py
 import os
 import json
+import hashlib
 from pathlib import Path
 from typing import Tuple, Any, Optional, Dict
 
@@ -8,30 +9,151 @@ DEFAULT_LABELS = ['angry', 'disgust', 'fear', 'happy', 'neutral', 'sad', 'surpri
 # HardlyHumans model uses 8 emotions (adds contempt)
 HARDLYHUMANS_LABELS = ['anger', 'contempt', 'sad', 'happy', 'neutral', 'disgust', 'fear', 'surprise']
 
-def load_emotion_model(force_model: str = None):
+def checkpoint_version(label: str, paths=(), extra=()) -> str:
+    """
+    Model version for `label` plus a short fingerprint of the checkpoint: name,
+    size and mtime of the files at `paths` (files or directories) and any
+    `extra` strings (e.g. a hub commit hash). Replacing the weights changes the
+    version, which keys the prediction cache and is reported by /health.
+    """
+    digest = hashlib.sha256()
+    for path in paths:
+        path = Path(path)
+        files = sorted(p for p in path.iterdir() if p.is_file()) if path.is_dir() else [path]
+        for f in files:
+            try:
+                st = f.stat()
+            except OSError:
+                continue
+            digest.update(f"{f.name}:{st.st_size}:{st.st_mtime_ns}\n".encode("utf-8"))
+    for part in extra:
+        digest.update(f"{part}\n".encode("utf-8"))
+    return f"{label}+{digest.hexdigest()[:12]}"
+
+
+def _hub_revision(model) -> str:
+    """Commit hash the HF model was loaded from ('' when unknown)."""
+    return getattr(getattr(model, "config", None), "_commit_hash", None) or ""
+
+
+def _apply_precision(model_dict: Dict[str, Any], precision: str) -> Dict[str, Any]:
+    """
+    Convert a ViT model_dict to the requested precision when supported (falls back to fp32).
+    bf16 casts the weights; int8 applies dynamic quantization to the Linear layers.
+    """
+    from app.hardware import resolve_precision
+
+    resolved, reason = resolve_precision(precision)
+    if resolved != (precision or "fp32").lower():
+        print(f"[MODEL] ⚠️  {precision} requested but unavailable ({reason}) - using fp32")
+    if resolved == "bf16":
+        import torch
+        model_dict['model'] = model_dict['model'].to(torch.bfloat16)
+        print(f"[MODEL] ⚡ ViT weights cast to bfloat16")
+    elif resolved == "int8":
+        import torch
+        model_dict['model'] = torch.ao.quantization.quantize_dynamic(
+            model_dict['model'], {torch.nn.Linear}, dtype=torch.qint8
+        )
+        print(f"[MODEL] ⚡ ViT Linear layers dynamically quantized to int8")
+    model_dict['precision'] = resolved
+    return model_dict
+
+
+def build_delta_model(base_model: Dict[str, Any], delta_dir: str, processor, config, precision: str) -> Dict[str, Any]:
+    """
+    Fine-tuned ViT model_dict built from a loaded base ViT model_dict and the delta in delta_dir.
+
+    fp32 / bf16 variants share every unchanged tensor with the base. int8 cannot:
+    dynamically quantized Linear layers have no float weights to apply a delta to,
+    and quantize_dynamic copies the model. The delta is applied to an fp32 base
+    and the variant is quantized on its own (a second full int8 copy in memory).
+    """
+    from app.hardware import resolve_precision
+    from app.model_delta import build_delta_variant
+
+    if resolve_precision(precision)[0] == "int8" and base_model.get('precision', 'fp32') != 'fp32':
+        raise ValueError("An int8 delta variant must be built on an fp32 base model")
+    model = build_delta_variant(base_model['model'], delta_dir, config=config)
+    return _apply_precision({
+        'model': model,
+        'processor': processor,
+        'type': 'vit',
+        'delta': True,
+    }, precision)
+
+
+def load_emotion_model(force_model: str = None, base_model: Optional[Dict[str, Any]] = None, precision: str = "fp32"):
     """
     Load emotion detection model. Supports both Keras and Vision Transformer models.
     
     Args:
-        force_model: 'base' to force base model, 'fine-tuned' to force fine-tuned, None for auto
+        force_model: 'base' to force base model, 'fine-tuned' to force fine-tuned,
+                     'fast' for the distilled CNN student, None for auto
+        base_model: Already loaded base ViT model_dict. When the fine-tuned model is
+                    stored as a delta (model_delta.safetensors), it is built on top of
+                    this model's tensors instead of loading a second full copy.
+        precision: 'fp32', 'bf16' or 'int8' for ViT models. bf16 casts the weights (half
+                   the memory, native bf16 matmuls on AVX512-BF16/AMX CPUs) and falls
+                   back to fp32 when the CPU lacks support; int8 uses dynamic quantization.
     
     Returns: (model_dict, labels, model_version, model_type)
     model_dict: For ViT: {'model': model, 'processor': processor, 'type': 'vit'}
                 For Keras: model object
-    model_type: 'keras' or 'vit' (Vision Transformer)
+                For student: {'model': model, 'input_size': int, 'type': 'student'}
+    model_type: 'keras', 'vit' (Vision Transformer) or 'student'
     """
     this_dir = Path(__file__).resolve().parent  # app/
     repo_root = this_dir.parent                 # project root (/app in container)
     models_dir = repo_root / "models"
     fine_tuned_dir = models_dir / "fine_tuned_vit"
+    student_dir = models_dir / "student"
+
+    # Distilled student (cheap tier) - only loaded when explicitly requested
+    if force_model == 'fast':
+        from app.student_model import load_student
+
+        model, config = load_student(str(student_dir))
+        input_size = config.get("input_size", 48)
+        print(f"[MODEL] ⚡ Loading distilled student model: {student_dir} ({input_size}x{input_size})")
+        version = checkpoint_version(config.get("version", f"student-cnn-{input_size}px"), [student_dir])
+        return {
+            'model': model,
+            'input_size': input_size,
+            'type': 'student'
+        }, config["labels"], version, 'student'
 
     # Try to load fine-tuned model first (trained on FER2013 for better happy/surprise detection)
     # Unless force_model is 'base'
     if force_model != 'base':
         try:
-            from transformers import AutoImageProcessor, AutoModelForImageClassification
+            from transformers import AutoConfig, AutoImageProcessor, AutoModelForImageClassification
             
             # Check if fine-tuned model exists
+            from app.model_delta import has_delta, delta_nbytes
+            from app.hardware import resolve_precision
+
+            if fine_tuned_dir.exists() and has_delta(fine_tuned_dir):
+                # Delta storage: share every unchanged tensor with the base model.
+                # int8 needs float base weights to apply the delta to, so it gets its own fp32 base.
+                needs_fp32_base = resolve_precision(precision)[0] == "int8"
+                if base_model is None or base_model.get('type') != 'vit' or \
+                        (needs_fp32_base and base_model.get('precision', 'fp32') != 'fp32'):
+                    base_model = load_emotion_model(force_model='base', precision='fp32' if needs_fp32_base else precision)[0]
+                print(f"[MODEL] 🎯 Loading Asripa model as a delta over the base model: {fine_tuned_dir}")
+                processor = AutoImageProcessor.from_pretrained(str(fine_tuned_dir), local_files_only=True)
+                config = AutoConfig.from_pretrained(str(fine_tuned_dir), local_files_only=True)
+                labels = [
+                    {'anger': 'angry'}.get(label.lower(), label.lower())
+                    for label in (config.id2label[i] for i in range(len(config.id2label)))
+                ]
+                print(f"[MODEL] ✅ Fine-tuned ViT built from base + {delta_nbytes(fine_tuned_dir) / 1e6:.1f} MB delta")
+                # The variant depends on both the delta files and the base weights under them
+                version = checkpoint_version("asripa-vit-78.26%", [fine_tuned_dir],
+                                             extra=[_hub_revision(base_model['model'])])
+                return build_delta_model(base_model, str(fine_tuned_dir), processor, config, precision), \
+                    labels, version, 'vit'
+
             if fine_tuned_dir.exists() and (fine_tuned_dir / "model.safetensors").exists():
                 print(f"[MODEL] 🎯 Loading Asripa model (FER2013 Enhanced): {fine_tuned_dir}")
                 print(f"[MODEL] Accuracy: 78.26% (fine-tuned on FER2013)")
@@ -66,11 +188,11 @@ def load_emotion_model(force_model: str = None):
                 print(f"[MODEL] Normalized labels: {labels}")
                 
                 print(f"[MODEL] ✅ Fine-tuned ViT model loaded successfully!")
-                return {
+                return _apply_precision({
                     'model': model,
                     'processor': processor,
                     'type': 'vit'
-                }, labels, "asripa-vit-78.26%", 'vit'
+                }, precision), labels, checkpoint_version("asripa-vit-78.26%", [fine_tuned_dir]), 'vit'
             else:
                 if force_model == 'fine-tuned':
                     print(f"[MODEL] ⚠️  Fine-tuned model requested but not found!")
@@ -126,11 +248,11 @@ def load_emotion_model(force_model: str = None):
         print(f"[MODEL] Normalized labels: {labels}")
         
         print(f"[MODEL] ✅ ViT model loaded successfully!")
-        return {
+        return _apply_precision({
             'model': model,
             'processor': processor,
             'type': 'vit'
-        }, labels, "base-vit-92.2%", 'vit'
+        }, precision), labels, checkpoint_version("base-vit-92.2%", extra=[model_id, _hub_revision(model)]), 'vit'
     except ImportError as e:
         print(f"[MODEL] ❌ transformers library not installed: {e}")
         print("[MODEL] Install with: pip install transformers torch")
@@ -184,4 +306,4 @@ def load_emotion_model(force_model: str = None):
         except Exception:
             pass
 
-    return model, labels, version, 'keras'
+    return model, labels, checkpoint_version(version, [model_path]), 'keras'
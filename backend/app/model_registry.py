@@ -0,0 +1,273 @@
+"""
+Hot-swappable model handles.
+
+Each model variant ("base", "fine-tuned") lives in a ModelSlot. Requests acquire
+the slot's current handle for as long as they use it. A reload loads and warms
+the replacement on a background thread, swaps it in atomically and releases
+the old model once the requests still holding it have finished.
+"""
+import os
+import gc
+import time
+import datetime
+import threading
+import logging
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+
+def unpack_model_result(res) -> tuple:
+    """
+    Normalize the return value of load_emotion_model to
+    (model, labels, version, model_type). Older loaders returned 2 or 3 items.
+    """
+    if isinstance(res, tuple) and len(res) == 4:
+        return res
+    if isinstance(res, tuple) and len(res) == 3:
+        model, labels, version = res
+        return model, labels, version, "keras"
+    if isinstance(res, tuple) and len(res) == 2:
+        model, labels = res
+        return model, labels, "unknown", "keras"
+    return res, None, "unknown", "keras"
+
+
+class ModelHandle:
+    """
+    One loaded model plus the bookkeeping needed to retire it safely.
+    """
+
+    def __init__(self, model: Any, labels: Any, version: str, model_type: str):
+        self.model = model
+        self.labels = labels
+        self.version = version
+        self.model_type = model_type
+        self.loaded_at = datetime.datetime.now(datetime.UTC).isoformat()
+        self._in_flight = 0
+        self._retired = False
+        self._lock = threading.Lock()
+
+    @property
+    def in_flight(self) -> int:
+        return self._in_flight
+
+    def acquire(self) -> "ModelHandle":
+        with self._lock:
+            self._in_flight += 1
+        return self
+
+    def release(self):
+        with self._lock:
+            self._in_flight = max(0, self._in_flight - 1)
+            free_now = self._retired and self._in_flight == 0
+        if free_now:
+            self._free()
+
+    def retire(self):
+        """Mark the handle as replaced; free the model once no request uses it."""
+        with self._lock:
+            self._retired = True
+            free_now = self._in_flight == 0
+        if free_now:
+            self._free()
+
+    def _free(self):
+        if self.model is None:
+            return
+        logger.info("Releasing retired model %s (%s)", self.version, self.model_type)
+        self.model = None
+        gc.collect()
+
+
+def warmup_handle(handle: ModelHandle):
+    """Run one dummy prediction so the first real request doesn't pay lazy init costs."""
+    if handle is None or handle.model is None:
+        return
+    from app.inference_router import RemoteModel
+    if isinstance(handle.model, RemoteModel):
+        return  # router mode: the inference workers warm up their own copies
+    if handle.model_type == "vit":
+        from PIL import Image
+        from app.vit_utils import predict_with_vit
+
+        predict_with_vit(handle.model, Image.new("RGB", (224, 224), color=(128, 128, 128)), handle.labels or [])
+    elif handle.model_type == "student":
+        from PIL import Image
+        from app.student_model import predict_with_student
+
+        predict_with_student(handle.model, Image.new("L", (48, 48), color=128), handle.labels or [])
+    elif handle.model_type == "keras":
+        import numpy as np
+
+        handle.model.predict(np.zeros((1, 48, 48, 1), dtype=np.float32), verbose=0)
+
+
+class ModelSlot:
+    """
+    A named, swappable reference to the active ModelHandle for one model variant.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        loader: Callable[[], tuple],
+        handle: Optional[ModelHandle] = None,
+        on_swap: Optional[Callable[[str, ModelHandle], None]] = None,
+    ):
+        """
+        Args:
+            name: Variant name ("base", "fine-tuned", "fast")
+            loader: Callable returning the load_emotion_model tuple for this variant
+            handle: Already loaded handle (None if the variant is not available yet)
+            on_swap: Called with (name, new_handle) after every successful swap
+        """
+        self.name = name
+        self.loader = loader
+        self.on_swap = on_swap
+        self._handle = handle
+        self._lock = threading.Lock()
+        self._reload_thread: Optional[threading.Thread] = None
+        self._retired: List[ModelHandle] = []
+        self.last_reload_at: Optional[str] = None
+        self.last_reload_seconds: Optional[float] = None
+        self.last_reload_error: Optional[str] = None
+        self.reload_count = 0
+
+    @property
+    def current(self) -> Optional[ModelHandle]:
+        return self._handle
+
+    def acquire(self) -> Optional[ModelHandle]:
+        """
+        Return the current handle with its in-flight count incremented.
+        Callers must call handle.release() when done. Returns None if no model is loaded.
+        """
+        with self._lock:
+            handle = self._handle
+            if handle is not None:
+                handle.acquire()
+            return handle
+
+    def swap(self, new_handle: ModelHandle):
+        with self._lock:
+            old = self._handle
+            self._handle = new_handle
+            if old is not None:
+                self._retired.append(old)
+        if self.on_swap:
+            try:
+                self.on_swap(self.name, new_handle)
+            except Exception:
+                logger.exception("on_swap callback failed for slot %s", self.name)
+        if old is not None:
+            old.retire()
+
+    @property
+    def reloading(self) -> bool:
+        return self._reload_thread is not None and self._reload_thread.is_alive()
+
+    def reload(self, background: bool = True) -> bool:
+        """
+        Load, warm up and swap in a fresh copy of this variant.
+
+        Returns False if a reload is already running for this slot.
+        """
+        with self._lock:
+            if self.reloading:
+                return False
+            thread = threading.Thread(target=self._do_reload, name=f"model-reload-{self.name}", daemon=True)
+            self._reload_thread = thread
+        thread.start()
+        if not background:
+            thread.join()
+        return True
+
+    def _do_reload(self):
+        started = time.perf_counter()
+        print(f"[MODEL] 🔄 Reloading {self.name} model in background...")
+        try:
+            model, labels, version, model_type = unpack_model_result(self.loader())
+            handle = ModelHandle(model, labels, version, model_type)
+            warmup_handle(handle)
+            self.swap(handle)
+            self.last_reload_error = None
+            self.reload_count += 1
+            print(f"[MODEL] ✅ {self.name} model swapped in: version={version}, type={model_type}")
+        except Exception as exc:
+            self.last_reload_error = str(exc)
+            logger.exception("Reload of %s model failed; keeping current model", self.name)
+        finally:
+            self.last_reload_seconds = round(time.perf_counter() - started, 3)
+            self.last_reload_at = datetime.datetime.now(datetime.UTC).isoformat()
+
+    def status(self) -> Dict[str, Any]:
+        handle = self._handle
+        # Forget retired handles that have already been freed
+        self._retired = [h for h in self._retired if h.model is not None]
+        return {
+            "loaded": handle is not None and handle.model is not None,
+            "model_version": handle.version if handle else "not-available",
+            "model_type": handle.model_type if handle else "unknown",
+            "loaded_at": handle.loaded_at if handle else None,
+            "in_flight": handle.in_flight if handle else 0,
+            "reloading": self.reloading,
+            "reload_count": self.reload_count,
+            "last_reload_at": self.last_reload_at,
+            "last_reload_seconds": self.last_reload_seconds,
+            "last_reload_error": self.last_reload_error,
+            "draining": len(self._retired),
+        }
+
+
+class ModelWatcher:
+    """
+    Poll a checkpoint directory and reload a slot when its files change.
+    """
+
+    WATCHED_FILES = ("model.safetensors", "model_delta.safetensors", "config.json", "preprocessor_config.json")
+
+    def __init__(self, slot: ModelSlot, directory: str, interval: float = 10.0):
+        self.slot = slot
+        self.directory = Path(directory)
+        self.interval = interval
+        self._stop = threading.Event()
+        self._signature = self._current_signature()
+        self._thread = threading.Thread(target=self._run, name=f"model-watch-{slot.name}", daemon=True)
+
+    def _current_signature(self):
+        sig = []
+        for name in self.WATCHED_FILES:
+            p = self.directory / name
+            try:
+                st = os.stat(p)
+                sig.append((name, st.st_mtime_ns, st.st_size))
+            except OSError:
+                sig.append((name, None, None))
+        return tuple(sig)
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            try:
+                sig = self._current_signature()
+                if sig == self._signature:
+                    continue
+                # Wait one more interval so we don't load a checkpoint that is still being written
+                if self._stop.wait(self.interval):
+                    return
+                if self._current_signature() != sig:
+                    continue
+                self._signature = sig
+                if (self.directory / "model.safetensors").exists() or (self.directory / "model_delta.safetensors").exists():
+                    print(f"[MODEL] Detected new checkpoint in {self.directory}")
+                    self.slot.reload()
+            except Exception:
+                logger.exception("Model watcher for %s failed", self.slot.name)
@@ -0,0 +1,245 @@
+"""
+Content-addressed prediction cache.
+
+Keys combine the SHA-256 of the uploaded bytes with the model version and the
+preprocessing / inference parameters, so a re-upload or client retry of the
+same photo skips decode, face detection and inference. There is a bounded
+in-memory LRU tier and an optional on-disk tier (JSON files) that survives
+restarts. Concurrent requests for the same key are coalesced (single-flight):
+one computes, the others wait for its result.
+"""
+import os
+import json
+import shutil
+import hashlib
+import threading
+import logging
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+def hash_file(path: str, chunk_size: int = 1 << 20) -> str:
+    """SHA-256 hex digest of a file's contents."""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def make_cache_key(content_hash: str, model_version: str, params: Optional[Dict[str, Any]] = None) -> str:
+    """Stable key for (content, model version, parameters)."""
+    material = json.dumps(
+        {"content": content_hash, "model_version": model_version, "params": params or {}},
+        sort_keys=True,
+        default=str,
+    )
+    return hashlib.sha256(material.encode("utf-8")).hexdigest()
+
+
+class _InFlight:
+    def __init__(self):
+        self.event = threading.Event()
+        self.value = None
+        self.error: Optional[BaseException] = None
+
+
+class PredictionCache:
+    """
+    Two-tier (memory LRU + optional disk) cache with single-flight coalescing.
+    Thread-safe. Cached values must be JSON-serializable for the disk tier.
+    """
+
+    def __init__(self, max_entries: int = 512, disk_dir: Optional[str] = None, disk_max_entries: int = 10000):
+        """
+        Args:
+            max_entries: Size of the in-memory LRU tier
+            disk_dir: Directory for the persistent tier (None disables it)
+            disk_max_entries: Approximate cap on files kept in disk_dir
+        """
+        self.max_entries = max_entries
+        self.disk_dir = disk_dir
+        self.disk_max_entries = disk_max_entries
+        self._memory: "OrderedDict[str, Any]" = OrderedDict()
+        self._in_flight: Dict[str, _InFlight] = {}
+        self._lock = threading.Lock()
+        self._disk_writes = 0
+        # Bumped by invalidate(); results computed before a bump are not stored
+        self._generation = 0
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.invalidations = 0
+        if disk_dir:
+            os.makedirs(disk_dir, exist_ok=True)
+
+    # ---------- disk tier ----------
+    def _disk_path(self, key: str) -> str:
+        return os.path.join(self.disk_dir, key[:2], f"{key}.json")
+
+    def _disk_get(self, key: str):
+        if not self.disk_dir:
+            return None
+        try:
+            with open(self._disk_path(key), "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def _disk_put(self, key: str, value: Any, generation: int):
+        if not self.disk_dir:
+            return
+        path = self._disk_path(key)
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            tmp_path = f"{path}.{threading.get_ident()}.tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(value, f)
+            os.replace(tmp_path, path)
+            with self._lock:
+                # invalidate() bumps the generation before clearing the directory, so a
+                # write that lands after the bump is removed here or by that clear
+                stale = generation != self._generation
+                self._disk_writes += 1
+                prune = self._disk_writes % 500 == 0
+            if stale:
+                os.remove(path)
+            elif prune:
+                self._prune_disk()
+        except (OSError, TypeError, ValueError):
+            logger.exception("Failed writing prediction cache entry to disk")
+
+    def _prune_disk(self):
+        """Drop the oldest files once the disk tier grows past disk_max_entries."""
+        entries = []
+        for root, _dirs, files in os.walk(self.disk_dir):
+            for name in files:
+                if name.endswith(".json"):
+                    p = os.path.join(root, name)
+                    try:
+                        entries.append((os.path.getmtime(p), p))
+                    except OSError:
+                        pass
+        excess = len(entries) - self.disk_max_entries
+        if excess > 0:
+            for _mtime, p in sorted(entries)[:excess]:
+                try:
+                    os.remove(p)
+                except OSError:
+                    pass
+
+    # ---------- memory tier ----------
+    def _memory_put(self, key: str, value: Any):
+        self._memory[key] = value
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
+
+    def get(self, key: str):
+        with self._lock:
+            if key in self._memory:
+                self._memory.move_to_end(key)
+                self.hits += 1
+                return self._memory[key]
+        value = self._disk_get(key)
+        if value is not None:
+            with self._lock:
+                self.disk_hits += 1
+                self._memory_put(key, value)
+        return value
+
+    def put(self, key: str, value: Any, generation: Optional[int] = None) -> bool:
+        """
+        Store value under key. With a generation (captured before computing the
+        value), nothing is stored if invalidate() ran in the meantime.
+        Returns whether the value was stored.
+        """
+        with self._lock:
+            if generation is None:
+                generation = self._generation
+            elif generation != self._generation:
+                return False
+            self._memory_put(key, value)
+        self._disk_put(key, value, generation)
+        return True
+
+    def get_or_compute(self, key: str, compute: Callable[[], Any]) -> Tuple[Any, str]:
+        """
+        Return (value, source) where source is 'memory', 'disk', 'coalesced' or 'computed'.
+        Exceptions from compute are propagated to every waiting caller and not cached.
+        """
+        with self._lock:
+            if key in self._memory:
+                self._memory.move_to_end(key)
+                self.hits += 1
+                return self._memory[key], "memory"
+            call = self._in_flight.get(key)
+            leader = call is None
+            generation = self._generation
+            if leader:
+                call = _InFlight()
+                self._in_flight[key] = call
+            else:
+                self.coalesced += 1
+
+        if not leader:
+            call.event.wait()
+            if call.error is not None:
+                raise call.error
+            return call.value, "coalesced"
+
+        try:
+            value = self._disk_get(key)
+            if value is not None:
+                source = "disk"
+                with self._lock:
+                    self.disk_hits += 1
+                    if generation == self._generation:
+                        self._memory_put(key, value)
+            else:
+                source = "computed"
+                with self._lock:
+                    self.misses += 1
+                value = compute()
+                # Computed with the model of `generation`; dropped if a swap invalidated it since
+                self.put(key, value, generation)
+            call.value = value
+            return value, source
+        except BaseException as exc:
+            call.error = exc
+            raise
+        finally:
+            with self._lock:
+                if self._in_flight.get(key) is call:
+                    del self._in_flight[key]
+            call.event.set()
+
+    def invalidate(self):
+        """Drop every entry (memory and disk), e.g. after a model swap."""
+        with self._lock:
+            self._generation += 1
+            self._memory.clear()
+            # Later requests must not coalesce onto a computation using the old model
+            self._in_flight.clear()
+            self.invalidations += 1
+        if self.disk_dir and os.path.isdir(self.disk_dir):
+            for name in os.listdir(self.disk_dir):
+                shutil.rmtree(os.path.join(self.disk_dir, name), ignore_errors=True)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.disk_hits + self.misses + self.coalesced
+            return {
+                "entries": len(self._memory),
+                "max_entries": self.max_entries,
+                "disk_enabled": bool(self.disk_dir),
+                "hits": self.hits,
+                "disk_hits": self.disk_hits,
+                "coalesced": self.coalesced,
+                "misses": self.misses,
+                "hit_rate": round((lookups - self.misses) / lookups, 4) if lookups else 0.0,
+                "invalidations": self.invalidations,
+            }
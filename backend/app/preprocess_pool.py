@@ -0,0 +1,146 @@
+"""
+Optional process pool for CPU-bound face preprocessing.
+
+Decode, CLAHE, the bilateral filter and the Haar cascade ladder in
+preprocess_face_for_vit partly hold the GIL, so in request threads they
+serialize with each other. With PREPROCESS_WORKERS > 0 they run in worker
+processes instead; inference stays in the server process.
+
+Each task sends the encoded image bytes to a worker (small) and gets the
+224x224 RGB crop back through a preallocated multiprocessing.shared_memory
+block (no pickled arrays). The number of blocks bounds the tasks in flight.
+"""
+import atexit
+import queue
+import threading
+import logging
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from multiprocessing import get_context, shared_memory
+from typing import Any, Dict, Optional
+
+import numpy as np
+from PIL import Image
+
+logger = logging.getLogger(__name__)
+
+CROP_SHAPE = (224, 224, 3)
+CROP_BYTES = CROP_SHAPE[0] * CROP_SHAPE[1] * CROP_SHAPE[2]
+
+
+def _init_worker():
+    import cv2
+    cv2.setNumThreads(1)  # one core per worker; the pool provides the parallelism
+
+
+def _crop_into(data: bytes, shm_name: str, options: Optional[Dict[str, Any]] = None) -> bool:
+    """Worker: decode + detect + crop, write the crop into the named block. False if no face."""
+    import cv2
+    # Importing the app package has no side effects (see _ensure_runtime_files); vit_utils
+    # only pulls in cv2 / numpy / PIL, so workers never load models or start app threads
+    from app.vit_utils import preprocess_face_for_vit
+
+    frame = cv2.imdecode(np.frombuffer(data, dtype=np.uint8), cv2.IMREAD_COLOR)
+    if frame is None:
+        return False
+    face_image, _ = preprocess_face_for_vit(frame, **(options or {}))
+    if face_image is None:
+        return False
+    crop = np.asarray(face_image.convert("RGB"), dtype=np.uint8)
+    if crop.shape != CROP_SHAPE:
+        crop = np.asarray(face_image.convert("RGB").resize(CROP_SHAPE[:2][::-1]), dtype=np.uint8)
+
+    # Attaching registers the name with the resource tracker spawn children share
+    # with the parent, which already tracks it; the parent unlinks it at shutdown
+    shm = shared_memory.SharedMemory(name=shm_name)
+    try:
+        np.ndarray(CROP_SHAPE, dtype=np.uint8, buffer=shm.buf)[:] = crop
+    finally:
+        shm.close()
+    return True
+
+
+class PreprocessPool:
+    """
+    Worker processes running preprocess_face_for_vit, returning crops via shared memory.
+    """
+
+    def __init__(self, workers: int, max_in_flight: Optional[int] = None):
+        self.workers = max(1, workers)
+        # spawn: the server process already runs torch/OpenMP threads, which fork() would copy mid-state
+        self._executor = ProcessPoolExecutor(
+            max_workers=self.workers, mp_context=get_context("spawn"), initializer=_init_worker
+        )
+        self._blocks = [
+            shared_memory.SharedMemory(create=True, size=CROP_BYTES)
+            for _ in range(max_in_flight or self.workers * 2)
+        ]
+        self._free: "queue.Queue" = queue.Queue()
+        for block in self._blocks:
+            self._free.put(block)
+        self.lock = threading.Lock()
+        self.tasks = 0
+        self.no_face = 0
+        self.fallbacks = 0
+        self.broken = False
+        atexit.register(self.shutdown)
+
+    def crop(self, data: bytes, options: Optional[Dict[str, Any]] = None) -> Optional[Image.Image]:
+        """
+        Face crop for encoded image bytes, or None when no face is found.
+        options are preprocess_face_for_vit keyword arguments (quality profile).
+        Falls back to in-process preprocessing if the pool has died.
+        """
+        if self.broken:
+            return self._crop_inline(data, options)
+        block = self._free.get()
+        try:
+            found = self._executor.submit(_crop_into, data, block.name, options).result()
+            with self.lock:
+                self.tasks += 1
+                if not found:
+                    self.no_face += 1
+            if not found:
+                return None
+            # Copy out of the block before handing it to the next task
+            return Image.fromarray(np.ndarray(CROP_SHAPE, dtype=np.uint8, buffer=block.buf).copy(), "RGB")
+        except BrokenProcessPool:
+            logger.exception("Preprocessing pool died; falling back to in-process preprocessing")
+            self.broken = True
+            return self._crop_inline(data, options)
+        finally:
+            self._free.put(block)
+
+    def crop_file(self, path: str, options: Optional[Dict[str, Any]] = None) -> Optional[Image.Image]:
+        with open(path, "rb") as f:
+            return self.crop(f.read(), options)
+
+    def _crop_inline(self, data: bytes, options: Optional[Dict[str, Any]] = None) -> Optional[Image.Image]:
+        import cv2
+        from .vit_utils import preprocess_face_for_vit
+
+        with self.lock:
+            self.fallbacks += 1
+        frame = cv2.imdecode(np.frombuffer(data, dtype=np.uint8), cv2.IMREAD_COLOR)
+        return preprocess_face_for_vit(frame, **(options or {}))[0] if frame is not None else None
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
+        for block in self._blocks:
+            try:
+                block.close()
+                block.unlink()
+            except (FileNotFoundError, BufferError):
+                pass
+        self._blocks = []
+
+    def stats(self) -> Dict[str, Any]:
+        with self.lock:
+            return {
+                "workers": self.workers,
+                "blocks_free": self._free.qsize(),
+                "tasks": self.tasks,
+                "no_face": self.no_face,
+                "fallbacks": self.fallbacks,
+                "broken": self.broken,
+            }
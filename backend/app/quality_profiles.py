@@ -0,0 +1,99 @@
+"""
+Named quality profiles for /detect: one knob that trades latency for accuracy.
+
+A profile bundles face-detector depth, detection resolution and padding, the
+model variant, ViT precision and test-time augmentation. Callers pick one
+with ?profile= or the X-Quality-Profile header; "balanced" reproduces the
+behaviour from before profiles existed.
+
+Definitions come from QUALITY_PROFILES in the app config (merged over the
+built-ins, per key) and optionally a JSON file (QUALITY_PROFILES_FILE) with
+the same shape, so a deployment can retune or add profiles without code
+changes.
+
+A profile's precision is resolved once at load time against the CPU and the
+precision the ViT weights were loaded at: bf16 falls back to fp32 on CPUs
+without native bf16, and fp32 cannot be restored once VIT_PRECISION cast the
+weights to bf16 or int8. profile["precision"] is what actually runs and
+profile["requested_precision"] what was configured.
+"""
+import json
+import os
+import logging
+from typing import Any, Dict, Optional, Tuple
+
+from app.hardware import resolve_precision
+
+logger = logging.getLogger(__name__)
+
+DETECTORS = ("quick", "standard", "full")
+PRECISIONS = (None, "fp32", "bf16")
+
+DEFAULT_PROFILES: Dict[str, Dict[str, Any]] = {
+    # Single cascade pass on a small decode, distilled student when loaded
+    "fast": {"detector": "quick", "detect_max_dim": 480, "pad_ratio": 0.35, "model": "fast", "precision": None, "tta": False},
+    "balanced": {"detector": "full", "detect_max_dim": 800, "pad_ratio": 0.35, "model": None, "precision": None, "tta": False},
+    # Larger detection resolution, fp32 and flip-averaged logits
+    "accurate": {"detector": "full", "detect_max_dim": 1280, "pad_ratio": 0.35, "model": "base", "precision": "fp32", "tta": True},
+}
+
+
+def _validate(name: str, profile: Dict[str, Any]) -> Dict[str, Any]:
+    if profile["detector"] not in DETECTORS:
+        raise ValueError(f"Quality profile {name!r}: detector must be one of {DETECTORS}")
+    if profile["precision"] not in PRECISIONS:
+        raise ValueError(f"Quality profile {name!r}: precision must be one of {PRECISIONS}")
+    profile["detect_max_dim"] = int(profile["detect_max_dim"])
+    profile["pad_ratio"] = float(profile["pad_ratio"])
+    profile["tta"] = bool(profile["tta"])
+    if profile["detect_max_dim"] < 64 or not 0.0 <= profile["pad_ratio"] <= 1.0:
+        raise ValueError(f"Quality profile {name!r}: detect_max_dim must be >= 64 and pad_ratio in [0, 1]")
+    return profile
+
+
+def resolve_profile_precision(requested: Optional[str], weight_precision: str = "fp32") -> Tuple[str, Optional[str]]:
+    """
+    Precision a profile can run at, given the precision the weights were loaded at.
+
+    Returns:
+        (precision, reason) - reason is None when the request is honoured as asked
+    """
+    weight_precision = weight_precision or "fp32"
+    if requested is None:
+        return weight_precision, None
+    if weight_precision != "fp32":
+        # bf16 / int8 weights: fp32 is gone and bf16 autocast would not change anything
+        reason = None if requested == weight_precision else f"weights are loaded as {weight_precision}"
+        return weight_precision, reason
+    resolved, reason = resolve_precision(requested)
+    return resolved, None if resolved == requested else reason
+
+
+def load_quality_profiles(overrides: Optional[Dict] = None, path: Optional[str] = None,
+                          weight_precision: str = "fp32") -> Dict[str, Dict[str, Any]]:
+    """
+    Built-in profiles, updated by `overrides` and then by the JSON file at `path`.
+    A new profile inherits unspecified keys from "balanced". Precisions are
+    resolved against the host and `weight_precision` (the resolved VIT_PRECISION).
+    """
+    sources = [overrides or {}]
+    if path and os.path.exists(path):
+        with open(path, "r", encoding="utf-8") as f:
+            sources.append(json.load(f))
+    profiles = {name: dict(p) for name, p in DEFAULT_PROFILES.items()}
+    for source in sources:
+        for name, values in source.items():
+            profiles[name.lower()] = {**profiles.get(name.lower(), DEFAULT_PROFILES["balanced"]), **values}
+    profiles = {name: _validate(name, p) for name, p in profiles.items()}
+    for name, profile in profiles.items():
+        profile["requested_precision"] = profile["precision"]
+        profile["precision"], reason = resolve_profile_precision(profile["precision"], weight_precision)
+        if reason:
+            logger.warning("Quality profile %r: %s requested but runs as %s (%s)",
+                           name, profile["requested_precision"], profile["precision"], reason)
+    return profiles
+
+
+def preprocess_options(profile: Dict[str, Any]) -> Dict[str, Any]:
+    """Keyword arguments for preprocess_face_for_vit."""
+    return {"detector": profile["detector"], "detect_max_dim": profile["detect_max_dim"], "pad_ratio": profile["pad_ratio"]}
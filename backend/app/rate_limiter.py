@@ -69,6 +69,8 @@ class RateLimiter:
 detect_limiter = RateLimiter(max_requests=30, window_seconds=60)  # 30 requests per minute
 logs_limiter = RateLimiter(max_requests=100, window_seconds=60)  # 100 requests per minute
 images_limiter = RateLimiter(max_requests=200, window_seconds=60)  # 200 requests per minute
+batch_limiter = RateLimiter(max_requests=10, window_seconds=60)  # 10 batches per minute
+jobs_limiter = RateLimiter(max_requests=5, window_seconds=60)  # 5 job submissions per minute
 
 
 def get_client_identifier(request) -> str:
@@ -0,0 +1,131 @@
+"""
+Shadow evaluation: score a candidate model on sampled live traffic without
+touching request latency.
+
+/detect hands the face crop it already computed to ShadowEvaluator.submit(),
+which samples, then enqueues it on a bounded queue (dropping when full). A
+single daemon thread submits each crop to the shadow model's executor and
+logs agreement, confidence delta and latency to the shadow_predictions table.
+
+The forward itself runs on an executor worker with the process-wide torch
+thread pool, so OS priority would not help here. Shadow work is kept out of
+the way by the executor instead: it goes on the lowest-weight "shadow" lane,
+behind queued interactive and batch work.
+"""
+import queue
+import random
+import threading
+import time
+import logging
+from typing import Any, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class ShadowEvaluator:
+    """
+    Bounded, drop-when-full background worker for a shadow model slot.
+    """
+
+    def __init__(self, slot, db_path: str, sample_rate: float = 0.1, queue_size: int = 32, executor=None):
+        """
+        Args:
+            slot: ModelSlot of the shadow (candidate) model
+            db_path: SQLite database for shadow_predictions rows
+            sample_rate: Fraction of eligible requests to shadow (0..1)
+            queue_size: Max pending crops; further submissions are dropped
+            executor: InferenceExecutor of the shadow model (work goes on its shadow lane)
+        """
+        self.slot = slot
+        self.executor = executor
+        self.db_path = db_path
+        self.sample_rate = max(0.0, min(1.0, sample_rate))
+        self.queue: "queue.Queue" = queue.Queue(maxsize=max(1, queue_size))
+        self.lock = threading.Lock()
+        self.submitted = 0
+        self.dropped = 0
+        self.processed = 0
+        self.errors = 0
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self) -> "ShadowEvaluator":
+        self._thread = threading.Thread(target=self._run, name=f"shadow-{self.slot.name}", daemon=True)
+        self._thread.start()
+        return self
+
+    def submit(self, face_image, primary: Dict[str, Any]) -> bool:
+        """
+        Maybe enqueue a crop for shadow scoring. Never blocks.
+
+        Args:
+            face_image: Face crop already used by the primary model
+            primary: filename, model_version, emotion and confidence of the live answer
+
+        Returns:
+            True if the crop was queued
+        """
+        if self.sample_rate <= 0.0 or random.random() >= self.sample_rate:
+            return False
+        try:
+            self.queue.put_nowait((face_image, primary))
+        except queue.Full:
+            with self.lock:
+                self.dropped += 1
+            return False
+        with self.lock:
+            self.submitted += 1
+        return True
+
+    def _run(self):
+        from .inference import predict_face
+        from .db_logger import log_shadow_prediction
+        from .inference_executor import inference_priority, run_on
+
+        with inference_priority("shadow"):
+            self._serve(predict_face, log_shadow_prediction, run_on)
+
+    def _serve(self, predict_face, log_shadow_prediction, run_on):
+        while True:
+            face_image, primary = self.queue.get()
+            handle = self.slot.acquire()
+            try:
+                if handle is None:
+                    continue
+                started = time.perf_counter()
+                emotion, confidence, _ = run_on(
+                    self.executor, predict_face, handle.model, handle.model_type, face_image, handle.labels or []
+                )
+                latency_ms = (time.perf_counter() - started) * 1000.0
+                log_shadow_prediction(self.db_path, {
+                    "filename": primary.get("filename"),
+                    "primary_model_version": primary.get("model_version"),
+                    "shadow_model_version": handle.version,
+                    "primary_emotion": primary.get("emotion"),
+                    "primary_confidence": primary.get("confidence"),
+                    "shadow_emotion": emotion,
+                    "shadow_confidence": confidence,
+                    "shadow_latency_ms": latency_ms,
+                })
+                with self.lock:
+                    self.processed += 1
+            except Exception:
+                logger.exception("Shadow evaluation failed")
+                with self.lock:
+                    self.errors += 1
+            finally:
+                if handle is not None:
+                    handle.release()
+                self.queue.task_done()
+
+    def stats(self) -> Dict[str, Any]:
+        with self.lock:
+            return {
+                "model": self.slot.name,
+                "sample_rate": self.sample_rate,
+                "queue_depth": self.queue.qsize(),
+                "queue_size": self.queue.maxsize,
+                "submitted": self.submitted,
+                "dropped": self.dropped,
+                "processed": self.processed,
+                "errors": self.errors,
+            }
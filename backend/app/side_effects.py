@@ -0,0 +1,152 @@
+"""
+Deferred side effects for /detect: image storage and prediction logging run
+after the response is computed instead of on the request's latency path.
+
+The stored filename is generated up front, so the response and the DB row
+always carry the same name even though the file lands a moment later. The
+request thread only renames its temp upload to a unique pending path (the
+next upload with the same name cannot overwrite it) and enqueues the task.
+
+Modes (SIDE_EFFECTS_MODE):
+  sync   run inline before the response (durable once the client has it)
+  async  run on a background thread; a full queue runs the task inline
+         instead of dropping it, so side effects are never lost to overload
+
+Each step is retried with exponential backoff; queued tasks are flushed at
+interpreter exit (bounded by flush_timeout).
+"""
+import atexit
+import queue
+import threading
+import time
+import logging
+from typing import Any, Callable, Dict, Tuple
+
+logger = logging.getLogger(__name__)
+
+MODES = ("sync", "async")
+
+Step = Tuple[Callable, tuple]
+
+
+class SideEffectQueue:
+    """
+    Bounded background pipeline running ordered, retried steps per task.
+    """
+
+    def __init__(
+        self,
+        mode: str = "async",
+        queue_size: int = 256,
+        retries: int = 3,
+        retry_backoff: float = 0.05,
+        flush_timeout: float = 10.0,
+    ):
+        """
+        Args:
+            mode: "sync" or "async" (see module docstring)
+            queue_size: Max queued tasks before callers run tasks inline
+            retries: Extra attempts per step after the first failure
+            retry_backoff: Delay before the first retry, doubled for each further one
+            flush_timeout: Seconds to wait for queued tasks at shutdown
+        """
+        if mode not in MODES:
+            raise ValueError(f"SIDE_EFFECTS_MODE must be one of {MODES}, got {mode!r}")
+        self.mode = mode
+        self.retries = max(0, retries)
+        self.retry_backoff = retry_backoff
+        self.flush_timeout = flush_timeout
+        self.queue: "queue.Queue" = queue.Queue(maxsize=max(1, queue_size))
+        self.lock = threading.Lock()
+        self.submitted = 0
+        self.completed = 0
+        self.inline = 0
+        self.retried = 0
+        self.failed = 0
+        self.max_depth = 0
+        self._thread = None
+        if mode == "async":
+            self._thread = threading.Thread(target=self._run, name="side-effects", daemon=True)
+            self._thread.start()
+            atexit.register(self.flush)
+
+    @property
+    def deferred(self) -> bool:
+        return self.mode == "async"
+
+    def submit(self, label: str, *steps: Step):
+        """
+        Run steps in order, each as (fn, args). A step that still fails after
+        its retries is logged and the task moves on to the next step.
+        """
+        with self.lock:
+            self.submitted += 1
+        if self.deferred:
+            try:
+                self.queue.put_nowait((label, steps))
+                with self.lock:
+                    self.max_depth = max(self.max_depth, self.queue.qsize())
+                return
+            except queue.Full:
+                with self.lock:
+                    self.inline += 1
+        self._execute(label, steps)
+
+    def flush(self, timeout: float = None) -> bool:
+        """Wait until every queued task has run; False if the timeout expired first."""
+        if self._thread is None:
+            return True
+        deadline = time.monotonic() + (self.flush_timeout if timeout is None else timeout)
+        while self.queue.unfinished_tasks and time.monotonic() < deadline:
+            time.sleep(0.01)
+        remaining = self.queue.unfinished_tasks
+        if remaining:
+            logger.warning("Shutting down with %d side-effect tasks still queued", remaining)
+        return remaining == 0
+
+    def _run(self):
+        while True:
+            label, steps = self.queue.get()
+            try:
+                self._execute(label, steps)
+            finally:
+                self.queue.task_done()
+
+    def _execute(self, label: str, steps: Tuple[Step, ...]):
+        ok = True
+        for fn, args in steps:
+            ok = self._attempt(label, fn, args) and ok
+        with self.lock:
+            if ok:
+                self.completed += 1
+            else:
+                self.failed += 1
+
+    def _attempt(self, label: str, fn: Callable, args: tuple) -> bool:
+        delay = self.retry_backoff
+        for attempt in range(self.retries + 1):
+            try:
+                fn(*args)
+                return True
+            except Exception:
+                if attempt == self.retries:
+                    logger.exception("Side effect %s (%s) failed after %d attempts", label, fn.__name__, attempt + 1)
+                    return False
+                with self.lock:
+                    self.retried += 1
+                time.sleep(delay)
+                delay *= 2
+        return False
+
+    def stats(self) -> Dict[str, Any]:
+        with self.lock:
+            return {
+                "mode": self.mode,
+                "queue_depth": self.queue.qsize(),
+                "max_queue_depth": self.max_depth,
+                "submitted": self.submitted,
+                "completed": self.completed,
+                "inline": self.inline,
+                "retried": self.retried,
+                "failed": self.failed,
+            }
@@ -0,0 +1,314 @@
+"""
+Webcam streaming: one long-lived WebSocket per camera session instead of a
+multipart POST per frame.
+
+The connection's receive loop drops every incoming frame into a one-slot
+LatestFrameMailbox, replacing (and counting as dropped) any frame the worker
+has not picked up yet, so when inference falls behind the newest frame always
+wins. A per-session worker thread decodes the frame in memory, runs face
+detection and the model on the variant's inference executor, and sends one
+JSON result per processed frame back over the socket.
+
+Frames skip image storage and DB logging unless STREAM_LOG_SAMPLE_RATE > 0,
+in which case that fraction of results is stored and logged like /detect.
+
+Motion gating: each frame gets a 32x32 grayscale signature. When it differs
+from the last inferred frame's signature by less than the motion threshold
+(mean absolute difference, 0..1), face detection and the forward are skipped
+and the previous result is sent again with "reused": true. A result is
+reused for at most max_reuse_seconds before the next frame is inferred anyway.
+"""
+import json
+import os
+import random
+import threading
+import time
+import uuid
+import logging
+from typing import Any, Callable, Dict, Optional
+
+import numpy as np
+
+from .inference_executor import inference_priority
+
+logger = logging.getLogger(__name__)
+
+
+class LatestFrameMailbox:
+    """
+    Single-slot buffer: put() overwrites, get() takes the newest frame.
+    """
+
+    def __init__(self):
+        self._cond = threading.Condition()
+        self._item = None
+        self._closed = False
+        self.dropped = 0
+
+    def put(self, item) -> bool:
+        """Store item; returns False if it replaced a frame that was never processed."""
+        with self._cond:
+            replaced = self._item is not None
+            if replaced:
+                self.dropped += 1
+            self._item = item
+            self._cond.notify()
+            return not replaced
+
+    def get(self, timeout: Optional[float] = None):
+        """Wait for a frame; None once closed (or on timeout). Spurious wakeups keep waiting."""
+        with self._cond:
+            self._cond.wait_for(lambda: self._item is not None or self._closed, timeout)
+            item, self._item = self._item, None
+            return item
+
+    def close(self):
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+
+
+class StreamStats:
+    """
+    Thread-safe counters across all stream sessions (reported under metrics.streams).
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.sessions_active = 0
+        self.sessions_total = 0
+        self.frames_received = 0
+        self.frames_dropped = 0
+        self.frames_processed = 0
+        self.frames_logged = 0
+        self.frames_gated = 0
+
+    def add(self, **counts):
+        with self.lock:
+            for name, value in counts.items():
+                setattr(self, name, getattr(self, name) + value)
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self.lock:
+            return {
+                "sessions_active": self.sessions_active,
+                "sessions_total": self.sessions_total,
+                "frames_received": self.frames_received,
+                "frames_dropped": self.frames_dropped,
+                "frames_processed": self.frames_processed,
+                "frames_logged": self.frames_logged,
+                "frames_gated": self.frames_gated,
+                "gating_rate": round(self.frames_gated / self.frames_processed, 4) if self.frames_processed else 0.0,
+                "drop_rate": round(self.frames_dropped / self.frames_received, 4) if self.frames_received else 0.0,
+            }
+
+
+def decode_frame(data: bytes, options: Dict[str, Any]) -> Optional[np.ndarray]:
+    """
+    Decode one frame to a BGR array.
+
+    options["format"] is "jpeg" (any cv2-decodable image, the default) or
+    "raw" (width * height * channels bytes, RGB or RGBA as from canvas getImageData).
+    """
+    import cv2
+
+    if options.get("format", "jpeg") == "raw":
+        width, height = int(options.get("width", 0)), int(options.get("height", 0))
+        if width <= 0 or height <= 0 or len(data) % (width * height) != 0:
+            return None
+        channels = len(data) // (width * height)
+        if channels not in (3, 4):
+            return None
+        frame = np.frombuffer(data, dtype=np.uint8).reshape(height, width, channels)
+        return cv2.cvtColor(frame, cv2.COLOR_RGBA2BGR if channels == 4 else cv2.COLOR_RGB2BGR)
+    return cv2.imdecode(np.frombuffer(data, dtype=np.uint8), cv2.IMREAD_COLOR)
+
+
+def frame_signature(frame: np.ndarray, size: int = 32) -> np.ndarray:
+    """Cheap motion signature: the frame downscaled to size x size grayscale."""
+    import cv2
+
+    gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+    return cv2.resize(gray, (size, size), interpolation=cv2.INTER_AREA).astype(np.float32)
+
+
+def frame_change(a: np.ndarray, b: np.ndarray) -> float:
+    """Mean absolute difference between two signatures, 0 (identical) .. 1."""
+    return float(np.abs(a - b).mean() / 255.0)
+
+
+class StreamSession:
+    """
+    One camera session: latest-frame mailbox plus a worker thread that
+    answers each processed frame through `send`.
+    """
+
+    def __init__(
+        self,
+        slot,
+        executor,
+        send: Callable[[str], None],
+        stats: StreamStats,
+        db_path: Optional[str] = None,
+        images_dir: Optional[str] = None,
+        log_sample_rate: float = 0.0,
+        min_confidence: float = 0.0,
+        motion_threshold: float = 0.0,
+        max_reuse_seconds: float = 5.0,
+        client: str = "-",
+    ):
+        """
+        Args:
+            slot: ModelSlot serving this session
+            executor: InferenceExecutor for that model
+            send: Callable that delivers a text message to the client
+            stats: Shared StreamStats
+            db_path / images_dir: Where sampled frames are logged and stored
+            log_sample_rate: Fraction of results stored and logged (0 = none)
+            min_confidence: Results below this are sent as low confidence and never logged
+            motion_threshold: Reuse the last result below this frame change (0 disables gating)
+            max_reuse_seconds: Re-infer at least this often even without motion
+            client: Client identifier for fair scheduling on the executor
+        """
+        self.slot = slot
+        self.executor = executor
+        self.send = send
+        self.stats = stats
+        self.db_path = db_path
+        self.images_dir = images_dir
+        self.log_sample_rate = max(0.0, min(1.0, log_sample_rate))
+        self.min_confidence = min_confidence
+        self.motion_threshold = motion_threshold
+        self.max_reuse_seconds = max_reuse_seconds
+        self.client = client
+        self._last_signature: Optional[np.ndarray] = None
+        self._last_result: Optional[Dict[str, Any]] = None
+        self._last_inferred_at = 0.0
+        self.options: Dict[str, Any] = {"format": "jpeg"}
+        self.mailbox = LatestFrameMailbox()
+        self.seq = 0
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self) -> "StreamSession":
+        self.stats.add(sessions_active=1, sessions_total=1)
+        self._thread = threading.Thread(target=self._run, name=f"stream-{self.slot.name}", daemon=True)
+        self._thread.start()
+        return self
+
+    def configure(self, options: Dict[str, Any]):
+        """Apply a client text message such as {"format": "raw", "width": 640, "height": 480}."""
+        self.options.update({k: options[k] for k in ("format", "width", "height") if k in options})
+        if "motion_threshold" in options:
+            self.motion_threshold = max(0.0, float(options["motion_threshold"]))
+
+    def push(self, data: bytes):
+        """Hand a frame from the receive loop to the worker (never blocks)."""
+        self.seq += 1
+        self.stats.add(frames_received=1)
+        if not self.mailbox.put((self.seq, data, dict(self.options), time.perf_counter())):
+            self.stats.add(frames_dropped=1)
+
+    def close(self):
+        self.mailbox.close()
+        if self._thread is not None:
+            self._thread.join(timeout=5.0)
+        self.stats.add(sessions_active=-1)
+
+    def _run(self):
+        with inference_priority("interactive", self.client):
+            self._serve()
+
+    def _serve(self):
+        while True:
+            item = self.mailbox.get()
+            if item is None:
+                return
+            seq, data, options, received_at = item
+            try:
+                result = self._process(data, options)
+            except Exception as exc:
+                logger.exception("Stream frame %d failed", seq)
+                result = {"error": str(exc)}
+            result.update({
+                "frame": seq,
+                "dropped": self.mailbox.dropped,
+                "latency_ms": round((time.perf_counter() - received_at) * 1000.0, 1),
+            })
+            self.stats.add(frames_processed=1)
+            try:
+                self.send(json.dumps(result))
+            except Exception:
+                # Client went away; the receive loop notices and closes the session
+                self.mailbox.close()
+                return
+
+    def _process(self, data: bytes, options: Dict[str, Any]) -> Dict[str, Any]:
+        frame = decode_frame(data, options)
+        if frame is None:
+            return {"error": "invalid frame"}
+
+        signature = None
+        if self.motion_threshold > 0.0:
+            signature = frame_signature(frame)
+            if (
+                self._last_result is not None
+                and self._last_signature is not None
+                and time.monotonic() - self._last_inferred_at < self.max_reuse_seconds
+                and frame_change(signature, self._last_signature) < self.motion_threshold
+            ):
+                self.stats.add(frames_gated=1)
+                return {**self._last_result, "reused": True}
+
+        result = self._infer(frame)
+        if signature is not None and result.get("error") != "model not loaded":
+            self._last_signature = signature
+            self._last_result = result
+            self._last_inferred_at = time.monotonic()
+        return dict(result)
+
+    def _infer(self, frame: np.ndarray) -> Dict[str, Any]:
+        from .inference import predict_face
+        from .vit_utils import preprocess_face_for_vit
+
+        face_image, _ = preprocess_face_for_vit(frame)
+        if face_image is None:
+            return {"error": "no face"}
+
+        handle = self.slot.acquire()
+        if handle is None:
+            return {"error": "model not loaded"}
+        try:
+            emotion, confidence, all_probs = self.executor.run(
+                predict_face, handle.model, handle.model_type, face_image, handle.labels or []
+            )
+        finally:
+            handle.release()
+        if confidence < self.min_confidence:
+            return {"error": "low confidence", "confidence": round(confidence, 3)}
+
+        result = {
+            "emotion": emotion,
+            "confidence": round(confidence, 3),
+            "all_probabilities": {k: round(v, 4) for k, v in all_probs.items()},
+            "model_version": handle.version,
+        }
+        if self.log_sample_rate > 0.0 and random.random() < self.log_sample_rate:
+            self._log_frame(frame, emotion, confidence)
+        return result
+
+    def _log_frame(self, frame: np.ndarray, emotion: str, confidence: float):
+        """Store a sampled frame and log it like a /detect prediction."""
+        import cv2
+        from .db_logger import log_prediction
+
+        stored_filename = None
+        if self.images_dir:
+            stored_filename = f"{uuid.uuid4()}_stream.jpg"
+            if not cv2.imwrite(os.path.join(self.images_dir, stored_filename), frame):
+                stored_filename = None
+        if self.db_path:
+            try:
+                log_prediction(self.db_path, "stream.jpg", emotion, confidence, stored_filename)
+                self.stats.add(frames_logged=1)
+            except Exception:
+                logger.exception("Failed to log stream frame")
@@ -0,0 +1,145 @@
+"""
+Lightweight CNN "student" distilled from the ViT teacher.
+
+Trained by scripts/distill_student.py on the FER images in archive/ and loaded by
+load_emotion_model(force_model='fast'). It reuses the ViT face crop, so it can
+share preprocessing with the other models.
+"""
+import json
+from pathlib import Path
+from typing import Any, Dict, List, Tuple
+
+import numpy as np
+import torch
+import torch.nn as nn
+from PIL import Image
+
+STUDENT_WEIGHTS = "student.pt"
+STUDENT_CONFIG = "student_config.json"
+
+
+def _conv_block(in_ch: int, out_ch: int) -> nn.Sequential:
+    return nn.Sequential(
+        nn.Conv2d(in_ch, out_ch, kernel_size=3, padding=1, bias=False),
+        nn.BatchNorm2d(out_ch),
+        nn.ReLU(inplace=True),
+        nn.Conv2d(out_ch, out_ch, kernel_size=3, padding=1, bias=False),
+        nn.BatchNorm2d(out_ch),
+        nn.ReLU(inplace=True),
+        nn.MaxPool2d(2),
+    )
+
+
+class EmotionStudentCNN(nn.Module):
+    """
+    Small VGG-style CNN for grayscale face crops (48x48 or 112x112).
+    Roughly 0.3M parameters at width=32, versus ~86M for the ViT.
+    """
+
+    def __init__(self, num_classes: int = 8, width: int = 32):
+        super().__init__()
+        self.features = nn.Sequential(
+            _conv_block(1, width),
+            _conv_block(width, width * 2),
+            _conv_block(width * 2, width * 4),
+        )
+        self.pool = nn.AdaptiveAvgPool2d(1)
+        self.classifier = nn.Sequential(
+            nn.Flatten(),
+            nn.Dropout(0.3),
+            nn.Linear(width * 4, num_classes),
+        )
+
+    def forward(self, x: torch.Tensor) -> torch.Tensor:
+        return self.classifier(self.pool(self.features(x)))
+
+
+def images_to_tensor(images: list, input_size: int) -> torch.Tensor:
+    """Convert PIL images to a normalized (N, 1, H, W) grayscale batch."""
+    arrs = []
+    for image in images:
+        gray = image.convert("L")
+        if gray.size != (input_size, input_size):
+            gray = gray.resize((input_size, input_size), Image.Resampling.BILINEAR)
+        arrs.append(np.asarray(gray, dtype=np.float32) / 255.0)
+    batch = torch.from_numpy(np.stack(arrs)).unsqueeze(1)
+    return (batch - 0.5) / 0.5
+
+
+def save_student(model: nn.Module, out_dir: str, labels: list, input_size: int, width: int, extra: Dict[str, Any] = None):
+    out = Path(out_dir)
+    out.mkdir(parents=True, exist_ok=True)
+    torch.save(model.state_dict(), out / STUDENT_WEIGHTS)
+    config = {
+        "labels": list(labels),
+        "input_size": int(input_size),
+        "width": int(width),
+        **(extra or {}),
+    }
+    with (out / STUDENT_CONFIG).open("w", encoding="utf-8") as f:
+        json.dump(config, f, indent=2)
+
+
+def load_student(model_dir: str) -> Tuple[nn.Module, Dict[str, Any]]:
+    """Load a student exported by save_student. Raises FileNotFoundError if missing."""
+    model_dir = Path(model_dir)
+    weights = model_dir / STUDENT_WEIGHTS
+    config_path = model_dir / STUDENT_CONFIG
+    if not weights.exists() or not config_path.exists():
+        raise FileNotFoundError(f"Student model not found in {model_dir}")
+
+    with config_path.open("r", encoding="utf-8") as f:
+        config = json.load(f)
+    model = EmotionStudentCNN(num_classes=len(config["labels"]), width=config.get("width", 32))
+    model.load_state_dict(torch.load(weights, map_location="cpu", weights_only=True))
+    model.eval()
+    return model, config
+
+
+def predict_with_student(
+    model_dict: Dict[str, Any],
+    image: Image.Image,
+    labels: list
+) -> Tuple[int, float, Dict[str, float]]:
+    """
+    Run prediction using the distilled student.
+
+    Args:
+        model_dict: {'model': model, 'input_size': int, 'type': 'student'}
+        image: PIL face crop (any size, RGB or grayscale)
+        labels: List of emotion labels
+
+    Returns:
+        (predicted_index, confidence, all_probabilities_dict)
+    """
+    model = model_dict['model']
+    inputs = images_to_tensor([image], model_dict.get('input_size', 48))
+
+    with torch.inference_mode():
+        probs = torch.softmax(model(inputs), dim=-1)[0].numpy()
+
+    return _probs_to_prediction(probs, labels)
+
+
+def predict_batch_with_student(
+    model_dict: Dict[str, Any],
+    images: List[Image.Image],
+    labels: list
+) -> List[Tuple[int, float, Dict[str, float]]]:
+    """Batched predict_with_student: one forward for all face crops."""
+    if not images:
+        return []
+    inputs = images_to_tensor(images, model_dict.get('input_size', 48))
+    with torch.inference_mode():
+        probs = torch.softmax(model_dict['model'](inputs), dim=-1).numpy()
+    return [_probs_to_prediction(row, labels) for row in probs]
+
+
+def _probs_to_prediction(probs: np.ndarray, labels: list) -> Tuple[int, float, Dict[str, float]]:
+    predicted_idx = int(np.argmax(probs))
+    confidence = float(probs[predicted_idx])
+    all_probs = {
+        (labels[i] if i < len(labels) else f"class_{i}"): float(p)
+        for i, p in enumerate(probs)
+    }
+    return predicted_idx, confidence, all_probs
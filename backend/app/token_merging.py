@@ -0,0 +1,156 @@
+"""
+Token merging (ToMe-style bipartite soft matching) for HuggingFace ViT models.
+
+After each block's attention, the most similar patch tokens are averaged
+together, so later blocks process fewer tokens. No retraining is needed; the
+trade-off is controlled by the merge ratio (fraction of the remaining patch
+tokens merged in every block, 0 = off).
+
+Usage:
+    enable_token_merging(model)          # patch once (idempotent)
+    with token_merging(0.2):             # ratio applies to forwards on this thread/context
+        logits = model(**inputs).logits
+
+Reference: Bolya et al., "Token Merging: Your ViT But Faster" (ICLR 2023).
+"""
+import contextvars
+import inspect
+import math
+import threading
+import types
+from contextlib import contextmanager
+from typing import Callable, Tuple
+
+import torch
+
+MAX_MERGE_RATIO = 0.5
+
+_merge_ratio = contextvars.ContextVar("token_merge_ratio", default=0.0)
+_state = threading.local()
+_patch_lock = threading.Lock()
+
+
+@contextmanager
+def token_merging(ratio: float):
+    """Merge tokens at `ratio` for ViT forwards run inside this block."""
+    token = _merge_ratio.set(float(ratio or 0.0))
+    try:
+        yield
+    finally:
+        _merge_ratio.reset(token)
+
+
+def validate_merge_ratio(value) -> Tuple[float, str]:
+    """Parse a merge ratio query value. Returns (ratio, error_message)."""
+    if value is None or value == "":
+        return 0.0, None
+    try:
+        ratio = float(value)
+    except (TypeError, ValueError):
+        return 0.0, "Invalid merge_ratio parameter. Must be a number."
+    if not 0.0 <= ratio < MAX_MERGE_RATIO:
+        return 0.0, f"merge_ratio must be >= 0 and < {MAX_MERGE_RATIO}"
+    return ratio, None
+
+
+def bipartite_soft_matching(metric: torch.Tensor, r: int) -> Callable:
+    """
+    Split tokens into alternating sets A/B, connect every A token to its most
+    similar B token and merge the r strongest edges. The class token (index 0)
+    is never merged and stays first.
+
+    Returns a merge(x, mode) function that applies the same reduction to any
+    tensor shaped like (batch, tokens, channels).
+    """
+    t = metric.shape[1]
+    r = min(r, (t - 1) // 2)
+    if r <= 0:
+        return lambda x, mode="mean": x
+
+    with torch.no_grad():
+        metric = metric / metric.norm(dim=-1, keepdim=True)
+        a, b = metric[..., ::2, :], metric[..., 1::2, :]
+        scores = a @ b.transpose(-1, -2)
+        scores[..., 0, :] = -math.inf  # protect the class token
+
+        node_max, node_idx = scores.max(dim=-1)
+        edge_idx = node_max.argsort(dim=-1, descending=True)[..., None]
+        unm_idx = edge_idx[..., r:, :].sort(dim=1)[0]  # unmerged A tokens, original order (cls first)
+        src_idx = edge_idx[..., :r, :]                 # merged A tokens
+        dst_idx = node_idx[..., None].gather(dim=-2, index=src_idx)
+
+    def merge(x: torch.Tensor, mode: str = "mean") -> torch.Tensor:
+        src, dst = x[..., ::2, :], x[..., 1::2, :]
+        n, t1, c = src.shape
+        unm = src.gather(dim=-2, index=unm_idx.expand(n, t1 - r, c))
+        src = src.gather(dim=-2, index=src_idx.expand(n, r, c))
+        dst = dst.scatter_reduce(-2, dst_idx.expand(n, r, c), src, reduce=mode)
+        return torch.cat([unm, dst], dim=1)
+
+    return merge
+
+
+def _merge_weighted(merge: Callable, x: torch.Tensor, size: torch.Tensor) -> Tuple[torch.Tensor, torch.Tensor]:
+    """Size-weighted average so merged tokens keep the mass of what they absorbed."""
+    x = merge(x * size, mode="sum")
+    size = merge(size, mode="sum")
+    return x / size, size
+
+
+def _tome_layer_forward(self, hidden_states, *args, **kwargs):
+    ratio = _merge_ratio.get()
+    if ratio <= 0.0:
+        return self._tome_original_forward(hidden_states, *args, **kwargs)
+
+    # Token sizes are tracked per forward pass; the first block starts fresh
+    if self._tome_index == 0 or getattr(_state, "size", None) is None \
+            or _state.size.shape[:2] != hidden_states.shape[:2]:
+        _state.size = torch.ones(hidden_states.shape[0], hidden_states.shape[1], 1,
+                                 dtype=hidden_states.dtype, device=hidden_states.device)
+
+    head_mask = args[0] if args else kwargs.get("head_mask")
+    hidden_states_norm = self.layernorm_before(hidden_states)
+    attention_output = self.attention(hidden_states_norm, head_mask)
+    if isinstance(attention_output, tuple):
+        attention_output = attention_output[0]
+    hidden_states = attention_output + hidden_states
+
+    # Keys are the best similarity metric; fall back to the normalized input
+    self_attention = getattr(self.attention, "attention", None)
+    key_proj = getattr(self_attention, "key", None)
+    metric = key_proj(hidden_states_norm) if key_proj is not None else hidden_states_norm
+
+    r = int(ratio * (hidden_states.shape[1] - 1))
+    merge = bipartite_soft_matching(metric, r)
+    hidden_states, _state.size = _merge_weighted(merge, hidden_states, _state.size)
+
+    layer_output = self.layernorm_after(hidden_states)
+    layer_output = self.intermediate(layer_output)
+    layer_output = self.output(layer_output, hidden_states)
+
+    # Older transformers versions return a tuple from ViTLayer.forward
+    return (layer_output,) if self._tome_returns_tuple else layer_output
+
+
+def enable_token_merging(model) -> bool:
+    """
+    Patch every ViT block of `model` so it honours token_merging(ratio).
+    Safe to call repeatedly. Returns False if the model has no ViT encoder.
+    """
+    with _patch_lock:
+        if getattr(model, "_tome_enabled", False):
+            return True
+        vit = getattr(model, "vit", model)
+        encoder = getattr(vit, "encoder", None)
+        layers = getattr(encoder, "layer", None)
+        if not layers:
+            return False
+
+        for index, layer in enumerate(layers):
+            original = layer.forward
+            layer._tome_original_forward = original
+            layer._tome_index = index
+            layer._tome_returns_tuple = "output_attentions" in inspect.signature(original).parameters
+            layer.forward = types.MethodType(_tome_layer_forward, layer)
+        model._tome_enabled = True
+        return True
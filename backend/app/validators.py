@@ -2,6 +2,7 @@
 Request validation utilities.
 """
 import os
+import datetime
 from typing import Tuple, Optional
 from werkzeug.utils import secure_filename
 from PIL import Image
@@ -114,3 +115,33 @@ def validate_confidence_range(min_conf: Optional[str], max_conf: Optional[str])
         return None, None, "min_confidence cannot be greater than max_confidence"
     
     return min_val, max_val, None
+
+
+def validate_date_range(date_from: Optional[str], date_to: Optional[str]) -> Tuple[Optional[int], Optional[int], Optional[str]]:
+    """
+    Validate ISO date/datetime filters and convert them to Unix epoch seconds
+    (naive values are UTC; a bare date_to covers that whole day).
+    
+    Returns:
+        Tuple of (epoch_from, epoch_to, error_message)
+    """
+    bounds = []
+    for name, value, end_of_day in (("date_from", date_from, False), ("date_to", date_to, True)):
+        if not value:
+            bounds.append(None)
+            continue
+        try:
+            parsed = datetime.datetime.fromisoformat(value.strip())
+        except ValueError:
+            return None, None, f"Invalid {name} parameter. Use ISO format, e.g. 2024-01-31 or 2024-01-31T12:00:00."
+        if parsed.tzinfo is None:
+            parsed = parsed.replace(tzinfo=datetime.timezone.utc)
+        epoch = int(parsed.timestamp())
+        if end_of_day and len(value.strip()) == 10:  # YYYY-MM-DD
+            epoch += 24 * 3600 - 1
+        bounds.append(epoch)
+    
+    if bounds[0] is not None and bounds[1] is not None and bounds[0] > bounds[1]:
+        return None, None, "date_from cannot be later than date_to"
+    
+    return bounds[0], bounds[1], None
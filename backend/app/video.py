@@ -0,0 +1,242 @@
+"""
+Emotion timeline for an uploaded video (/detect/video).
+
+Three stages connected by bounded queues, so memory stays flat whatever the
+video length:
+
+  decode thread   cv2.VideoCapture: grab() every frame, retrieve() only every
+                  `stride`-th one (skipped frames are never converted to BGR)
+  detect thread   face detection + 224x224 crop per sampled frame
+  caller thread   batched forwards on the model's inference executor, then
+                  per-frame points and per-segment aggregates
+"""
+import queue
+import threading
+import time
+import logging
+from collections import Counter
+from typing import Any, Dict, List
+
+logger = logging.getLogger(__name__)
+
+# Shortest timeline segment /detect/video accepts
+MIN_SEGMENT_SECONDS = 0.1
+
+_DONE = object()
+
+
+class _StageError:
+    def __init__(self, exc: BaseException):
+        self.exc = exc
+
+
+def _put(q: "queue.Queue", item, stop: threading.Event) -> bool:
+    """Blocking put that gives up once the pipeline is stopped."""
+    while not stop.is_set():
+        try:
+            q.put(item, timeout=0.1)
+            return True
+        except queue.Full:
+            continue
+    return False
+
+
+def _decode(path: str, stride: int, max_frames: int, out: "queue.Queue", stop: threading.Event, info: Dict):
+    import cv2
+
+    cap = cv2.VideoCapture(path)
+    try:
+        if not cap.isOpened():
+            raise ValueError("Could not open video")
+        fps = cap.get(cv2.CAP_PROP_FPS) or 0.0
+        info["fps"] = fps if fps > 0 else 25.0
+        info["frame_count"] = int(cap.get(cv2.CAP_PROP_FRAME_COUNT) or 0)
+        index = sampled = 0
+        while not stop.is_set():
+            if not cap.grab():
+                break
+            if index % stride == 0:
+                if sampled >= max_frames:
+                    info["truncated"] = True
+                    break
+                ok, frame = cap.retrieve()
+                if ok:
+                    sampled += 1
+                    if not _put(out, (index, index / info["fps"], frame), stop):
+                        break
+            index += 1
+        info["frames_decoded"] = index
+    except BaseException as exc:
+        _put(out, _StageError(exc), stop)
+    finally:
+        cap.release()
+        _put(out, _DONE, stop)
+
+
+def _detect(inp: "queue.Queue", out: "queue.Queue", stop: threading.Event):
+    from .vit_utils import preprocess_face_for_vit
+
+    while not stop.is_set():
+        try:
+            item = inp.get(timeout=0.1)
+        except queue.Empty:
+            continue
+        if item is _DONE or isinstance(item, _StageError):
+            _put(out, item, stop)
+            return
+        index, t, frame = item
+        try:
+            face_image, _ = preprocess_face_for_vit(frame)
+        except Exception:
+            logger.exception("Face detection failed on frame %d", index)
+            face_image = None
+        if not _put(out, (index, t, face_image), stop):
+            return
+
+
+def _segment_summary(start: float, end: float, points: List[Dict], labels: list) -> Dict[str, Any]:
+    faces = [p for p in points if "emotion" in p]
+    summary = {
+        "start": round(start, 3),
+        "end": round(end, 3),
+        "frames": len(points),
+        "faces": len(faces),
+        "emotion": None,
+        "confidence": None,
+        "counts": {},
+        "mean_probabilities": {},
+    }
+    if faces:
+        mean = {label: sum(p["all_probabilities"].get(label, 0.0) for p in faces) / len(faces) for label in labels}
+        dominant = max(mean, key=mean.get)
+        summary.update({
+            "emotion": dominant,
+            "confidence": round(mean[dominant], 3),
+            "counts": dict(Counter(p["emotion"] for p in faces)),
+            "mean_probabilities": {k: round(v, 4) for k, v in mean.items()},
+        })
+    return summary
+
+
+def analyze_video(
+    path: str,
+    handle,
+    executor,
+    stride: int = 5,
+    segment_seconds: float = 1.0,
+    batch_size: int = 16,
+    max_frames: int = 3600,
+    queue_size: int = 32,
+    include_frames: bool = True,
+) -> Dict[str, Any]:
+    """
+    Run the emotion model over a video file.
+
+    Args:
+        path: Video file readable by cv2.VideoCapture
+        handle: Acquired ModelHandle (ViT or student)
+        executor: InferenceExecutor for that model
+        stride: Analyse every stride-th frame
+        segment_seconds: Timeline segment length for aggregates
+        batch_size: Face crops per batched forward
+        max_frames: Stop after this many sampled frames ("truncated" in the result)
+        queue_size: Bound of each inter-stage queue
+        include_frames: Return per-frame points as well as segments
+
+    Returns:
+        Dict with video info, "segments" and (optionally) "frames"
+    """
+    from .inference import predict_faces
+
+    stride = max(1, int(stride))
+    labels = handle.labels or []
+    stop = threading.Event()
+    info: Dict[str, Any] = {"fps": 25.0, "frame_count": 0, "frames_decoded": 0, "truncated": False}
+    frames_q: "queue.Queue" = queue.Queue(maxsize=queue_size)
+    crops_q: "queue.Queue" = queue.Queue(maxsize=queue_size)
+    threads = [
+        threading.Thread(target=_decode, args=(path, stride, max_frames, frames_q, stop, info), name="video-decode", daemon=True),
+        threading.Thread(target=_detect, args=(frames_q, crops_q, stop), name="video-detect", daemon=True),
+    ]
+    for t in threads:
+        t.start()
+
+    frames_out: List[Dict] = []
+    segments: List[Dict] = []
+    segment_points: List[Dict] = []
+    segment_index = 0
+    sampled = faces = 0
+    inference_ms = 0.0
+    pending: List = []
+
+    def _emit(point: Dict):
+        nonlocal segment_index, segment_points
+        # Points arrive in time order; jump straight to the point's segment (empty ones are skipped)
+        point_segment = int(point["t"] // segment_seconds)
+        if point_segment > segment_index:
+            if segment_points:
+                segments.append(_segment_summary(segment_index * segment_seconds, (segment_index + 1) * segment_seconds,
+                                                 segment_points, labels))
+            segment_points = []
+            segment_index = point_segment
+        segment_points.append(point)
+        if include_frames:
+            frames_out.append(point)
+
+    def _flush():
+        nonlocal faces, inference_ms
+        ready = [(i, t, crop) for i, t, crop in pending if crop is not None]
+        predictions = []
+        if ready:
+            started = time.perf_counter()
+            predictions = executor.run(predict_faces, handle.model, handle.model_type, [c for _, _, c in ready], labels)
+            inference_ms += (time.perf_counter() - started) * 1000.0
+        by_index = {i: p for (i, _, _), p in zip(ready, predictions)}
+        for i, t, _ in pending:
+            point = {"frame": i, "t": round(t, 3)}
+            if i in by_index:
+                emotion, confidence, all_probs = by_index[i]
+                point.update({
+                    "emotion": emotion,
+                    "confidence": round(confidence, 3),
+                    "all_probabilities": {k: round(v, 4) for k, v in all_probs.items()},
+                })
+                faces += 1
+            _emit(point)
+        pending.clear()
+
+    try:
+        while True:
+            item = crops_q.get()
+            if item is _DONE:
+                break
+            if isinstance(item, _StageError):
+                raise item.exc
+            pending.append(item)
+            sampled += 1
+            if len(pending) >= batch_size:
+                _flush()
+        _flush()
+        if segment_points:
+            segments.append(_segment_summary(segment_index * segment_seconds, (segment_index + 1) * segment_seconds,
+                                             segment_points, labels))
+    finally:
+        stop.set()
+        for t in threads:
+            t.join(timeout=5.0)
+
+    result = {
+        "fps": round(info["fps"], 3),
+        "frame_count": info["frame_count"],
+        "frames_decoded": info["frames_decoded"],
+        "duration_s": round(info["frames_decoded"] / info["fps"], 3),
+        "stride": stride,
+        "frames_sampled": sampled,
+        "frames_with_face": faces,
+        "truncated": info["truncated"],
+        "inference_ms": round(inference_ms, 1),
+        "segments": segments,
+    }
+    if include_frames:
+        result["frames"] = frames_out
+    return result
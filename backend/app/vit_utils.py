@@ -5,24 +5,33 @@ Utilities for Vision Transformer (ViT) model preprocessing and prediction.
 import cv2
 import numpy as np
 from PIL import Image
-from typing import Optional, Tuple, Dict, Any
+from typing import Optional, Tuple, Dict, Any, List, Union
 from app.utils import preprocess_face  # Reuse face detection
 
 def preprocess_face_for_vit(
-    image_path: str,
+    image_path: Union[str, np.ndarray],
     detect_max_dim: int = 800,
     pad_ratio: float = 0.35,  # Increased to 0.35 to include more facial context - helps with happy detection (smile needs more context)
+    detector: str = "full",
 ) -> Tuple[Optional[Image.Image], Optional[str]]:
     """
     Preprocess face for Vision Transformer model.
     ViT needs RGB images at 224x224, not grayscale 48x48.
+
+    image_path may also be an already-decoded BGR frame (streams, video),
+    which skips the disk round trip.
+
+    detector sets how far down the cascade ladder detection goes:
+      "quick"     default cascade, one parameter set (1 attempt)
+      "standard"  2 primary cascades x 2 parameter sets, then the non-enhanced image
+      "full"      also the alt2 cascade and a full-resolution pass (default)
     
     Returns: (PIL Image, filename) or (None, None) if no face detected
     """
     # First detect and crop face (reuse existing detection logic)
     # But we'll keep it in RGB and resize to 224x224
     try:
-        img = cv2.imread(image_path)
+        img = image_path if isinstance(image_path, np.ndarray) else cv2.imread(image_path)
         if img is None:
             return None, None
 
@@ -51,6 +60,9 @@ def preprocess_face_for_vit(
             "haarcascade_frontalface_default.xml",  # Most reliable
             "haarcascade_frontalface_alt.xml",      # Good fallback
         ]
+        quick = detector == "quick"
+        if quick:
+            cascade_paths_primary = cascade_paths_primary[:1]
         
         cascade_paths_fallback = [
             "haarcascade_frontalface_alt2.xml",     # Last resort
@@ -77,7 +89,7 @@ def preprocess_face_for_vit(
                 )
                 
                 # Attempt 2: More permissive (catches challenging cases)
-                if len(faces) == 0:
+                if len(faces) == 0 and not quick:
                     faces = face_cascade.detectMultiScale(
                         small_enh,
                         scaleFactor=1.03,
@@ -90,7 +102,7 @@ def preprocess_face_for_vit(
                 continue
         
         # Fallback: Only try 3rd cascade if primary failed (adds 2 more attempts)
-        if len(faces) == 0:
+        if len(faces) == 0 and detector == "full":
             for cascade_name in cascade_paths_fallback:
                 if len(faces) > 0:
                     break
@@ -118,7 +130,7 @@ def preprocess_face_for_vit(
         
         # Fallback 1: Try on original (non-enhanced) image if enhanced failed
         # Only try once with best params (don't waste time on multiple attempts)
-        if len(faces) == 0:
+        if len(faces) == 0 and not quick:
             try:
                 face_cascade = cv2.CascadeClassifier(cv2.data.haarcascades + "haarcascade_frontalface_default.xml")
                 if not face_cascade.empty():
@@ -138,7 +150,7 @@ def preprocess_face_for_vit(
         # 2. Image was actually downscaled (max_side > 800)
         # 3. Scale is significantly reduced (scale < 0.5, meaning image is 2x+ larger)
         # This prevents slow full-size detection on images that are only slightly over 800px
-        if len(faces) == 0 and max_side > detect_max_dim and scale < 0.5:
+        if len(faces) == 0 and detector == "full" and max_side > detect_max_dim and scale < 0.5:
             try:
                 face_cascade = cv2.CascadeClassifier(cv2.data.haarcascades + "haarcascade_frontalface_default.xml")
                 if not face_cascade.empty():
@@ -194,55 +206,66 @@ def preprocess_face_for_vit(
         face_pil = face_pil.resize((224, 224), Image.Resampling.BICUBIC)
 
         import os
-        used_filename = os.path.basename(image_path) or "upload.jpg"
+        used_filename = (os.path.basename(image_path) if isinstance(image_path, str) else "") or "upload.jpg"
         return face_pil, used_filename
 
     except Exception as e:
         import logging
         logger = logging.getLogger(__name__)
-        logger.exception(f"Exception in preprocess_face_for_vit for {image_path}: {e}")
+        logger.exception(f"Exception in preprocess_face_for_vit for {image_path if isinstance(image_path, str) else 'frame'}: {e}")
         return None, None
 
-def predict_with_vit(
+def _vit_logits(
     model_dict: Dict[str, Any],
-    image: Image.Image,
-    labels: list
-) -> Tuple[int, float, Dict[str, float]]:
+    images: List[Image.Image],
+    merge_ratio: float = 0.0,
+    precision: Optional[str] = None,
+):
     """
-    Run prediction using Vision Transformer model.
-    Enhanced for better accuracy with image preprocessing.
-    
-    Args:
-        model_dict: {'model': model, 'processor': processor, 'type': 'vit'}
-        image: PIL Image (224x224 RGB)
-        labels: List of emotion labels
-    
-    Returns:
-        (predicted_index, confidence, all_probabilities_dict)
+    One batched ViT forward over face crops. Returns fp32 logits (batch, classes).
+    See predict_with_vit for merge_ratio / precision.
     """
     processor = model_dict['processor']
     model = model_dict['model']
     
-    # Ensure image is RGB (some images might be RGBA or grayscale)
-    if image.mode != 'RGB':
-        image = image.convert('RGB')
+    # Ensure images are RGB (some images might be RGBA or grayscale)
+    images = [image if image.mode == 'RGB' else image.convert('RGB') for image in images]
     
-    # Preprocess image for ViT (processor handles normalization)
-    inputs = processor(image, return_tensors="pt")
+    # Preprocess images for ViT (processor handles normalization)
+    inputs = processor(images, return_tensors="pt")
     
     # Run prediction - optimized for speed
     import torch
-    import torch.nn.functional as F
     
     model.eval()
+    from contextlib import nullcontext
+    from app.token_merging import enable_token_merging, token_merging
+    if merge_ratio > 0:
+        enable_token_merging(model)
+
+    # Match the input dtype to the weights; autocast when bf16 is asked of fp32 weights
+    precision = precision or model_dict.get('precision', 'fp32')
+    weight_dtype = next(model.parameters()).dtype
+    if weight_dtype != torch.float32:
+        inputs = {k: v.to(weight_dtype) if v.is_floating_point() else v for k, v in inputs.items()}
+    autocast = torch.autocast("cpu", dtype=torch.bfloat16) \
+        if precision == 'bf16' and weight_dtype == torch.float32 else nullcontext()
+
     # Use inference_mode() instead of no_grad() - faster for inference-only
-    with torch.inference_mode():  # Faster than no_grad() for pure inference
+    with torch.inference_mode(), autocast, token_merging(merge_ratio):  # Faster than no_grad() for pure inference
         outputs = model(**inputs)
-        logits = outputs.logits
-    
+        logits = outputs.logits.float()
+    return logits
+
+
+def _vit_postprocess(model, logits, labels: list) -> Tuple[int, float, Dict[str, float]]:
+    """Turn one image's logits into (predicted_index, confidence, all_probabilities_dict)."""
+    import torch
+    import torch.nn.functional as F
+
     # Get probabilities (softmax) - optimized conversion
     probs = F.softmax(logits, dim=-1)
-    probs_np = probs[0].cpu().numpy()  # Direct indexing, no detach needed in inference_mode
+    probs_np = probs.cpu().numpy()  # No detach needed in inference_mode
     
     # Get predicted class
     predicted_idx = int(torch.argmax(logits, dim=-1).item())
@@ -250,7 +273,6 @@ def predict_with_vit(
     
     # Create probabilities dict - use model's id2label directly to ensure correct mapping
     all_probs = {}
-    model = model_dict['model']
     for i, prob in enumerate(probs_np):
         # Use model's id2label for accurate label mapping
         if hasattr(model, 'config') and hasattr(model.config, 'id2label'):
@@ -321,3 +343,55 @@ def predict_with_vit(
     
     return predicted_idx, confidence, all_probs
 
+
+def predict_with_vit(
+    model_dict: Dict[str, Any],
+    image: Image.Image,
+    labels: list,
+    merge_ratio: float = 0.0,
+    precision: Optional[str] = None,
+    tta: bool = False,
+) -> Tuple[int, float, Dict[str, float]]:
+    """
+    Run prediction using Vision Transformer model.
+    Enhanced for better accuracy with image preprocessing.
+    
+    Args:
+        model_dict: {'model': model, 'processor': processor, 'type': 'vit'}
+        image: PIL Image (224x224 RGB)
+        labels: List of emotion labels
+        merge_ratio: Token merging ratio (0 = off); see app.token_merging
+        precision: 'fp32' or 'bf16' (default: model_dict['precision'] or 'fp32').
+                   bf16 on fp32 weights runs under CPU autocast; weights already
+                   cast to bf16 by load_emotion_model run in bf16 regardless.
+        tta: Test-time augmentation - also run the horizontally flipped crop (same
+             forward, batch of 2) and average the logits
+    
+    Returns:
+        (predicted_index, confidence, all_probabilities_dict)
+    """
+    if tta:
+        image = image if image.mode == 'RGB' else image.convert('RGB')
+        logits = _vit_logits(model_dict, [image, image.transpose(Image.Transpose.FLIP_LEFT_RIGHT)], merge_ratio, precision)
+        return _vit_postprocess(model_dict['model'], logits.mean(dim=0), labels)
+    logits = _vit_logits(model_dict, [image], merge_ratio, precision)
+    return _vit_postprocess(model_dict['model'], logits[0], labels)
+
+
+def predict_batch_with_vit(
+    model_dict: Dict[str, Any],
+    images: List[Image.Image],
+    labels: list,
+    merge_ratio: float = 0.0,
+    precision: Optional[str] = None,
+) -> List[Tuple[int, float, Dict[str, float]]]:
+    """
+    Batched predict_with_vit: one forward for all face crops, same post-processing per image.
+
+    Returns:
+        [(predicted_index, confidence, all_probabilities_dict), ...] in input order
+    """
+    if not images:
+        return []
+    logits = _vit_logits(model_dict, images, merge_ratio, precision)
+    return [_vit_postprocess(model_dict['model'], row, labels) for row in logits]
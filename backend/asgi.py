@@ -0,0 +1,28 @@
+# asgi.py
+"""
+ASGI entry point: uvicorn asgi:app --host 0.0.0.0 --port 5000
+
+Same routes as main.py (WSGI/gunicorn); see app/asgi.py for what changes.
+"""
+import os
+import logging
+import warnings
+
+warnings.filterwarnings("ignore", category=UserWarning, module="google.protobuf")
+os.environ["PROTOCOL_BUFFERS_PYTHON_IMPLEMENTATION"] = "python"
+
+PROJECT_ROOT = os.path.dirname(os.path.abspath(__file__))
+LOG_DIR = os.path.join(PROJECT_ROOT, "logs")
+os.makedirs(LOG_DIR, exist_ok=True)
+
+logfile = os.path.join(LOG_DIR, "app.log")
+root_logger = logging.getLogger()
+if not any(isinstance(h, logging.FileHandler) and getattr(h, "baseFilename", "") == logfile for h in root_logger.handlers):
+    handler = logging.FileHandler(logfile)
+    handler.setLevel(logging.INFO)
+    handler.setFormatter(logging.Formatter("%(asctime)s [%(levelname)s] %(module)s: %(message)s"))
+    root_logger.addHandler(handler)
+
+from app.asgi import create_asgi_app
+
+app = create_asgi_app()
@@ -29,8 +29,11 @@ if not any(isinstance(h, logging.FileHandler) and getattr(h, "baseFilename", "")
 # Import factory after logging and directory setup so imports don't crash during bootstrap
 from app import create_app
 
-# Create app (allow env-driven config if needed)
-app = create_app()
+# Create app (allow env-driven config if needed). Under `python main.py`, spawned
+# worker processes (PREPROCESS_WORKERS) re-import this file as __mp_main__; they
+# must not build their own app (models, job runner, writer threads).
+if __name__ != "__mp_main__":
+    app = create_app()
 
 if __name__ == "__main__":
     # allow overriding host/port via env (useful in Docker)
@@ -0,0 +1,58 @@
+#!/usr/bin/env python3
+"""
+Helpers for the labeled FER images in backend/archive/ (one folder per emotion).
+
+Shared by the offline evaluation / distillation scripts, e.g.:
+    from archive_dataset import list_archive_samples, split_samples
+"""
+import random
+import sys
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+ARCHIVE_DIR = BACKEND_DIR / "archive"
+MODELS_DIR = BACKEND_DIR / "models"
+
+# Make `from app...` importable when scripts are run directly
+if str(BACKEND_DIR) not in sys.path:
+    sys.path.insert(0, str(BACKEND_DIR))
+
+IMAGE_EXTENSIONS = {".jpg", ".jpeg", ".png"}
+
+
+def list_archive_samples(
+    archive_dir: Path = ARCHIVE_DIR,
+    max_per_class: Optional[int] = None,
+    seed: int = 0,
+) -> List[Tuple[str, str]]:
+    """
+    Return [(image_path, emotion), ...] for every image under archive_dir/<emotion>/.
+
+    With max_per_class, a deterministic random subset is taken from each folder.
+    """
+    archive_dir = Path(archive_dir)
+    if not archive_dir.exists():
+        raise FileNotFoundError(f"Archive directory not found: {archive_dir}")
+
+    rng = random.Random(seed)
+    samples = []
+    for emotion_dir in sorted(p for p in archive_dir.iterdir() if p.is_dir()):
+        files = sorted(str(f) for f in emotion_dir.iterdir() if f.suffix.lower() in IMAGE_EXTENSIONS)
+        if max_per_class is not None and len(files) > max_per_class:
+            files = rng.sample(files, max_per_class)
+        samples.extend((f, emotion_dir.name) for f in files)
+    return samples
+
+
+def split_samples(samples: List, val_fraction: float = 0.1, seed: int = 0) -> Tuple[List, List]:
+    """Deterministic shuffled train/val split."""
+    shuffled = list(samples)
+    random.Random(seed).shuffle(shuffled)
+    n_val = int(len(shuffled) * val_fraction)
+    return shuffled[n_val:], shuffled[:n_val]
+
+
+def label_index(labels: List[str]) -> Dict[str, int]:
+    """Map archive folder names onto a model's (normalized) label indices."""
+    return {label: i for i, label in enumerate(labels)}
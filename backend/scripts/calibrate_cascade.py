@@ -0,0 +1,128 @@
+#!/usr/bin/env python3
+"""
+Calibrate the confidence / margin thresholds for tiered inference (/detect?model=tiered).
+
+Runs the fast student and the full ViT on a sample of archive/, then searches a
+grid of (min_confidence, min_margin) thresholds for the one with the lowest
+escalation rate whose cascade accuracy stays within --max-accuracy-drop of the
+ViT alone. The result is written to backend/models/cascade_calibration.json,
+which create_app reads at startup.
+
+Usage:
+    python3 backend/scripts/calibrate_cascade.py
+    python3 backend/scripts/calibrate_cascade.py --max-per-class 500 --max-accuracy-drop 0.005
+"""
+import argparse
+import json
+import time
+from pathlib import Path
+
+from archive_dataset import MODELS_DIR, ARCHIVE_DIR, list_archive_samples
+
+import numpy as np
+from PIL import Image
+
+
+def run_model(model_dict, model_type, labels, samples):
+    """Return per-sample (emotion, confidence, margin) and mean latency in ms."""
+    from app.inference import predict_face, top_margin
+
+    results = []
+    started = time.perf_counter()
+    for i, (path, _) in enumerate(samples):
+        image = Image.open(path).convert("RGB")
+        emotion, confidence, all_probs = predict_face(model_dict, model_type, image, labels)
+        results.append((emotion, confidence, top_margin(all_probs)))
+        if (i + 1) % 500 == 0:
+            print(f"   {model_type}: {i + 1}/{len(samples)}")
+    latency_ms = (time.perf_counter() - started) / max(len(samples), 1) * 1000.0
+    return results, latency_ms
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Calibrate tiered inference thresholds on archive/")
+    parser.add_argument("--archive", default=str(ARCHIVE_DIR))
+    parser.add_argument("--full", default="base", choices=["base", "fine-tuned"], help="Full (escalation) tier")
+    parser.add_argument("--max-per-class", type=int, default=300)
+    parser.add_argument("--max-accuracy-drop", type=float, default=0.01,
+                        help="Allowed accuracy loss of the cascade vs the full model alone")
+    parser.add_argument("--out", default=str(MODELS_DIR / "cascade_calibration.json"))
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    from app.model_loader import load_emotion_model
+
+    print("=" * 70)
+    print("🎚️  CASCADE CALIBRATION")
+    print("=" * 70)
+
+    fast_dict, fast_labels, fast_version, fast_type = load_emotion_model(force_model="fast")
+    full_dict, full_labels, full_version, full_type = load_emotion_model(force_model=args.full)
+
+    samples = [(p, e) for p, e in list_archive_samples(Path(args.archive), args.max_per_class, args.seed) if e in full_labels]
+    print(f"📊 {len(samples)} images | fast={fast_version} | full={full_version}")
+
+    fast_results, fast_ms = run_model(fast_dict, fast_type, fast_labels, samples)
+    full_results, full_ms = run_model(full_dict, full_type, full_labels, samples)
+
+    truth = np.array([e for _, e in samples])
+    fast_pred = np.array([r[0] for r in fast_results])
+    full_pred = np.array([r[0] for r in full_results])
+    fast_conf = np.array([r[1] for r in fast_results])
+    fast_margin = np.array([r[2] for r in fast_results])
+    full_acc = float((full_pred == truth).mean())
+    fast_acc = float((fast_pred == truth).mean())
+
+    best = None
+    grid = []
+    for min_conf in np.round(np.arange(0.0, 1.0001, 0.05), 2):
+        for min_margin in np.round(np.arange(0.0, 0.8001, 0.05), 2):
+            escalate = (fast_conf < min_conf) | (fast_margin < min_margin)
+            cascade_pred = np.where(escalate, full_pred, fast_pred)
+            acc = float((cascade_pred == truth).mean())
+            rate = float(escalate.mean())
+            row = {
+                "min_confidence": float(min_conf),
+                "min_margin": float(min_margin),
+                "escalation_rate": round(rate, 4),
+                "accuracy": round(acc, 4),
+                "agreement_with_full": round(float((cascade_pred == full_pred).mean()), 4),
+                "expected_latency_ms": round(fast_ms + rate * full_ms, 2),
+            }
+            grid.append(row)
+            if acc >= full_acc - args.max_accuracy_drop:
+                if best is None or (rate, -acc) < (best["escalation_rate"], -best["accuracy"]):
+                    best = row
+
+    if best is None:
+        # Nothing met the accuracy budget - always escalate
+        best = max(grid, key=lambda r: (r["accuracy"], -r["escalation_rate"]))
+
+    calibration = {
+        **best,
+        "fast_model_version": fast_version,
+        "full_model_version": full_version,
+        "fast_accuracy": round(fast_acc, 4),
+        "full_accuracy": round(full_acc, 4),
+        "fast_latency_ms": round(fast_ms, 2),
+        "full_latency_ms": round(full_ms, 2),
+        "max_accuracy_drop": args.max_accuracy_drop,
+        "samples": len(samples),
+    }
+    Path(args.out).parent.mkdir(parents=True, exist_ok=True)
+    with open(args.out, "w", encoding="utf-8") as f:
+        json.dump(calibration, f, indent=2)
+
+    print("\n" + "=" * 70)
+    print("📊 CALIBRATION RESULT")
+    print("=" * 70)
+    print(f"   Full model alone:   accuracy {full_acc:.4f}, {full_ms:.1f} ms/image")
+    print(f"   Fast model alone:   accuracy {fast_acc:.4f}, {fast_ms:.1f} ms/image")
+    print(f"   Chosen thresholds:  min_confidence={best['min_confidence']}, min_margin={best['min_margin']}")
+    print(f"   Cascade:            accuracy {best['accuracy']:.4f}, escalation rate {best['escalation_rate']:.1%}, "
+          f"~{best['expected_latency_ms']:.1f} ms/image")
+    print(f"\n✅ Wrote {args.out} (restart the server to apply)")
+
+
+if __name__ == "__main__":
+    main()
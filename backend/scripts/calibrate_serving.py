@@ -0,0 +1,328 @@
+#!/usr/bin/env python3
+"""
+Measure the best serving configuration for this host and cache it.
+
+Microbenchmarks the base ViT with every available backend (torch fp32, bf16,
+int8 dynamic quantization, and ONNX Runtime if installed) at several intra-op
+thread counts and batch sizes. It then picks the backend, torch threads and
+gunicorn worker count with the highest estimated requests/second that fits in
+memory and keeps top-1 agreement with fp32.
+
+Results are cached per host fingerprint (CPU model/flags, usable cores,
+memory limit, torch version), so only the first boot on a new box pays for
+the benchmark. Point --cache-dir (SERVING_CALIBRATION_DIR) at persistent
+storage on platforms whose container filesystem is reset on every boot.
+The run stops measuring once --budget-s is spent and picks the best of what
+it measured (batch 1 configurations are measured first).
+
+Usage:
+    python3 backend/scripts/calibrate_serving.py              # print the chosen configuration
+    python3 backend/scripts/calibrate_serving.py --emit-env   # shell exports for the entrypoint
+    python3 backend/scripts/calibrate_serving.py --force      # ignore the cache
+
+With SERVING_CALIBRATION=on the entrypoints run:
+    eval "$(python3 scripts/calibrate_serving.py --emit-env)"
+"""
+import argparse
+import copy
+import hashlib
+import json
+import os
+import platform
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+from archive_dataset import MODELS_DIR, BACKEND_DIR
+
+CACHE_DIR = MODELS_DIR / "serving_calibration"
+# Backends the server can actually run (VIT_PRECISION values)
+SERVABLE = {"torch-fp32": "fp32", "torch-bf16": "bf16", "torch-int8": "int8"}
+
+
+def usable_cpus() -> int:
+    """Cores this process may use: affinity mask and cgroup CPU quota."""
+    try:
+        cpus = len(os.sched_getaffinity(0))
+    except AttributeError:
+        cpus = os.cpu_count() or 1
+    try:
+        quota, period = Path("/sys/fs/cgroup/cpu.max").read_text().split()[:2]
+        if quota != "max":
+            cpus = min(cpus, max(1, int(int(quota) / int(period))))
+    except (OSError, ValueError):
+        pass
+    return max(1, cpus)
+
+
+def memory_limit_bytes() -> int:
+    """Smaller of physical memory and the cgroup memory limit (0 if unknown)."""
+    limit = 0
+    try:
+        limit = os.sysconf("SC_PAGE_SIZE") * os.sysconf("SC_PHYS_PAGES")
+    except (ValueError, OSError, AttributeError):
+        pass
+    for path in ("/sys/fs/cgroup/memory.max", "/sys/fs/cgroup/memory/memory.limit_in_bytes"):
+        try:
+            value = Path(path).read_text().strip()
+            if value != "max" and int(value) < (limit or float("inf")):
+                limit = int(value)
+        except (OSError, ValueError):
+            pass
+    return limit
+
+
+def host_fingerprint() -> dict:
+    import torch
+    from app.hardware import cpu_flags
+
+    model_name = platform.processor() or platform.machine()
+    try:
+        with open("/proc/cpuinfo", "r", encoding="utf-8") as f:
+            for line in f:
+                if line.startswith("model name"):
+                    model_name = line.split(":", 1)[1].strip()
+                    break
+    except OSError:
+        pass
+    relevant_flags = sorted(f for f in cpu_flags() if f.startswith(("avx", "amx", "fma", "sse4", "vnni")))
+    info = {
+        "cpu": model_name,
+        "cpus": usable_cpus(),
+        "memory_gb": round(memory_limit_bytes() / 1e9, 1),
+        "flags": relevant_flags,
+        "torch": torch.__version__,
+    }
+    info["id"] = hashlib.sha256(json.dumps(info, sort_keys=True).encode()).hexdigest()[:16]
+    return info
+
+
+def thread_candidates(cpus: int):
+    counts, n = [], 1
+    while n < cpus:
+        counts.append(n)
+        n *= 2
+    counts.append(cpus)
+    return sorted(set(counts))
+
+
+def build_backends(model_dict):
+    """{name: (forward(pixel_values) -> logits, param_bytes, set_threads)}"""
+    import torch
+    from app.hardware import supports_bf16, supports_int8
+
+    def torch_backend(model, dtype=torch.float32):
+        def forward(pixel_values):
+            with torch.inference_mode():
+                return model(pixel_values=pixel_values.to(dtype)).logits.float()
+        nbytes = sum(p.numel() * p.element_size() for p in model.parameters())
+        return forward, nbytes, torch.set_num_threads
+
+    fp32 = model_dict["model"].eval()
+    backends = {"torch-fp32": torch_backend(fp32)}
+    if supports_bf16():
+        backends["torch-bf16"] = torch_backend(copy.deepcopy(fp32).to(torch.bfloat16), torch.bfloat16)
+    else:
+        print("ℹ️  No AVX512-BF16/AMX - skipping bf16")
+    if supports_int8():
+        int8 = torch.ao.quantization.quantize_dynamic(copy.deepcopy(fp32), {torch.nn.Linear}, dtype=torch.qint8)
+        forward, _, set_threads = torch_backend(int8)
+        # Quantized weights are not parameters; ~1/4 of the fp32 Linear weights
+        backends["torch-int8"] = (forward, backends["torch-fp32"][1] // 4, set_threads)
+
+    try:
+        import onnxruntime as ort
+    except ImportError:
+        print("ℹ️  onnxruntime not installed - skipping ONNX (pip install onnxruntime)")
+    else:
+        onnx_path = os.path.join(tempfile.mkdtemp(), "vit.onnx")
+        torch.onnx.export(
+            fp32, (torch.zeros(1, 3, 224, 224),), onnx_path,
+            input_names=["pixel_values"], output_names=["logits"],
+            dynamic_axes={"pixel_values": {0: "batch"}, "logits": {0: "batch"}},
+        )
+        state = {"session": None}
+
+        def set_threads(n):
+            opts = ort.SessionOptions()
+            opts.intra_op_num_threads = n
+            state["session"] = ort.InferenceSession(onnx_path, opts, providers=["CPUExecutionProvider"])
+
+        def forward(pixel_values):
+            out = state["session"].run(None, {"pixel_values": pixel_values.numpy()})[0]
+            return torch.from_numpy(out)
+
+        backends["onnx"] = (forward, os.path.getsize(onnx_path), set_threads)
+    return backends
+
+
+def agreement(forward, reference_preds, inputs):
+    preds = forward(inputs).argmax(-1)
+    return float((preds == reference_preds).float().mean())
+
+
+def benchmark(forward, inputs, runs):
+    forward(inputs)  # warm up
+    started = time.perf_counter()
+    for _ in range(runs):
+        forward(inputs)
+    return (time.perf_counter() - started) / runs * 1000.0
+
+
+def sample_inputs(processor, count):
+    """
+    (pixel_values, real) - up to `count` real face images for the agreement
+    check, or `count` noise images when there are none.
+    """
+    import torch
+    from PIL import Image
+
+    paths = sorted((BACKEND_DIR / "test_faces").glob("*.jp*g"))[:count]
+    images = [Image.open(p).convert("RGB") for p in paths]
+    if images:
+        return processor(images, return_tensors="pt")["pixel_values"], len(images)
+    return torch.randn(count, 3, 224, 224), 0
+
+
+def calibrate(args, fingerprint):
+    import torch
+    from app.model_loader import load_emotion_model
+
+    deadline = time.monotonic() + args.budget_s
+
+    model_dict, _, version, model_type = load_emotion_model(force_model="base", precision="fp32")
+    if model_type != "vit":
+        raise RuntimeError(f"Serving calibration needs the ViT model, got {model_type}")
+
+    cpus = fingerprint["cpus"]
+    validation, real_samples = sample_inputs(model_dict["processor"], args.samples)
+    if real_samples < args.samples:
+        print(f"⚠️  Backend agreement is checked on {real_samples} real face image(s) from test_faces/ "
+              f"(asked for {args.samples}){'; using noise instead' if not real_samples else ''}")
+    backends = build_backends(model_dict)
+    torch.set_num_threads(cpus)
+    reference = backends["torch-fp32"][0](validation).argmax(-1)
+    agreements = {}
+    for name, (forward, _, set_threads) in backends.items():
+        set_threads(cpus)
+        agreements[name] = agreement(forward, reference, validation)
+
+    # Batch 1 (what /detect serves) first, so a run cut short by the budget still has a pick
+    rows, partial = [], False
+    for batch in sorted(args.batch_sizes, key=lambda b: (b != 1, b)):
+        for name, (forward, nbytes, set_threads) in backends.items():
+            for threads in thread_candidates(cpus):
+                if time.monotonic() > deadline:
+                    partial = True
+                    break
+                set_threads(threads)
+                inputs = validation[:1].repeat(batch, 1, 1, 1)
+                ms = benchmark(forward, inputs, args.runs)
+                agree = agreements[name]
+                rows.append({
+                    "backend": name,
+                    "threads": threads,
+                    "batch": batch,
+                    "latency_ms": round(ms, 2),
+                    "images_per_s": round(batch * 1000.0 / ms, 2),
+                    "agreement_with_fp32": round(agree, 4),
+                    "model_mb": round(nbytes / 1e6, 1),
+                })
+                print(f"   {name:<11} threads={threads:<3} batch={batch:<3} {ms:8.1f} ms  "
+                      f"{rows[-1]['images_per_s']:7.1f} img/s  agreement={agree:.3f}")
+    if partial:
+        print(f"⚠️  Time budget ({args.budget_s:.0f}s) spent - picking from the {len(rows)} configurations measured "
+              f"(run with --force and a larger --budget-s to complete)")
+
+    # /detect is one image per request: score batch-1 latency, scaled by how many
+    # workers fit on the cores (threads each) and in memory (base + fine-tuned per worker)
+    memory = memory_limit_bytes()
+    best = None
+    for row in rows:
+        if row["batch"] != 1 or row["backend"] not in SERVABLE:
+            continue
+        if row["agreement_with_fp32"] < args.min_agreement:
+            continue
+        workers = max(1, cpus // row["threads"])
+        if memory:
+            per_worker = row["model_mb"] * 1e6 * args.models_per_worker + args.worker_overhead_mb * 1e6
+            workers = max(1, min(workers, int(memory * 0.8 // per_worker)))
+        workers = min(workers, args.max_workers)
+        rps = workers * 1000.0 / row["latency_ms"]
+        candidate = {**row, "workers": workers, "estimated_rps": round(rps, 2)}
+        if best is None or (rps, -row["latency_ms"]) > (best["estimated_rps"], -best["latency_ms"]):
+            best = candidate
+    if best is None:
+        raise RuntimeError("No servable configuration was measured within the time budget")
+
+    return {
+        "fingerprint": fingerprint,
+        "model_version": version,
+        "calibrated_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        "best": best,
+        "partial": partial,
+        "agreement_samples": real_samples,
+        "results": rows,
+        "env": {
+            "GUNICORN_WORKERS": best["workers"],
+            "TORCH_NUM_THREADS": best["threads"],
+            "OMP_NUM_THREADS": best["threads"],
+            "VIT_PRECISION": SERVABLE[best["backend"]],
+        },
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark inference backends and pick the serving configuration")
+    parser.add_argument("--emit-env", action="store_true", help="Print shell exports only (progress goes to stderr)")
+    parser.add_argument("--force", action="store_true", help="Re-run even if this host is already calibrated")
+    parser.add_argument("--cache-dir", default=os.environ.get("SERVING_CALIBRATION_DIR", str(CACHE_DIR)))
+    parser.add_argument("--batch-sizes", type=int, nargs="+", default=[1, 8])
+    parser.add_argument("--runs", type=int, default=10)
+    parser.add_argument("--samples", type=int, default=16, help="Face images for the backend agreement check")
+    parser.add_argument("--budget-s", type=float, default=float(os.environ.get("SERVING_CALIBRATION_BUDGET_S", "90")),
+                        help="Stop benchmarking after this many seconds (model loading included)")
+    parser.add_argument("--min-agreement", type=float, default=0.98,
+                        help="Reject backends whose top-1 agreement with fp32 is below this")
+    parser.add_argument("--models-per-worker", type=int, default=2, help="ViT models each worker holds")
+    parser.add_argument("--worker-overhead-mb", type=float, default=300.0)
+    parser.add_argument("--max-workers", type=int, default=8)
+    args = parser.parse_args()
+
+    stdout = sys.stdout
+    if args.emit_env:
+        sys.stdout = sys.stderr  # keep model-loading chatter out of the eval'd output
+
+    fingerprint = host_fingerprint()
+    cache_path = Path(args.cache_dir) / f"{fingerprint['id']}.json"
+    if cache_path.exists() and not args.force:
+        with cache_path.open("r", encoding="utf-8") as f:
+            result = json.load(f)
+        print(f"✅ Using cached calibration for this host: {cache_path}")
+    else:
+        print("=" * 70)
+        print(f"⏱️  SERVING CALIBRATION: {fingerprint['cpu']} | {fingerprint['cpus']} cores | "
+              f"{fingerprint['memory_gb']} GB")
+        print("=" * 70)
+        result = calibrate(args, fingerprint)
+        cache_path.parent.mkdir(parents=True, exist_ok=True)
+        with cache_path.open("w", encoding="utf-8") as f:
+            json.dump(result, f, indent=2)
+        print(f"\n✅ Wrote {cache_path}")
+
+    best = result["best"]
+    print(f"   Best: {best['backend']} | {best['threads']} torch threads x {best['workers']} workers | "
+          f"{best['latency_ms']} ms/request | ~{best['estimated_rps']} req/s")
+
+    sys.stdout = stdout
+    if args.emit_env:
+        # Explicitly set environment variables win over the calibrated values
+        for key, value in result["env"].items():
+            print(f'export {key}="${{{key}:-{value}}}"')
+    else:
+        print(json.dumps(result["env"], indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,249 @@
+#!/usr/bin/env python3
+"""
+Distill the ViT teacher into a small CNN student on the FER images in archive/.
+
+The student is trained on CPU against the teacher's temperature-softened
+probabilities (plus the folder label as a hard target) and exported to
+backend/models/student/, where load_emotion_model(force_model='fast') picks it up.
+
+Usage:
+    python3 backend/scripts/distill_student.py --epochs 15
+    python3 backend/scripts/distill_student.py --input-size 112 --teacher fine-tuned
+    python3 backend/scripts/distill_student.py --max-per-class 500 --epochs 3   # quick run
+
+Outputs (in --out):
+    student.pt, student_config.json   exported student
+    teacher_logits_<teacher>.npz      cached teacher outputs (reused on re-runs)
+    distill_report.json               accuracy / teacher agreement / CPU latency
+"""
+import argparse
+import json
+import random
+import time
+from pathlib import Path
+
+from archive_dataset import MODELS_DIR, ARCHIVE_DIR, list_archive_samples, split_samples, label_index
+
+import numpy as np
+import torch
+import torch.nn.functional as F
+from PIL import Image
+
+
+def load_teacher(which: str):
+    from app.model_loader import load_emotion_model
+
+    model_dict, labels, version, model_type = load_emotion_model(force_model=which)
+    if model_type != "vit":
+        raise RuntimeError(f"Teacher must be a ViT model, got {model_type}")
+    model_dict["model"].eval()
+    return model_dict, labels, version
+
+
+def teacher_logits(model_dict, paths, batch_size=64):
+    """Raw teacher logits for every image (no happy-boost post-processing)."""
+    processor, model = model_dict["processor"], model_dict["model"]
+    out = []
+    started = time.perf_counter()
+    for i in range(0, len(paths), batch_size):
+        images = [Image.open(p).convert("RGB") for p in paths[i:i + batch_size]]
+        inputs = processor(images, return_tensors="pt")
+        with torch.inference_mode():
+            out.append(model(**inputs).logits.float().numpy())
+        done = min(i + batch_size, len(paths))
+        if (i // batch_size) % 20 == 0:
+            rate = done / max(time.perf_counter() - started, 1e-6)
+            print(f"   teacher: {done}/{len(paths)} images ({rate:.1f} img/s)")
+    return np.concatenate(out, axis=0)
+
+
+def cached_teacher_logits(model_dict, samples, cache_path: Path, batch_size: int):
+    paths = [p for p, _ in samples]
+    if cache_path.exists():
+        cached = np.load(cache_path, allow_pickle=False)
+        if list(cached["paths"]) == paths:
+            print(f"✅ Reusing cached teacher logits: {cache_path}")
+            return cached["logits"]
+    print(f"🧑‍🏫 Computing teacher logits for {len(paths)} images (cached to {cache_path})...")
+    logits = teacher_logits(model_dict, paths, batch_size=batch_size)
+    np.savez_compressed(cache_path, paths=np.array(paths), logits=logits)
+    return logits
+
+
+def load_gray(paths, input_size):
+    arr = np.zeros((len(paths), 1, input_size, input_size), dtype=np.float32)
+    for i, p in enumerate(paths):
+        img = Image.open(p).convert("L")
+        if img.size != (input_size, input_size):
+            img = img.resize((input_size, input_size), Image.Resampling.BILINEAR)
+        arr[i, 0] = np.asarray(img, dtype=np.float32) / 255.0
+    return (arr - 0.5) / 0.5
+
+
+def augment(batch: torch.Tensor) -> torch.Tensor:
+    """Random horizontal flip plus a small random translation."""
+    flip = torch.rand(batch.shape[0]) < 0.5
+    batch = batch.clone()
+    batch[flip] = batch[flip].flip(-1)
+    shift = max(1, batch.shape[-1] // 16)
+    dx, dy = random.randint(-shift, shift), random.randint(-shift, shift)
+    return torch.roll(batch, shifts=(dy, dx), dims=(-2, -1))
+
+
+def distillation_loss(student_logits, teacher_logits, hard_labels, temperature, alpha):
+    soft = F.kl_div(
+        F.log_softmax(student_logits / temperature, dim=-1),
+        F.softmax(teacher_logits / temperature, dim=-1),
+        reduction="batchmean",
+    ) * (temperature ** 2)
+    hard = F.cross_entropy(student_logits, hard_labels)
+    return alpha * soft + (1 - alpha) * hard
+
+
+def measure_latency(fn, n=50, warmup=5):
+    for _ in range(warmup):
+        fn()
+    started = time.perf_counter()
+    for _ in range(n):
+        fn()
+    return (time.perf_counter() - started) / n * 1000.0
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Distill the ViT into a small CNN student")
+    parser.add_argument("--archive", default=str(ARCHIVE_DIR), help="Folder with one sub-folder per emotion")
+    parser.add_argument("--teacher", default="base", choices=["base", "fine-tuned"], help="Teacher model")
+    parser.add_argument("--input-size", type=int, default=48, choices=[48, 112], help="Student input size")
+    parser.add_argument("--width", type=int, default=32, help="Student base channel width")
+    parser.add_argument("--epochs", type=int, default=15)
+    parser.add_argument("--batch-size", type=int, default=128)
+    parser.add_argument("--lr", type=float, default=2e-3)
+    parser.add_argument("--temperature", type=float, default=4.0, help="Distillation temperature")
+    parser.add_argument("--alpha", type=float, default=0.7, help="Weight of the soft (teacher) loss")
+    parser.add_argument("--val-fraction", type=float, default=0.1)
+    parser.add_argument("--max-per-class", type=int, default=None, help="Subsample for quick runs")
+    parser.add_argument("--teacher-batch-size", type=int, default=64)
+    parser.add_argument("--threads", type=int, default=None, help="torch intra-op threads")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--out", default=str(MODELS_DIR / "student"))
+    args = parser.parse_args()
+
+    from app.student_model import EmotionStudentCNN, save_student, images_to_tensor
+
+    if args.threads:
+        torch.set_num_threads(args.threads)
+    torch.manual_seed(args.seed)
+    random.seed(args.seed)
+    out_dir = Path(args.out)
+    out_dir.mkdir(parents=True, exist_ok=True)
+
+    print("=" * 70)
+    print("⚗️  STUDENT DISTILLATION")
+    print("=" * 70)
+
+    teacher, labels, teacher_version = load_teacher(args.teacher)
+    to_index = label_index(labels)
+    samples = [(p, e) for p, e in list_archive_samples(Path(args.archive), args.max_per_class, args.seed) if e in to_index]
+    if not samples:
+        print(f"❌ No usable images in {args.archive} (labels: {labels})")
+        return
+    print(f"📊 {len(samples)} images, teacher={teacher_version}, labels={labels}")
+
+    logits_all = cached_teacher_logits(
+        teacher, samples, out_dir / f"teacher_logits_{args.teacher}.npz", args.teacher_batch_size
+    )
+    index_of = {p: i for i, (p, _) in enumerate(samples)}
+    train, val = split_samples(samples, args.val_fraction, args.seed)
+
+    def tensors(subset):
+        paths = [p for p, _ in subset]
+        x = torch.from_numpy(load_gray(paths, args.input_size))
+        t = torch.from_numpy(logits_all[[index_of[p] for p in paths]])
+        y = torch.tensor([to_index[e] for _, e in subset], dtype=torch.long)
+        return x, t, y
+
+    print("📁 Loading images...")
+    x_train, t_train, y_train = tensors(train)
+    x_val, t_val, y_val = tensors(val)
+    print(f"   Train: {len(train)}  Val: {len(val)}")
+
+    student = EmotionStudentCNN(num_classes=len(labels), width=args.width)
+    n_params = sum(p.numel() for p in student.parameters())
+    optimizer = torch.optim.AdamW(student.parameters(), lr=args.lr, weight_decay=1e-4)
+    steps_per_epoch = max(1, (len(train) + args.batch_size - 1) // args.batch_size)
+    scheduler = torch.optim.lr_scheduler.OneCycleLR(optimizer, max_lr=args.lr, total_steps=args.epochs * steps_per_epoch)
+
+    def evaluate():
+        student.eval()
+        with torch.inference_mode():
+            preds = torch.cat([student(x_val[i:i + 512]) for i in range(0, len(x_val), 512)]).argmax(-1)
+        student.train()
+        return (preds == y_val).float().mean().item(), (preds == t_val.argmax(-1)).float().mean().item()
+
+    print(f"\n🚀 Training student ({n_params:,} params) for {args.epochs} epochs...")
+    best = (-1.0, None)
+    for epoch in range(1, args.epochs + 1):
+        student.train()
+        perm = torch.randperm(len(x_train))
+        total_loss = 0.0
+        started = time.perf_counter()
+        for i in range(0, len(perm), args.batch_size):
+            idx = perm[i:i + args.batch_size]
+            loss = distillation_loss(student(augment(x_train[idx])), t_train[idx], y_train[idx], args.temperature, args.alpha)
+            optimizer.zero_grad()
+            loss.backward()
+            optimizer.step()
+            scheduler.step()
+            total_loss += loss.item() * len(idx)
+        acc, agree = evaluate()
+        print(f"   epoch {epoch}/{args.epochs}: loss={total_loss / len(perm):.4f} "
+              f"val_acc={acc:.4f} teacher_agreement={agree:.4f} ({time.perf_counter() - started:.0f}s)")
+        if agree > best[0]:
+            best = (agree, {k: v.clone() for k, v in student.state_dict().items()})
+
+    student.load_state_dict(best[1])
+    student.eval()
+    student_acc, agreement = evaluate()
+    teacher_acc = (t_val.argmax(-1) == y_val).float().mean().item()
+
+    # Per-image CPU latency (batch of 1), student vs teacher
+    sample_img = Image.open(val[0][0] if val else train[0][0]).convert("RGB")
+    with torch.inference_mode():
+        student_ms = measure_latency(lambda: student(images_to_tensor([sample_img], args.input_size)))
+        teacher_inputs = teacher["processor"](sample_img, return_tensors="pt")
+        teacher_ms = measure_latency(lambda: teacher["model"](**teacher_inputs), n=10, warmup=2)
+
+    version = f"student-cnn-{args.input_size}px"
+    report = {
+        "version": version,
+        "teacher": teacher_version,
+        "input_size": args.input_size,
+        "student_params": n_params,
+        "train_images": len(train),
+        "val_images": len(val),
+        "student_accuracy": round(student_acc, 4),
+        "teacher_accuracy": round(teacher_acc, 4),
+        "teacher_agreement": round(agreement, 4),
+        "student_latency_ms": round(student_ms, 3),
+        "teacher_latency_ms": round(teacher_ms, 3),
+        "speedup": round(teacher_ms / max(student_ms, 1e-6), 1),
+        "torch_threads": torch.get_num_threads(),
+    }
+    save_student(student, str(out_dir), labels, args.input_size, args.width, extra={"version": version, "report": report})
+    with (out_dir / "distill_report.json").open("w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+
+    print("\n" + "=" * 70)
+    print("📊 DISTILLATION REPORT")
+    print("=" * 70)
+    print(f"   Student accuracy (val):   {student_acc:.4f}")
+    print(f"   Teacher accuracy (val):   {teacher_acc:.4f}")
+    print(f"   Agreement with teacher:   {agreement:.4f}")
+    print(f"   CPU latency per image:    student {student_ms:.2f} ms vs teacher {teacher_ms:.2f} ms "
+          f"({report['speedup']}x faster)")
+    print(f"\n✅ Student exported to {out_dir}")
+    print("   Use it with /detect?model=fast")
+
+
+if __name__ == "__main__":
+    main()
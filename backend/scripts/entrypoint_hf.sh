@@ -69,11 +69,46 @@ elif [ -z "$ASRIPA_MODEL_ID" ]; then
   echo "ℹ️  ASRIPA_MODEL_ID not set - skipping Asripa model download"
 fi
 
+# Serving configuration (workers, torch threads, precision) measured for this host.
+# Opt-in (SERVING_CALIBRATION=on): the first boot on a new host benchmarks for up to
+# SERVING_CALIBRATION_BUDGET_S seconds (default 90) before gunicorn starts, so point
+# SERVING_CALIBRATION_DIR at a persistent disk or every cold boot pays for it again.
+# Explicitly set GUNICORN_WORKERS / TORCH_NUM_THREADS / VIT_PRECISION always win.
+# Defaults without calibration: 1 worker, 1 thread (8 threads with admission control on).
+if [ "${SERVING_CALIBRATION:-off}" = "on" ]; then
+  # Spaces persistent storage (when enabled) is mounted at /data
+  if [ -z "${SERVING_CALIBRATION_DIR:-}" ] && [ -d /data ] && [ -w /data ]; then
+    export SERVING_CALIBRATION_DIR=/data/serving_calibration
+  fi
+  echo "⏱️  Loading serving calibration..."
+  if CALIBRATION_ENV="$(python3 /app/scripts/calibrate_serving.py --emit-env)"; then
+    eval "$CALIBRATION_ENV"
+  else
+    echo "⚠️  Serving calibration failed - using defaults"
+  fi
+fi
+WORKERS="${GUNICORN_WORKERS:-1}"
+THREADS="${GUNICORN_THREADS:-1}"
+# Admission control (ADMISSION_SLO_MS, on unless 0) only sees requests waiting inside the app.
+# With a single gthread the backlog sits in gunicorn's accept queue and nothing is ever
+# rejected, so run enough threads that requests wait on the inference executors instead.
+ADMISSION_THREADS="${ADMISSION_GUNICORN_THREADS:-8}"
+case "${ADMISSION_SLO_MS:-10000}" in
+  0|0.0) ;;
+  *)
+    if [ "$THREADS" -lt "$ADMISSION_THREADS" ]; then
+      echo "ℹ️  Admission control is on - raising gunicorn threads from ${THREADS} to ${ADMISSION_THREADS}"
+      THREADS="$ADMISSION_THREADS"
+    fi
+    ;;
+esac
+echo "Serving with ${WORKERS} worker(s) x ${THREADS} thread(s), TORCH_NUM_THREADS=${TORCH_NUM_THREADS:-default}, VIT_PRECISION=${VIT_PRECISION:-fp32}"
+
 # Hugging Face Spaces uses port 7860 by default
 # But we'll use PORT env var if set, otherwise default to 7860
 PORT="${PORT:-7860}"
 echo "Starting gunicorn on 0.0.0.0:${PORT}"
 # Suppress protobuf warnings
 export PROTOCOL_BUFFERS_PYTHON_IMPLEMENTATION=python
-exec gunicorn main:app --bind 0.0.0.0:"${PORT}" --workers 1 --threads 1 --timeout 120 --worker-class gthread
+exec gunicorn main:app --bind 0.0.0.0:"${PORT}" --workers "${WORKERS}" --threads "${THREADS}" --timeout 120 --worker-class gthread
 
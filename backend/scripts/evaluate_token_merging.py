@@ -0,0 +1,142 @@
+#!/usr/bin/env python3
+"""
+Chart accuracy vs latency of ViT token merging on archive/.
+
+For every merge ratio the script measures accuracy against the folder labels,
+agreement with the unmerged model and mean per-image CPU latency (batch of 1).
+Results go to a JSON/CSV table and, if matplotlib is installed, a PNG chart.
+
+Usage:
+    python3 backend/scripts/evaluate_token_merging.py
+    python3 backend/scripts/evaluate_token_merging.py --model fine-tuned --ratios 0 0.1 0.2 0.3
+"""
+import argparse
+import csv
+import json
+import time
+from pathlib import Path
+
+from archive_dataset import MODELS_DIR, ARCHIVE_DIR, list_archive_samples
+
+import numpy as np
+import torch
+from PIL import Image
+
+
+def predict_all(model_dict, images, ratio, batch_size):
+    from app.token_merging import token_merging
+
+    processor, model = model_dict["processor"], model_dict["model"]
+    preds = []
+    with torch.inference_mode(), token_merging(ratio):
+        for i in range(0, len(images), batch_size):
+            inputs = processor(images[i:i + batch_size], return_tensors="pt")
+            preds.append(model(**inputs).logits.argmax(-1).numpy())
+    return np.concatenate(preds)
+
+
+def latency_ms(model_dict, image, ratio, runs):
+    from app.token_merging import token_merging
+
+    inputs = model_dict["processor"](image, return_tensors="pt")
+    model = model_dict["model"]
+    with torch.inference_mode(), token_merging(ratio):
+        model(**inputs)  # warm up
+        started = time.perf_counter()
+        for _ in range(runs):
+            model(**inputs)
+    return (time.perf_counter() - started) / runs * 1000.0
+
+
+def plot(rows, out_path: Path, title: str):
+    try:
+        import matplotlib
+        matplotlib.use("Agg")
+        import matplotlib.pyplot as plt
+    except ImportError:
+        print("ℹ️  matplotlib not installed - skipping chart (pip install matplotlib)")
+        return None
+
+    fig, ax = plt.subplots(figsize=(7, 4.5))
+    xs = [r["latency_ms"] for r in rows]
+    ys = [r["accuracy"] for r in rows]
+    ax.plot(xs, ys, marker="o")
+    for r in rows:
+        ax.annotate(f"r={r['ratio']}", (r["latency_ms"], r["accuracy"]), textcoords="offset points", xytext=(5, 5))
+    ax.set_xlabel("CPU latency per image (ms)")
+    ax.set_ylabel("Accuracy on archive/")
+    ax.set_title(title)
+    ax.grid(True, alpha=0.3)
+    fig.tight_layout()
+    fig.savefig(out_path, dpi=120)
+    plt.close(fig)
+    return out_path
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Evaluate ViT token merging ratios on archive/")
+    parser.add_argument("--archive", default=str(ARCHIVE_DIR))
+    parser.add_argument("--model", default="base", choices=["base", "fine-tuned"])
+    parser.add_argument("--ratios", type=float, nargs="+", default=[0.0, 0.05, 0.1, 0.15, 0.2, 0.25, 0.3])
+    parser.add_argument("--max-per-class", type=int, default=200)
+    parser.add_argument("--batch-size", type=int, default=32)
+    parser.add_argument("--latency-runs", type=int, default=20)
+    parser.add_argument("--out-dir", default=str(MODELS_DIR / "token_merging_eval"))
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    from app.model_loader import load_emotion_model
+    from app.token_merging import enable_token_merging
+
+    model_dict, labels, version, model_type = load_emotion_model(force_model=args.model)
+    if model_type != "vit":
+        print(f"❌ Token merging needs a ViT model, got {model_type}")
+        return
+    enable_token_merging(model_dict["model"])
+
+    samples = [(p, e) for p, e in list_archive_samples(Path(args.archive), args.max_per_class, args.seed) if e in labels]
+    images = [Image.open(p).convert("RGB") for p, _ in samples]
+    truth = np.array([labels.index(e) for _, e in samples])
+    print(f"📊 {len(samples)} images | model={version}")
+
+    rows = []
+    reference = None
+    for ratio in sorted(set(args.ratios)):
+        preds = predict_all(model_dict, images, ratio, args.batch_size)
+        if reference is None:
+            reference = preds
+        ms = latency_ms(model_dict, images[0], ratio, args.latency_runs)
+        row = {
+            "ratio": ratio,
+            "accuracy": round(float((preds == truth).mean()), 4),
+            "agreement_with_unmerged": round(float((preds == reference).mean()), 4),
+            "latency_ms": round(ms, 2),
+        }
+        rows.append(row)
+        print(f"   ratio={ratio:<5} accuracy={row['accuracy']:.4f} "
+              f"agreement={row['agreement_with_unmerged']:.4f} latency={row['latency_ms']:.1f} ms")
+
+    base_ms = next((r["latency_ms"] for r in rows if r["ratio"] == 0.0), rows[0]["latency_ms"])
+    for r in rows:
+        r["speedup"] = round(base_ms / max(r["latency_ms"], 1e-6), 2)
+
+    out_dir = Path(args.out_dir)
+    out_dir.mkdir(parents=True, exist_ok=True)
+    with (out_dir / f"tome_{args.model}.json").open("w", encoding="utf-8") as f:
+        json.dump({"model_version": version, "samples": len(samples), "results": rows}, f, indent=2)
+    with (out_dir / f"tome_{args.model}.csv").open("w", newline="", encoding="utf-8") as f:
+        writer = csv.DictWriter(f, fieldnames=list(rows[0].keys()))
+        writer.writeheader()
+        writer.writerows(rows)
+    chart = plot(rows, out_dir / f"tome_{args.model}.png", f"Token merging: {version}")
+
+    print("\n" + "=" * 70)
+    print(f"{'ratio':<8}{'accuracy':<12}{'agreement':<12}{'latency ms':<12}{'speedup':<8}")
+    for r in rows:
+        print(f"{r['ratio']:<8}{r['accuracy']:<12}{r['agreement_with_unmerged']:<12}{r['latency_ms']:<12}{r['speedup']:<8}")
+    print(f"\n✅ Results written to {out_dir}" + (f" (chart: {chart.name})" if chart else ""))
+    print("   Apply a ratio with /detect?merge_ratio=<r> or TOKEN_MERGE_RATIO_BASE / TOKEN_MERGE_RATIO_FINETUNED")
+
+
+if __name__ == "__main__":
+    main()
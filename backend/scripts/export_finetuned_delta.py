@@ -0,0 +1,118 @@
+#!/usr/bin/env python3
+"""
+Export the fine-tuned ViT (models/fine_tuned_vit) as a delta over the base model.
+
+Writes model_delta.safetensors + delta_config.json next to the fine-tuned
+checkpoint. When they exist the server builds the fine-tuned variant on top of
+the already loaded base model, sharing every unchanged tensor, so both models
+together take close to the memory of one.
+
+A full fine-tune changes every weight, so exact deltas save little; --rank
+stores each changed 2D weight as a low-rank adapter instead. The script checks
+the reconstructed model against the full checkpoint on archive/ images.
+
+Usage:
+    python3 backend/scripts/export_finetuned_delta.py                 # exact delta
+    python3 backend/scripts/export_finetuned_delta.py --rank 64       # low-rank adapter
+"""
+import argparse
+import json
+from pathlib import Path
+
+from archive_dataset import MODELS_DIR, ARCHIVE_DIR, list_archive_samples
+
+import torch
+from PIL import Image
+
+
+def state_nbytes(state):
+    return sum(t.numel() * t.element_size() for t in state.values())
+
+
+def compare_outputs(processor, reference, candidate, images, batch_size=16):
+    """Top-1 agreement and max |logit diff| between two models."""
+    agree, total, max_diff = 0, 0, 0.0
+    with torch.inference_mode():
+        for i in range(0, len(images), batch_size):
+            inputs = processor(images[i:i + batch_size], return_tensors="pt")
+            ref = reference(**inputs).logits
+            cand = candidate(**inputs).logits
+            agree += int((ref.argmax(-1) == cand.argmax(-1)).sum())
+            total += ref.shape[0]
+            max_diff = max(max_diff, float((ref - cand).abs().max()))
+    return agree / max(total, 1), max_diff
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Store the fine-tuned ViT as a delta over the base model")
+    parser.add_argument("--fine-tuned-dir", default=str(MODELS_DIR / "fine_tuned_vit"))
+    parser.add_argument("--rank", type=int, default=None, help="Low-rank adapter rank for 2D weights (default: exact delta)")
+    parser.add_argument("--atol", type=float, default=0.0, help="Treat tensors changed by at most this much as shared")
+    parser.add_argument("--archive", default=str(ARCHIVE_DIR))
+    parser.add_argument("--max-per-class", type=int, default=25, help="Validation images per class")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    from transformers import AutoImageProcessor, AutoModelForImageClassification
+    from app.model_loader import load_emotion_model
+    from app.model_delta import compute_delta, save_delta, build_delta_variant, DELTA_WEIGHTS
+
+    fine_tuned_dir = Path(args.fine_tuned_dir)
+    if not (fine_tuned_dir / "model.safetensors").exists():
+        print(f"❌ Full fine-tuned checkpoint not found: {fine_tuned_dir / 'model.safetensors'}")
+        return
+
+    print("=" * 70)
+    print("🧩 EXPORT FINE-TUNED DELTA")
+    print("=" * 70)
+    base_dict, _, base_version, base_type = load_emotion_model(force_model="base")
+    if base_type != "vit":
+        print(f"❌ Base model must be a ViT, got {base_type}")
+        return
+    base = base_dict["model"]
+    tuned = AutoModelForImageClassification.from_pretrained(str(fine_tuned_dir), local_files_only=True).eval()
+    processor = AutoImageProcessor.from_pretrained(str(fine_tuned_dir), local_files_only=True)
+
+    tensors, summary = compute_delta(base.state_dict(), tuned.state_dict(), rank=args.rank, atol=args.atol)
+    counts = {kind: sum(1 for v in summary.values() if v == kind) for kind in ("shared", "full", "lora")}
+    full_bytes = state_nbytes(tuned.state_dict())
+    delta_bytes = state_nbytes(tensors)
+
+    save_delta(str(fine_tuned_dir), tensors, {
+        "base_model_id": "HardlyHumans/Facial-expression-detection",
+        "base_model_version": base_version,
+        "rank": args.rank,
+        "atol": args.atol,
+        "tensors": counts,
+        "full_bytes": full_bytes,
+        "delta_bytes": delta_bytes,
+    })
+
+    variant = build_delta_variant(base, str(fine_tuned_dir), config=tuned.config)
+    samples = list_archive_samples(Path(args.archive), args.max_per_class, args.seed) if Path(args.archive).exists() else []
+    images = [Image.open(p).convert("RGB") for p, _ in samples]
+    if images:
+        agreement, max_diff = compare_outputs(processor, tuned, variant, images)
+    else:
+        agreement, max_diff = None, None
+
+    print(f"\n📊 Tensors: {counts['shared']} shared, {counts['full']} full, {counts['lora']} low-rank")
+    print(f"   Full checkpoint: {full_bytes / 1e6:.1f} MB -> delta: {delta_bytes / 1e6:.1f} MB "
+          f"({delta_bytes / max(full_bytes, 1):.1%})")
+    if agreement is not None:
+        print(f"   Agreement with full fine-tuned model on {len(images)} images: {agreement:.2%} "
+              f"(max |logit diff| {max_diff:.4f})")
+        with (fine_tuned_dir / "delta_config.json").open("r+", encoding="utf-8") as f:
+            meta = json.load(f)
+            meta.update({"validation_images": len(images), "agreement": round(agreement, 4),
+                         "max_logit_diff": round(max_diff, 6)})
+            f.seek(0)
+            json.dump(meta, f, indent=2)
+            f.truncate()
+    print(f"\n✅ Wrote {fine_tuned_dir / DELTA_WEIGHTS}")
+    print("   The server now builds the fine-tuned model from the base + delta "
+          "(delete the delta files to go back to the full checkpoint)")
+
+
+if __name__ == "__main__":
+    main()
@@ -255,6 +255,8 @@ def fine_tune_model(epochs=5, batch_size=32, learning_rate=2e-5):
     print(f"   Model saved to: {output_dir}")
     print(f"\n📝 To use the fine-tuned model:")
     print(f"   Update model_loader.py to load from: {output_dir}")
+    print(f"\n💡 To share memory with the base model, export a delta:")
+    print(f"   python3 backend/scripts/export_finetuned_delta.py --rank 64")
     
     return True
 
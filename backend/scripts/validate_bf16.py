@@ -0,0 +1,138 @@
+#!/usr/bin/env python3
+"""
+Validate bfloat16 ViT inference against fp32 on archive/.
+
+Reports, per precision mode:
+  - accuracy against the folder labels and top-1 agreement with fp32
+  - mean per-image CPU latency (batch of 1) and batched throughput
+  - parameter memory
+
+Modes: fp32, bf16-autocast (fp32 weights, bf16 matmuls) and bf16 (weights cast,
+what VIT_PRECISION=bf16 serves). Results go to models/bf16_report.json.
+
+Usage:
+    python3 backend/scripts/validate_bf16.py
+    python3 backend/scripts/validate_bf16.py --model fine-tuned --max-per-class 300
+"""
+import argparse
+import copy
+import json
+import time
+from contextlib import nullcontext
+from pathlib import Path
+
+from archive_dataset import MODELS_DIR, ARCHIVE_DIR, list_archive_samples
+
+import numpy as np
+import torch
+from PIL import Image
+
+
+def param_bytes(model):
+    return sum(p.numel() * p.element_size() for p in model.parameters())
+
+
+def run_mode(model, processor, images, autocast, batch_size, latency_runs):
+    dtype = next(model.parameters()).dtype
+    ctx = (lambda: torch.autocast("cpu", dtype=torch.bfloat16)) if autocast else nullcontext
+
+    def forward(batch):
+        inputs = processor(batch, return_tensors="pt")
+        pixel_values = inputs["pixel_values"].to(dtype)
+        with torch.inference_mode(), ctx():
+            return model(pixel_values=pixel_values).logits.float()
+
+    preds = []
+    started = time.perf_counter()
+    for i in range(0, len(images), batch_size):
+        preds.append(forward(images[i:i + batch_size]).argmax(-1).numpy())
+    throughput = len(images) / max(time.perf_counter() - started, 1e-9)
+
+    forward(images[:1])  # warm up
+    started = time.perf_counter()
+    for _ in range(latency_runs):
+        forward(images[:1])
+    latency_ms = (time.perf_counter() - started) / latency_runs * 1000.0
+    return np.concatenate(preds), latency_ms, throughput
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare bf16 and fp32 ViT inference on archive/")
+    parser.add_argument("--archive", default=str(ARCHIVE_DIR))
+    parser.add_argument("--model", default="base", choices=["base", "fine-tuned"])
+    parser.add_argument("--max-per-class", type=int, default=100)
+    parser.add_argument("--batch-size", type=int, default=16)
+    parser.add_argument("--latency-runs", type=int, default=20)
+    parser.add_argument("--out", default=str(MODELS_DIR / "bf16_report.json"))
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    from app.hardware import supports_bf16
+    from app.model_loader import load_emotion_model
+
+    if not supports_bf16():
+        print("⚠️  This CPU has no AVX512-BF16/AMX: bf16 will be emulated and is expected to be slower.")
+        print("   The server falls back to fp32 here; numbers below are for reference only.")
+
+    model_dict, labels, version, model_type = load_emotion_model(force_model=args.model, precision="fp32")
+    if model_type != "vit":
+        print(f"❌ bf16 validation needs a ViT model, got {model_type}")
+        return
+    processor, fp32_model = model_dict["processor"], model_dict["model"].eval()
+    bf16_model = copy.deepcopy(fp32_model).to(torch.bfloat16)
+
+    samples = [(p, e) for p, e in list_archive_samples(Path(args.archive), args.max_per_class, args.seed) if e in labels]
+    images = [Image.open(p).convert("RGB") for p, _ in samples]
+    truth = np.array([labels.index(e) for _, e in samples])
+    print(f"📊 {len(samples)} images | model={version} | threads={torch.get_num_threads()}")
+
+    modes = [
+        ("fp32", fp32_model, False),
+        ("bf16-autocast", fp32_model, True),
+        ("bf16", bf16_model, False),
+    ]
+    rows = []
+    reference = None
+    for name, model, autocast in modes:
+        preds, latency_ms, throughput = run_mode(model, processor, images, autocast, args.batch_size, args.latency_runs)
+        if reference is None:
+            reference = preds
+        row = {
+            "mode": name,
+            "accuracy": round(float((preds == truth).mean()), 4),
+            "agreement_with_fp32": round(float((preds == reference).mean()), 4),
+            "latency_ms": round(latency_ms, 2),
+            "throughput_img_s": round(throughput, 1),
+            "param_mb": round(param_bytes(model) / 1e6, 1),
+        }
+        rows.append(row)
+        print(f"   {name:<14} accuracy={row['accuracy']:.4f} agreement={row['agreement_with_fp32']:.4f} "
+              f"latency={row['latency_ms']:.1f} ms throughput={row['throughput_img_s']:.1f} img/s "
+              f"params={row['param_mb']:.0f} MB")
+
+    fp32 = rows[0]
+    for r in rows:
+        r["accuracy_delta"] = round(r["accuracy"] - fp32["accuracy"], 4)
+        r["speedup"] = round(fp32["latency_ms"] / max(r["latency_ms"], 1e-6), 2)
+
+    report = {
+        "model_version": version,
+        "samples": len(samples),
+        "cpu_bf16_native": supports_bf16(),
+        "torch_threads": torch.get_num_threads(),
+        "results": rows,
+    }
+    Path(args.out).parent.mkdir(parents=True, exist_ok=True)
+    with open(args.out, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+
+    print("\n" + "=" * 70)
+    print(f"{'mode':<16}{'acc Δ':<10}{'agreement':<12}{'speedup':<10}{'params MB':<10}")
+    for r in rows:
+        print(f"{r['mode']:<16}{r['accuracy_delta']:<+10.4f}{r['agreement_with_fp32']:<12}{r['speedup']:<10}{r['param_mb']:<10}")
+    print(f"\n✅ Wrote {args.out}")
+    print("   Serve bf16 with VIT_PRECISION=bf16")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,74 @@
+import pytest
+
+from app import admission
+from app.admission import AdmissionController
+
+
+class _Clock:
+    def __init__(self):
+        self.now = 100.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_admits_everything_until_service_time_is_known():
+    controller = AdmissionController(slo_ms=10, concurrency=1)
+    tickets = [controller.try_admit()[0] for _ in range(5)]
+    assert all(tickets)
+    assert controller.stats()["in_flight"] == 5
+
+
+def test_idle_server_admits_even_when_one_request_exceeds_the_slo():
+    controller = AdmissionController(slo_ms=100, concurrency=1)
+    controller.service_ms = 500.0
+    ticket, retry_after = controller.try_admit()
+    assert ticket is not None and retry_after == 0
+
+
+def test_rejects_when_predicted_latency_exceeds_the_slo():
+    controller = AdmissionController(slo_ms=1000, concurrency=2, max_retry_after=60)
+    controller.service_ms = 400.0
+    # predicted = 400 * (1 + in_flight / 2): 400, 600, 800, 1000 admitted; 1200 rejected
+    assert all(controller.try_admit()[0] for _ in range(4))
+    ticket, retry_after = controller.try_admit()
+    assert ticket is None and retry_after == 1
+
+    controller.service_ms = 40_000.0
+    assert controller.try_admit() == (None, 60)  # capped at max_retry_after
+    stats = controller.stats()
+    assert (stats["admitted"], stats["rejected"], stats["queue_depth"]) == (4, 2, 2)
+
+
+def test_zero_slo_disables_rejection():
+    controller = AdmissionController(slo_ms=0)
+    controller.service_ms = 10_000.0
+    assert all(controller.try_admit()[0] for _ in range(10))
+
+
+def test_release_learns_service_time_net_of_queueing(monkeypatch):
+    clock = _Clock()
+    monkeypatch.setattr(admission.time, "perf_counter", clock)
+    controller = AdmissionController(slo_ms=1000, concurrency=1, alpha=0.5)
+
+    first, _ = controller.try_admit()
+    second, _ = controller.try_admit()  # admitted behind one request
+    clock.now += 0.1
+    controller.release(first)
+    assert controller.service_ms == pytest.approx(100.0)
+
+    clock.now += 0.1
+    controller.release(second)  # 200 ms measured, half of it spent waiting
+    assert controller.service_ms == pytest.approx(100.0)
+    assert controller.stats()["in_flight"] == 0
+
+
+def test_unsampled_release_frees_the_slot_without_touching_the_estimate(monkeypatch):
+    clock = _Clock()
+    monkeypatch.setattr(admission.time, "perf_counter", clock)
+    controller = AdmissionController(slo_ms=1000, concurrency=1)
+
+    hit, _ = controller.try_admit()
+    clock.now += 0.001
+    controller.release(hit, reached_model=False)  # e.g. a cache hit
+    assert controller.service_ms is None and controller.stats()["in_flight"] == 0
@@ -1,4 +1,5 @@
 import pytest
+import io
 import os
 from pathlib import Path
 from PIL import Image
@@ -37,3 +38,62 @@ def test_detect(client):
     json_data = res.get_json()
     assert "emotion" in json_data or "error" in json_data
 
+
+
+def test_admin_reload_requires_token(client):
+    res = client.post("/admin/reload?model=fine-tuned")
+    # Disabled (no ADMIN_TOKEN configured) or rejected (wrong token)
+    assert res.status_code in (401, 403)
+
+    data = client.get("/health").get_json()
+    assert "base" in data["models"]
+    assert "last_reload_seconds" in data["models"]["base"]
+
+
+@pytest.mark.parametrize("segment", ["1e-9", "0", "nan", "inf"])
+def test_video_rejects_degenerate_segments(client, segment):
+    res = client.post(f"/detect/video?segment={segment}", data={}, content_type="multipart/form-data")
+    assert res.status_code == 400
+
+
+@pytest.fixture
+def batch_client(tmp_path, monkeypatch):
+    """App with a stub base model: files named noface_* have no face, sad_* are classified unsure."""
+    import app as app_module
+    from app.model_registry import ModelHandle
+
+    monkeypatch.setattr(app_module, "DB_PATH", str(tmp_path / "predictions.db"))
+    monkeypatch.setattr("app.vit_utils.preprocess_face_for_vit",
+                        lambda path, **_: (None if "noface_" in path else os.path.basename(path), None))
+
+    def predict_faces(model, model_type, faces, labels, merge_ratio=0.0):
+        return [("sad", 0.1, {"sad": 0.1}) if "sad_" in face else ("happy", 0.9, {"happy": 0.9}) for face in faces]
+
+    monkeypatch.setattr("app.inference.predict_faces", predict_faces)
+    app = app_module.create_app({
+        "TESTING": True, "TMP_DIR": str(tmp_path / "tmp"), "IMAGES_DIR": str(tmp_path / "images"), "MIN_CONFIDENCE": 0.5,
+    })
+    app.config["MODEL_SLOTS"]["base"].swap(ModelHandle("stub", ["happy", "sad"], "base+test", "vit"))
+    return app.test_client()
+
+
+def test_detect_batch_reports_errors_per_item(batch_client, tmp_path):
+    create_dummy_image(tmp_path / "face.jpg")
+    image = (tmp_path / "face.jpg").read_bytes()
+    res = batch_client.post("/detect/batch", data={"images": [
+        (io.BytesIO(image), "ok.jpg"),
+        (io.BytesIO(b"not an image"), "notes.txt"),
+        (io.BytesIO(b""), "empty.jpg"),
+        (io.BytesIO(image), "noface_1.jpg"),
+        (io.BytesIO(image), "sad_1.jpg"),
+    ]}, content_type="multipart/form-data")
+
+    assert res.status_code == 200, res.data
+    data = res.get_json()
+    assert (data["count"], data["succeeded"], data["failed"]) == (5, 1, 4)
+    ok, bad_type, empty, no_face, unsure = data["results"]
+    assert ok["emotion"] == "happy" and ok["index"] == 0
+    assert bad_type["status"] == 400 and "Unsupported file type" in bad_type["error"]
+    assert empty["status"] == 400 and empty["error"] == "File is empty"
+    assert no_face["status"] == 400 and no_face["error"] == "No face detected in image"
+    assert unsure["status"] == 422 and unsure["error"] == "low confidence"
@@ -0,0 +1,87 @@
+import asyncio
+import time
+
+import pytest
+
+pytest.importorskip("starlette")
+
+from flask import Flask, Response, request
+
+from app.asgi import create_asgi_app
+
+
+def _flask_app():
+    app = Flask(__name__)
+    app.config.update(MAX_CONTENT_LENGTH=16384, BATCH_MAX_IMAGES=1, JOBS_MAX_UPLOAD_SIZE=16384)
+
+    @app.route("/echo", methods=["POST"])
+    def echo():
+        data = request.get_data()
+        return {"size": len(data), "checksum": sum(data) % 65521}
+
+    @app.route("/stream")
+    def stream():
+        def rows():
+            for i in range(3):
+                yield f'{{"row": {i}}}\n'
+                time.sleep(0.05)
+        return Response(rows(), mimetype="application/x-ndjson")
+
+    return app
+
+
+def _call(app, scope, body=b"", headers=()):
+    sent, received = [], []
+
+    async def receive():
+        if received:
+            await asyncio.Event().wait()  # the client stays connected
+        received.append(True)
+        return {"type": "http.request", "body": body, "more_body": False}
+
+    async def send(message):
+        sent.append(message)
+
+    headers = list(headers) + ([(b"content-length", str(len(body)).encode())] if body else [])
+    asyncio.run(app({"type": "http", "headers": headers, **scope}, receive, send))
+    return sent
+
+
+def test_streamed_response_is_sent_chunk_by_chunk():
+    app = create_asgi_app({}, flask_app=_flask_app())
+    sent = _call(app, {"method": "GET", "path": "/stream"})
+
+    assert sent[0]["type"] == "http.response.start" and sent[0]["status"] == 200
+    bodies = [m for m in sent[1:] if m["body"]]
+    assert [m["body"] for m in bodies] == [b'{"row": %d}\n' % i for i in range(3)]
+    assert all(m["more_body"] for m in bodies)
+    assert sent[-1] == {"type": "http.response.body", "body": b"", "more_body": False}
+
+
+@pytest.mark.parametrize("size", [100, 5000])
+def test_request_body_reaches_the_view_in_memory_or_spooled(size):
+    app = create_asgi_app({"ASGI_BODY_SPOOL_BYTES": 1024}, flask_app=_flask_app())
+    body = bytes(range(256)) * (size // 256) + b"x" * (size % 256)
+    sent = _call(app, {"method": "POST", "path": "/echo"}, body)
+
+    assert sent[0]["status"] == 200
+    payload = b"".join(m.get("body", b"") for m in sent[1:])
+    assert payload == b'{"checksum":%d,"size":%d}\n' % (sum(body) % 65521, size)
+
+
+def test_oversized_body_is_rejected():
+    app = create_asgi_app({}, flask_app=_flask_app())
+    sent = _call(app, {"method": "POST", "path": "/echo"}, b"x" * (3 * 1024 * 1024))
+    assert sent[0]["status"] == 413
+
+
+@pytest.mark.parametrize("origins, expected", [("*", b"*"), ("http://a.test,http://b.test", b"http://b.test")])
+def test_native_images_route_sends_cors_headers(tmp_path, origins, expected):
+    (tmp_path / "face.jpg").write_bytes(b"jpeg")
+    flask_app = _flask_app()
+    flask_app.config["IMAGES_DIR"] = str(tmp_path)
+    app = create_asgi_app({"CORS_ORIGINS": origins}, flask_app=flask_app)
+    sent = _call(app, {"method": "GET", "path": "/images/face.jpg"}, headers=[(b"origin", b"http://b.test")])
+
+    assert sent[0]["status"] == 200
+    assert dict(sent[0]["headers"])[b"access-control-allow-origin"] == expected
@@ -0,0 +1,69 @@
+import json
+
+import pytest
+
+from app import inference
+from app.inference import CascadeStats, cascade_predict, load_cascade_thresholds, top_margin
+
+FAST = ("fast-model", "student", ["happy", "sad"])
+FULL = ("full-model", "vit", ["happy", "sad"])
+
+
+@pytest.fixture
+def calls(monkeypatch):
+    """predict_face stand-in: the fast tier is 60/40 unsure, the full tier is confident."""
+    calls = []
+    probs = {"fast-model": {"happy": 0.6, "sad": 0.4}, "full-model": {"happy": 0.05, "sad": 0.95}}
+
+    def predict_face(model, model_type, face, labels, merge_ratio=0.0, precision=None, tta=False):
+        calls.append((model, merge_ratio, precision, tta))
+        p = probs[model]
+        emotion = max(p, key=p.get)
+        return emotion, p[emotion], dict(p)
+
+    monkeypatch.setattr(inference, "predict_face", predict_face)
+    return calls
+
+
+def test_confident_fast_tier_answers_alone(calls):
+    stats = CascadeStats(full_latency_ms=50.0)
+    result = cascade_predict(FAST, FULL, "face", min_confidence=0.55, min_margin=0.1, stats=stats)
+
+    assert (result["tier"], result["escalated"], result["emotion"]) == ("fast", False, "happy")
+    assert result["fast_margin"] == pytest.approx(0.2)
+    assert [c[0] for c in calls] == ["fast-model"]
+    snapshot = stats.snapshot()
+    assert snapshot["escalations"] == 0 and snapshot["latency_saved_ms"] > 0
+
+
+@pytest.mark.parametrize("min_confidence, min_margin", [(0.7, 0.1), (0.5, 0.3)])
+def test_low_confidence_or_margin_escalates_to_the_full_tier(calls, min_confidence, min_margin):
+    stats = CascadeStats()
+    result = cascade_predict(FAST, FULL, "face", min_confidence, min_margin, stats=stats, merge_ratio=0.25,
+                             precision="bf16", tta=True)
+
+    assert (result["tier"], result["escalated"], result["emotion"]) == ("full", True, "sad")
+    assert result["fast_confidence"] == 0.6 and set(result["latency_ms"]) == {"fast", "full"}
+    # token merging only on the full tier; the profile's precision/tta on both
+    assert calls == [("fast-model", 0.0, "bf16", True), ("full-model", 0.25, "bf16", True)]
+    assert stats.snapshot()["escalation_rate"] == 1.0
+
+
+def test_thresholds_are_inclusive(calls):
+    result = cascade_predict(FAST, FULL, "face", min_confidence=0.6, min_margin=0.6 - 0.4)
+    assert result["tier"] == "fast"
+
+
+def test_top_margin():
+    assert top_margin({"a": 0.7, "b": 0.2, "c": 0.1}) == pytest.approx(0.5)
+    assert top_margin({"a": 0.9}) == 0.9
+    assert top_margin({}) == 0.0
+
+
+def test_calibrated_thresholds_override_the_defaults(tmp_path):
+    assert load_cascade_thresholds(str(tmp_path / "missing.json"), 0.8, 0.2)["source"] == "defaults"
+
+    path = tmp_path / "cascade.json"
+    path.write_text(json.dumps({"min_confidence": 0.65, "min_margin": 0.15, "full_latency_ms": 40}))
+    thresholds = load_cascade_thresholds(str(path), 0.8, 0.2)
+    assert (thresholds["min_confidence"], thresholds["min_margin"], thresholds["full_latency_ms"]) == (0.65, 0.15, 40.0)
@@ -0,0 +1,93 @@
+import sqlite3
+
+import pytest
+
+from app.db_logger import MIGRATIONS, init_db, tail_rows
+from app.validators import validate_date_range
+
+# predictions as created before any migration existed
+BASELINE_SCHEMA = """
+CREATE TABLE predictions (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    ts TEXT NOT NULL,
+    filename TEXT,
+    image_path TEXT,
+    emotion TEXT,
+    confidence REAL
+);
+CREATE INDEX idx_predictions_ts ON predictions(ts DESC);
+CREATE INDEX idx_predictions_emotion ON predictions(emotion);
+"""
+
+
+def _connect(path):
+    return sqlite3.connect(path)
+
+
+def _columns(conn):
+    return [row[1] for row in conn.execute("PRAGMA table_info(predictions)")]
+
+
+def _indexes(conn):
+    return {row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type = 'index'")}
+
+
+@pytest.fixture
+def baseline_db(tmp_path):
+    path = str(tmp_path / "old.db")
+    conn = _connect(path)
+    conn.executescript(BASELINE_SCHEMA)
+    conn.executemany("INSERT INTO predictions (ts, filename, image_path, emotion, confidence) VALUES (?, ?, ?, ?, ?)", [
+        ("2024-01-31T23:59:59.500000+00:00", "a.jpg", "", "happy", 0.9),
+        ("2024-02-01T00:00:00+00:00", "b.jpg", "stored_b.jpg", "sad", 0.4),
+    ])
+    conn.commit()
+    conn.close()
+    return path
+
+
+def test_init_db_is_idempotent(tmp_path):
+    path = str(tmp_path / "new.db")
+    init_db(path)
+    init_db(path)
+
+    conn = _connect(path)
+    try:
+        assert conn.execute("PRAGMA user_version").fetchone()[0] == len(MIGRATIONS)
+        assert _columns(conn).count("ts_epoch") == 1
+    finally:
+        conn.close()
+
+
+def test_baseline_database_is_upgraded_in_place(baseline_db):
+    init_db(baseline_db)
+
+    conn = _connect(baseline_db)
+    try:
+        assert conn.execute("PRAGMA user_version").fetchone()[0] == len(MIGRATIONS)
+        assert {"image_path", "correlation_id", "ts_epoch"} <= set(_columns(conn))
+        indexes = _indexes(conn)
+        assert {"idx_predictions_emotion_id", "idx_predictions_ts_epoch_id"} <= indexes
+        assert not {"idx_predictions_ts", "idx_predictions_emotion"} & indexes
+        rows = conn.execute("SELECT filename, image_path, ts_epoch FROM predictions ORDER BY id").fetchall()
+    finally:
+        conn.close()
+
+    # ts_epoch is backfilled from the ISO strings (fraction and offset included); "" becomes NULL
+    assert rows == [("a.jpg", None, 1706745599), ("b.jpg", "stored_b.jpg", 1706745600)]
+
+
+def test_date_filters_use_the_backfilled_epoch(baseline_db):
+    init_db(baseline_db)
+
+    epoch_from, epoch_to, error = validate_date_range("2024-01-31", "2024-01-31")
+    assert error is None and epoch_to - epoch_from == 24 * 3600 - 1
+    assert [row[2] for row in tail_rows(baseline_db, date_from=epoch_from, date_to=epoch_to)] == ["a.jpg"]
+
+    epoch_from, _, _ = validate_date_range("2024-02-01T00:00:00", None)
+    assert [row[2] for row in tail_rows(baseline_db, date_from=epoch_from)] == ["b.jpg"]
+
+
+@pytest.mark.parametrize("date_from, date_to", [("yesterday", None), ("2024-02-02", "2024-02-01")])
+def test_invalid_date_ranges_are_rejected(date_from, date_to):
+    assert validate_date_range(date_from, date_to)[2]
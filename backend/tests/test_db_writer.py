@@ -0,0 +1,89 @@
+import sqlite3
+import time
+
+import pytest
+
+from app import db_logger
+from app.db_logger import PredictionLogWriter, init_db
+
+
+@pytest.fixture
+def db_path(tmp_path):
+    path = str(tmp_path / "predictions.db")
+    init_db(path)
+    return path
+
+
+def _rows(db_path):
+    conn = sqlite3.connect(db_path)
+    try:
+        return conn.execute("SELECT filename, emotion, image_path, correlation_id FROM predictions ORDER BY id").fetchall()
+    finally:
+        conn.close()
+
+
+def _wait_for(predicate, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not predicate():
+        if time.monotonic() > deadline:
+            return False
+        time.sleep(0.01)
+    return True
+
+
+def test_full_batches_are_written_without_waiting_for_the_timer(db_path):
+    writer = PredictionLogWriter(db_path, batch_rows=4, flush_ms=60_000)
+    for i in range(8):
+        writer.submit(f"{i}.jpg", "happy", 0.9)
+
+    assert _wait_for(lambda: writer.stats()["written"] == 8)
+    stats = writer.stats()
+    assert (stats["batches"], stats["avg_batch_rows"]) == (2, 4.0)
+    writer.close()
+
+
+def test_partial_batch_is_written_after_flush_ms(db_path):
+    writer = PredictionLogWriter(db_path, batch_rows=100, flush_ms=20)
+    for i in range(3):
+        writer.submit(f"{i}.jpg", "sad", 0.5)
+
+    assert _wait_for(lambda: writer.stats()["written"] == 3)
+    assert writer.stats()["batches"] == 1
+    writer.close()
+
+
+def test_close_writes_everything_queued(db_path):
+    writer = PredictionLogWriter(db_path, batch_rows=100, flush_ms=60_000)
+    ids = [writer.submit(f"{i}.jpg", "neutral", 0.4, image_path=f"img_{i}.jpg" if i % 2 else None)
+           for i in range(5)]
+    writer.close()
+
+    rows = _rows(db_path)
+    assert [r[3] for r in rows] == ids
+    assert [r[2] for r in rows] == [None, "img_1.jpg", None, "img_3.jpg", None]
+    assert writer.stats()["queue_depth"] == 0
+
+
+def test_failed_batch_is_retried_then_dropped_and_the_writer_keeps_going(db_path, monkeypatch):
+    real_insert = db_logger._insert_predictions
+    failures = {"left": 3}
+
+    def flaky_insert(path, params):
+        if failures["left"]:
+            failures["left"] -= 1
+            raise sqlite3.OperationalError("database is locked")
+        return real_insert(path, params)
+
+    monkeypatch.setattr(db_logger, "_insert_predictions", flaky_insert)
+    writer = PredictionLogWriter(db_path, batch_rows=100, flush_ms=60_000, retries=1)
+
+    writer.submit("lost.jpg", "angry", 0.7)
+    assert writer.flush()  # two attempts, both fail: the batch is dropped
+    assert writer.stats()["failed_rows"] == 1
+
+    writer.submit("kept.jpg", "happy", 0.8)
+    assert writer.flush()  # one failure, then the retry succeeds
+    stats = writer.stats()
+    assert (stats["written"], stats["failed_rows"]) == (1, 1)
+    assert [r[0] for r in _rows(db_path)] == ["kept.jpg"]
+    writer.close()
@@ -0,0 +1,41 @@
+import pytest
+
+from app import hardware
+from app.hardware import resolve_precision
+
+
+@pytest.fixture
+def host(monkeypatch):
+    def set_support(bf16=False, int8=False):
+        monkeypatch.setattr(hardware, "supports_bf16", lambda: bf16)
+        monkeypatch.setattr(hardware, "supports_int8", lambda: int8)
+
+    return set_support
+
+
+@pytest.mark.parametrize("requested", ["fp32", "", None, "FP32"])
+def test_fp32_is_always_available(host, requested):
+    host()
+    assert resolve_precision(requested) == ("fp32", "ok")
+
+
+def test_supported_precisions_are_kept(host):
+    host(bf16=True, int8=True)
+    assert resolve_precision("bf16") == ("bf16", "ok")
+    assert resolve_precision("INT8") == ("int8", "ok")
+
+
+@pytest.mark.parametrize("requested, reason", [
+    ("bf16", "AVX512-BF16"), ("int8", "quantized engine"), ("fp16", "unknown precision"),
+])
+def test_unsupported_or_unknown_precisions_fall_back_to_fp32(host, requested, reason):
+    host()
+    precision, why = resolve_precision(requested)
+    assert precision == "fp32" and reason in why
+
+
+def test_cpu_flags_decide_bf16_support(monkeypatch):
+    monkeypatch.setattr(hardware, "cpu_flags", lambda: {"avx2", "avx512f"})
+    assert hardware.supports_bf16() is False
+    monkeypatch.setattr(hardware, "cpu_flags", lambda: {"avx512f", "amx_bf16"})
+    assert hardware.supports_bf16() is True
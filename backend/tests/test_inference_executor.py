@@ -0,0 +1,97 @@
+import threading
+
+import pytest
+
+from app.inference_executor import FairQueue, InferenceExecutor, inference_priority
+
+
+def _drain(queue, count=None):
+    out = []
+    while len(queue) and (count is None or len(out) < count):
+        out.append(queue.pop())
+    return out
+
+
+def test_fair_queue_shares_by_weight_and_keeps_fifo_within_a_flow():
+    queue = FairQueue()
+    for i in range(8):
+        queue.push("a", i, weight=3.0)
+    for i in range(8):
+        queue.push("b", i, weight=1.0)
+
+    first = _drain(queue, 8)
+    assert [flow for flow, _ in first] == ["a", "a", "a", "b", "a", "a", "a", "b"]
+    assert [item for flow, item in first if flow == "a"] == list(range(6))
+
+
+def test_fair_queue_new_flow_does_not_get_a_burst():
+    queue = FairQueue()
+    for i in range(10):
+        queue.push("a", i)
+    _drain(queue, 4)
+    for i in range(3):
+        queue.push("b", i)
+
+    # b starts from the current virtual time, not from zero, so it alternates with a
+    assert [flow for flow, _ in _drain(queue, 4)] == ["a", "b", "a", "b"]
+
+
+@pytest.fixture
+def blocked_executor():
+    """One-worker executor whose worker is held until release is set."""
+    executor = InferenceExecutor("test", workers=1)
+    started, release = threading.Event(), threading.Event()
+    blocker = executor.submit(lambda: (started.set(), release.wait(5)))
+    assert started.wait(5)
+    yield executor, release
+    release.set()
+    blocker.result(5)
+    executor.shutdown()
+
+
+def test_interactive_lane_overtakes_queued_batch_work(blocked_executor):
+    executor, release = blocked_executor
+    order = []
+    futures = []
+    with inference_priority("batch", "client"):
+        futures += [executor.submit(order.append, f"batch-{i}") for i in range(4)]
+    with inference_priority("interactive", "client"):
+        futures.append(executor.submit(order.append, "interactive"))
+    assert executor.queued("batch") == 4 and executor.queued() == 5
+
+    release.set()
+    for future in futures:
+        future.result(5)
+    assert order[0] == "interactive"
+    assert [o for o in order if o.startswith("batch")] == [f"batch-{i}" for i in range(4)]
+    assert executor.stats()["lanes"]["batch"]["submitted"] == 4
+
+
+def test_clients_share_a_lane_fairly(blocked_executor):
+    executor, release = blocked_executor
+    order = []
+    futures = []
+    with inference_priority("batch", "heavy"):
+        futures += [executor.submit(order.append, f"heavy-{i}") for i in range(4)]
+    with inference_priority("batch", "light"):
+        futures.append(executor.submit(order.append, "light"))
+
+    release.set()
+    for future in futures:
+        future.result(5)
+    assert order[:2] == ["heavy-0", "light"]
+
+
+def test_nested_submit_runs_inline_and_errors_reach_the_caller():
+    executor = InferenceExecutor("nested", workers=1)
+    try:
+        assert executor.run(lambda: executor.run(lambda: 42)) == 42
+
+        def fail():
+            raise ValueError("bad input")
+
+        with pytest.raises(ValueError):
+            executor.run(fail)
+        assert executor.stats()["failed"] == 1
+    finally:
+        executor.shutdown()
@@ -0,0 +1,117 @@
+import shutil
+import socket
+import tempfile
+import threading
+
+import numpy as np
+import pytest
+from PIL import Image
+
+from app.inference_router import (
+    InferenceRouter, RouterTimeout, decode_crops, encode_crops, recv_message, send_message, split_cores,
+)
+
+
+def test_messages_round_trip_over_a_socket():
+    a, b = socket.socketpair()
+    try:
+        send_message(a, {"op": "predict", "shapes": [[2, 2, 3]]}, b"\x00\x01" * 6)
+        send_message(a, {"op": "info"})
+        assert recv_message(b) == ({"op": "predict", "shapes": [[2, 2, 3]]}, b"\x00\x01" * 6)
+        assert recv_message(b) == ({"op": "info"}, b"")
+        a.close()
+        with pytest.raises(ConnectionError):
+            recv_message(b)
+    finally:
+        b.close()
+
+
+def test_crops_survive_encoding_and_grayscale_is_sent_as_rgb():
+    rng = np.random.default_rng(0)
+    rgb = Image.fromarray(rng.integers(0, 256, (4, 5, 3), dtype=np.uint8), "RGB")
+    gray = Image.fromarray(rng.integers(0, 256, (3, 3), dtype=np.uint8), "L")
+
+    shapes, payload = encode_crops([rgb, gray])
+    assert shapes == [[4, 5, 3], [3, 3, 3]] and len(payload) == 4 * 5 * 3 + 3 * 3 * 3
+    decoded = decode_crops(shapes, payload)
+    assert np.array_equal(np.asarray(decoded[0]), np.asarray(rgb))
+    assert np.array_equal(np.asarray(decoded[1]), np.asarray(gray.convert("RGB")))
+
+
+def test_split_cores():
+    assert split_cores(2, [3, 0, 1, 2]) == [[0, 1], [2, 3]]
+    assert split_cores(3, [0, 1, 2, 3]) == [[0], [1], [2]]
+    # more workers than cores: groups repeat instead of coming out empty
+    assert split_cores(3, [0, 1]) == [[0], [1], [0]]
+
+
+class _FakeWorker(threading.Thread):
+    """Unix-socket server answering each request with `behaviour`: "ok", "drop" or "hang"."""
+
+    def __init__(self, path, behaviour):
+        super().__init__(daemon=True)
+        self.behaviour = behaviour
+        self.requests = 0
+        self.server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.server.bind(path)
+        self.server.listen()
+        self.start()
+
+    def run(self):
+        while True:
+            try:
+                conn, _ = self.server.accept()
+            except OSError:
+                return
+            threading.Thread(target=self._serve, args=(conn,), daemon=True).start()
+
+    def _serve(self, conn):
+        with conn:
+            while True:
+                try:
+                    header, _ = recv_message(conn)
+                except (OSError, ValueError):
+                    return
+                self.requests += 1
+                if self.behaviour == "drop":
+                    return
+                if self.behaviour == "hang":
+                    conn.recv(1)  # until the client gives up
+                    return
+                send_message(conn, {"ok": True, "echo": header})
+
+
+@pytest.fixture
+def router_with():
+    socket_dir = tempfile.mkdtemp(prefix="rt")  # short path: AF_UNIX paths are limited to ~100 bytes
+    fakes = []
+
+    def build(*behaviours):
+        router = InferenceRouter(len(behaviours), socket_dir, spawn=False, timeout=0.5)
+        for worker, behaviour in zip(router._workers, behaviours):
+            fakes.append(_FakeWorker(worker.socket_path, behaviour))
+            worker.healthy = True
+        return router, fakes
+
+    yield build
+    for fake in fakes:
+        fake.server.close()
+    shutil.rmtree(socket_dir, ignore_errors=True)
+
+
+def test_broken_worker_is_marked_unhealthy_and_the_request_retried(router_with):
+    router, (broken, good) = router_with("drop", "ok")
+
+    assert router.call({"op": "predict", "n": 1})["echo"] == {"op": "predict", "n": 1}
+    assert (broken.requests, good.requests) == (1, 1)
+    assert router.retries == 1 and not router._workers[0].healthy and router._workers[0].failures == 1
+
+
+def test_timeout_is_not_retried_and_leaves_the_worker_healthy(router_with):
+    router, (slow, other) = router_with("hang", "ok")
+
+    with pytest.raises(RouterTimeout):
+        router.call({"op": "predict"}, timeout=0.2)
+    assert (slow.requests, other.requests) == (1, 0)
+    worker = router._workers[0]
+    assert worker.healthy and worker.timeouts == 1 and worker.in_flight == 0 and router.retries == 0
@@ -0,0 +1,139 @@
+import io
+import json
+import sqlite3
+import struct
+import zipfile
+from types import SimpleNamespace
+
+import pytest
+
+from app import jobs
+from app.db_logger import claim_next_job, create_job, get_job_done_indices, init_db, log_job_results
+from app.jobs import JobRunner
+
+
+@pytest.fixture
+def db_path(tmp_path):
+    path = str(tmp_path / "jobs.db")
+    init_db(path)
+    return path
+
+
+def _age_heartbeat(db_path, job_id, seconds):
+    conn = sqlite3.connect(db_path)
+    with conn:
+        conn.execute("UPDATE jobs SET heartbeat = heartbeat - ? WHERE id = ?", (seconds, job_id))
+    conn.close()
+
+
+def test_running_job_is_reclaimed_only_after_its_heartbeat_goes_stale(db_path, tmp_path):
+    create_job(db_path, "job1", "base", "upload:a.zip", str(tmp_path), 3)
+
+    job = claim_next_job(db_path, "host:1", stale_after=60)
+    assert (job["id"], job["status"], job["worker"]) == ("job1", "running", "host:1")
+    assert claim_next_job(db_path, "host:2", stale_after=60) is None
+
+    _age_heartbeat(db_path, "job1", 120)  # host:1 died
+    job = claim_next_job(db_path, "host:2", stale_after=60)
+    assert (job["id"], job["worker"]) == ("job1", "host:2")
+
+
+def test_done_indices_track_logged_results(db_path, tmp_path):
+    create_job(db_path, "job1", "base", "folder:x", str(tmp_path), 4)
+    log_job_results(db_path, "job1", [(0, "a.jpg", "{}"), (2, "c.jpg", "{}")], succeeded=2)
+    assert get_job_done_indices(db_path, "job1") == {0, 2}
+    assert get_job_done_indices(db_path, "other") == set()
+
+
+class _Slot:
+    """ModelSlot stand-in whose handle appears after `missing` acquire() calls."""
+
+    def __init__(self, missing=0):
+        self.name = "base"
+        self.missing = missing
+        self.handle = SimpleNamespace(model="m", model_type="vit", labels=["happy"], version="v1",
+                                      release=lambda: None)
+
+    def acquire(self):
+        if self.missing:
+            self.missing -= 1
+            return None
+        return self.handle
+
+
+class _Executor:
+    def queued(self, lane=None):
+        return 0
+
+    def run(self, fn, *args, **kwargs):
+        return fn(*args, **kwargs)
+
+
+@pytest.fixture
+def runner_for(db_path, tmp_path, monkeypatch):
+    batches = []
+    monkeypatch.setattr("app.vit_utils.preprocess_face_for_vit", lambda path: (f"crop:{path}", None))
+
+    def predict_faces(model, model_type, crops, labels):
+        batches.append(list(crops))
+        return [("happy", 0.9, {"happy": 0.9})] * len(crops)
+
+    monkeypatch.setattr("app.inference.predict_faces", predict_faces)
+
+    def build(slot, entries, **kwargs):
+        runner = JobRunner(db_path, str(tmp_path / "jobs"), {"base": slot}, {"base": _Executor()},
+                           batch_size=2, **kwargs)
+        job_dir = tmp_path / "jobs" / "job1"
+        job_dir.mkdir(parents=True)
+        (job_dir / jobs.MANIFEST).write_text(json.dumps(entries))
+        create_job(db_path, "job1", "base", "folder:x", str(job_dir), len(entries))
+        return runner, claim_next_job(db_path, runner.worker_id, 60)
+
+    return build, batches
+
+
+def test_resumed_job_skips_finished_indices(runner_for, db_path):
+    build, batches = runner_for
+    entries = [{"path": f"{i}.jpg", "file": f"{i}.jpg"} for i in range(5)]
+    runner, job = build(_Slot(), entries)
+    log_job_results(db_path, "job1", [(0, "0.jpg", "{}"), (3, "3.jpg", "{}")], succeeded=2)
+
+    runner._process(job)
+    assert batches == [["crop:1.jpg", "crop:2.jpg"], ["crop:4.jpg"]]
+    assert get_job_done_indices(db_path, "job1") == set(range(5))
+
+
+def test_chunk_waits_for_a_reloading_model_instead_of_failing(runner_for, db_path):
+    build, batches = runner_for
+    runner, job = build(_Slot(missing=1), [{"path": "a.jpg", "file": "a.jpg"}], model_wait=5)
+
+    runner._process(job)
+    assert batches == [["crop:a.jpg"]]
+    assert runner.stats()["model_waits"] == 1
+
+
+def test_job_fails_when_the_model_never_comes_back(runner_for):
+    build, _ = runner_for
+    runner, job = build(_Slot(missing=100), [{"path": "a.jpg", "file": "a.jpg"}], model_wait=0)
+    with pytest.raises(RuntimeError):
+        runner._process(job)
+
+
+def test_archive_entry_larger_than_declared_fails_only_itself(db_path, tmp_path):
+    buf = io.BytesIO()
+    with zipfile.ZipFile(buf, "w", zipfile.ZIP_DEFLATED) as zf:
+        zf.writestr("big.jpg", b"x" * 1000)
+        zf.writestr("ok.jpg", b"y" * 10)
+    data = bytearray(buf.getvalue())
+    # Understate big.jpg's size (100 bytes) in its local and central headers
+    struct.pack_into("<I", data, data.find(b"PK\x03\x04") + 22, 100)
+    struct.pack_into("<I", data, data.find(b"PK\x01\x02") + 24, 100)
+
+    runner = JobRunner(db_path, str(tmp_path / "jobs"), {}, {}, max_file_size=500)
+    job = runner.create_from_archive(SimpleNamespace(stream=io.BytesIO(bytes(data)), filename="a.zip"), "base")
+
+    with open(f"{job['job_dir']}/{jobs.MANIFEST}") as f:
+        entries = json.load(f)
+    assert entries[0]["file"] is None and "mismatch" in entries[0]["error"]
+    with open(entries[1]["file"], "rb") as f:
+        assert f.read() == b"y" * 10
@@ -0,0 +1,74 @@
+import copy
+
+import pytest
+
+torch = pytest.importorskip("torch")
+transformers = pytest.importorskip("transformers")
+
+from app.hardware import resolve_precision
+from app.model_delta import compute_delta, save_delta, build_delta_variant
+from app.model_loader import _apply_precision, build_delta_model
+
+
+def _tiny_vit():
+    config = transformers.ViTConfig(
+        image_size=32, patch_size=8, hidden_size=32, num_hidden_layers=2, num_attention_heads=2,
+        intermediate_size=64, num_labels=7,
+    )
+    torch.manual_seed(0)
+    return transformers.ViTForImageClassification(config).eval()
+
+
+@pytest.fixture
+def delta_dir(tmp_path):
+    base = _tiny_vit()
+    tuned = copy.deepcopy(base)
+    with torch.no_grad():
+        tuned.classifier.weight.add_(torch.randn_like(tuned.classifier.weight))
+        tuned.vit.encoder.layer[0].attention.attention.query.weight.mul_(1.5)
+    tensors, summary = compute_delta(base.state_dict(), tuned.state_dict())
+    save_delta(str(tmp_path), tensors, {"summary": summary})
+    return base, tuned, str(tmp_path)
+
+
+def _logits(model_dict, pixels):
+    model = model_dict["model"]
+    dtype = next(model.parameters()).dtype if model_dict["precision"] == "bf16" else torch.float32
+    with torch.no_grad():
+        return model(pixel_values=pixels.to(dtype)).logits.float()
+
+
+def test_fp32_variant_matches_tuned_and_shares_base_tensors(delta_dir):
+    base, tuned, path = delta_dir
+    variant = build_delta_variant(base, path)
+    pixels = torch.rand(2, 3, 32, 32)
+    with torch.no_grad():
+        assert torch.allclose(variant(pixel_values=pixels).logits, tuned(pixel_values=pixels).logits, atol=1e-5)
+    shared = {p.data_ptr() for p in base.parameters()} & {p.data_ptr() for p in variant.parameters()}
+    assert shared and len(shared) < len(list(base.parameters()))
+
+
+@pytest.mark.parametrize("precision", ["fp32", "bf16", "int8"])
+def test_variant_differs_from_base_under_every_precision(delta_dir, precision):
+    if resolve_precision(precision)[0] != precision:
+        pytest.skip(f"{precision} not supported on this host")
+    base, _tuned, path = delta_dir
+    # int8 variants are built on an fp32 base (see build_delta_model); the others share the served base
+    served_base = _apply_precision({"model": copy.deepcopy(base), "type": "vit"}, precision)
+    build_base = _apply_precision({"model": copy.deepcopy(base), "type": "vit"}, "fp32") \
+        if precision == "int8" else served_base
+    variant = build_delta_model(build_base, path, None, None, precision)
+
+    pixels = torch.rand(2, 3, 32, 32)
+    assert (_logits(variant, pixels) - _logits(served_base, pixels)).abs().max().item() > 1e-3
+
+
+def test_int8_variant_refuses_a_quantized_base(delta_dir):
+    base, _tuned, path = delta_dir
+    if resolve_precision("int8")[0] != "int8":
+        pytest.skip("int8 not supported on this host")
+    quantized = _apply_precision({"model": copy.deepcopy(base), "type": "vit"}, "int8")
+    with pytest.raises(ValueError):
+        build_delta_model(quantized, path, None, None, "int8")
+    with pytest.raises(ValueError):
+        build_delta_variant(quantized["model"], path)
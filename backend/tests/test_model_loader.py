@@ -0,0 +1,22 @@
+import os
+
+from app.model_loader import checkpoint_version
+
+
+def test_checkpoint_version_tracks_the_weights_on_disk(tmp_path):
+    (tmp_path / "config.json").write_text("{}")
+    weights = tmp_path / "model.safetensors"
+    weights.write_bytes(b"old weights")
+
+    version = checkpoint_version("asripa-vit", [tmp_path])
+    assert version.startswith("asripa-vit+")
+    assert checkpoint_version("asripa-vit", [tmp_path]) == version
+
+    weights.write_bytes(b"new weights!")
+    os.utime(weights, ns=(1, 1))
+    assert checkpoint_version("asripa-vit", [tmp_path]) != version
+
+
+def test_checkpoint_version_includes_extra_parts(tmp_path):
+    assert checkpoint_version("base", extra=["repo", "abc"]) != checkpoint_version("base", extra=["repo", "def"])
+    assert checkpoint_version("keras", [tmp_path / "missing.keras"]).startswith("keras+")
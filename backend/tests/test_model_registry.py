@@ -0,0 +1,39 @@
+from app.model_registry import ModelHandle, ModelSlot, unpack_model_result
+
+
+def test_unpack_model_result_normalizes_every_loader_shape():
+    assert unpack_model_result(("m", ["a"], "v2", "vit")) == ("m", ["a"], "v2", "vit")
+    assert unpack_model_result(("m", ["a"], "v1")) == ("m", ["a"], "v1", "keras")
+    assert unpack_model_result(("m", ["a"])) == ("m", ["a"], "unknown", "keras")
+    assert unpack_model_result("m") == ("m", None, "unknown", "keras")
+
+
+def test_reload_swaps_in_the_new_checkpoint_version():
+    versions = iter(["base+new"])
+    swaps = []
+    slot = ModelSlot(
+        "base",
+        lambda: ({"weights": 2}, ["happy"], next(versions), "custom"),
+        ModelHandle({"weights": 1}, ["happy"], "base+old", "custom"),
+        on_swap=lambda name, handle: swaps.append((name, handle.version)),
+    )
+    old = slot.acquire()
+
+    assert slot.reload(background=False)
+    status = slot.status()
+    assert (status["model_version"], status["reload_count"], status["last_reload_error"]) == ("base+new", 1, None)
+    assert swaps == [("base", "base+new")]
+    # The request still holding the old handle keeps its model until it releases it
+    assert old.model == {"weights": 1} and status["draining"] == 1
+    old.release()
+    assert old.model is None
+
+
+def test_failed_reload_keeps_the_current_model():
+    def broken_loader():
+        raise FileNotFoundError("checkpoint missing")
+
+    slot = ModelSlot("base", broken_loader, ModelHandle("m", [], "base+old", "custom"))
+    slot.reload(background=False)
+    assert slot.current.version == "base+old"
+    assert slot.status()["last_reload_error"] == "checkpoint missing"
@@ -0,0 +1,82 @@
+import threading
+import time
+
+import pytest
+
+from app.prediction_cache import PredictionCache, make_cache_key
+
+
+def test_cache_key_covers_serving_config():
+    base = {"model": "base", "precision": "fp32", "merge_ratios": {"base": 0.0}}
+    key = make_cache_key("abc", "v1", base)
+    assert key == make_cache_key("abc", "v1", dict(base))
+    assert key != make_cache_key("abc", "v1", {**base, "precision": "bf16"})
+    assert key != make_cache_key("abc", "v1", {**base, "merge_ratios": {"base": 0.25}})
+    assert key != make_cache_key("abc", "v2", base)
+
+
+def test_concurrent_misses_are_coalesced():
+    cache = PredictionCache(max_entries=8)
+    calls = []
+    release = threading.Event()
+
+    def compute():
+        calls.append(1)
+        release.wait(5)
+        return {"emotion": "happy"}
+
+    sources = []
+    threads = [threading.Thread(target=lambda: sources.append(cache.get_or_compute("k", compute)[1]))
+               for _ in range(4)]
+    for t in threads:
+        t.start()
+    time.sleep(0.1)
+    release.set()
+    for t in threads:
+        t.join()
+
+    assert len(calls) == 1
+    assert sorted(sources) == ["coalesced"] * 3 + ["computed"]
+    assert cache.get_or_compute("k", compute) == ({"emotion": "happy"}, "memory")
+
+
+def test_errors_are_not_cached():
+    cache = PredictionCache(max_entries=8)
+
+    def fail():
+        raise RuntimeError("boom")
+
+    with pytest.raises(RuntimeError):
+        cache.get_or_compute("k", fail)
+    assert cache.get_or_compute("k", lambda: 1) == (1, "computed")
+
+
+def test_disk_tier_survives_a_new_instance(tmp_path):
+    PredictionCache(max_entries=8, disk_dir=str(tmp_path)).put("k", {"emotion": "sad"})
+    cache = PredictionCache(max_entries=8, disk_dir=str(tmp_path))
+    assert cache.get_or_compute("k", lambda: None) == ({"emotion": "sad"}, "disk")
+
+    cache.invalidate()
+    assert PredictionCache(max_entries=8, disk_dir=str(tmp_path)).get("k") is None
+
+
+def test_result_computed_before_invalidate_is_not_stored(tmp_path):
+    cache = PredictionCache(max_entries=8, disk_dir=str(tmp_path))
+    started, release = threading.Event(), threading.Event()
+
+    def compute_with_old_model():
+        started.set()
+        release.wait(5)
+        return {"emotion": "stale"}
+
+    leader = threading.Thread(target=cache.get_or_compute, args=("k", compute_with_old_model))
+    leader.start()
+    assert started.wait(5)
+    cache.invalidate()  # model swapped while the leader was computing
+    # New requests compute afresh instead of coalescing onto the old computation
+    assert cache.get_or_compute("k", lambda: {"emotion": "fresh"}) == ({"emotion": "fresh"}, "computed")
+    release.set()
+    leader.join(5)
+
+    assert cache.get("k") == {"emotion": "fresh"}
+    assert PredictionCache(max_entries=8, disk_dir=str(tmp_path)).get("k") == {"emotion": "fresh"}
@@ -0,0 +1,51 @@
+import json
+
+import pytest
+
+from app import hardware
+from app.quality_profiles import DEFAULT_PROFILES, load_quality_profiles, resolve_profile_precision
+
+
+@pytest.fixture
+def native_bf16(monkeypatch):
+    monkeypatch.setattr(hardware, "supports_bf16", lambda: True)
+
+
+@pytest.fixture
+def no_bf16(monkeypatch):
+    monkeypatch.setattr(hardware, "supports_bf16", lambda: False)
+
+
+def test_overrides_merge_per_key_and_new_profiles_inherit_balanced(tmp_path, native_bf16):
+    path = tmp_path / "profiles.json"
+    path.write_text(json.dumps({"Accurate": {"detect_max_dim": 1600}, "tiny": {"detector": "quick"}}))
+    profiles = load_quality_profiles({"accurate": {"tta": False}}, str(path))
+
+    accurate = profiles["accurate"]
+    assert (accurate["detect_max_dim"], accurate["tta"], accurate["model"]) == (1600, False, "base")
+    assert profiles["tiny"]["detector"] == "quick"
+    assert profiles["tiny"]["detect_max_dim"] == DEFAULT_PROFILES["balanced"]["detect_max_dim"]
+
+
+@pytest.mark.parametrize("bad", [{"detector": "deep"}, {"precision": "fp8"}, {"detect_max_dim": 10},
+                                 {"pad_ratio": 1.5}])
+def test_invalid_profiles_are_rejected(bad):
+    with pytest.raises(ValueError):
+        load_quality_profiles({"custom": bad})
+
+
+def test_profile_precision_falls_back_without_native_bf16(no_bf16):
+    profiles = load_quality_profiles({"custom": {"precision": "bf16"}})
+    assert (profiles["custom"]["precision"], profiles["custom"]["requested_precision"]) == ("fp32", "bf16")
+    assert profiles["balanced"]["precision"] == "fp32"
+
+
+def test_profile_precision_follows_the_loaded_weights(native_bf16):
+    # fp32 cannot be restored once the weights were cast at load time
+    assert resolve_profile_precision("fp32", "bf16") == ("bf16", "weights are loaded as bf16")
+    assert resolve_profile_precision("bf16", "int8")[0] == "int8"
+    assert resolve_profile_precision(None, "int8") == ("int8", None)
+    assert resolve_profile_precision("bf16", "fp32") == ("bf16", None)
+
+    profiles = load_quality_profiles(weight_precision="bf16")
+    assert {p["precision"] for p in profiles.values()} == {"bf16"}
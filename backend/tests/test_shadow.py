@@ -0,0 +1,70 @@
+from types import SimpleNamespace
+
+import pytest
+
+from app import shadow
+from app.shadow import ShadowEvaluator
+
+
+class _Slot:
+    name = "fine-tuned"
+
+    def __init__(self, loaded=True):
+        self.released = 0
+        self.handle = SimpleNamespace(model="m", model_type="vit", labels=["happy"], version="ft-1",
+                                      release=self._release) if loaded else None
+
+    def _release(self):
+        self.released += 1
+
+    def acquire(self):
+        return self.handle
+
+
+def test_sampling_rate_decides_what_is_queued(monkeypatch):
+    evaluator = ShadowEvaluator(_Slot(), "unused.db", sample_rate=0.25, queue_size=10)
+    draws = iter([0.1, 0.3, 0.24, 0.25])
+    monkeypatch.setattr(shadow.random, "random", lambda: next(draws))
+
+    assert [evaluator.submit("face", {}) for _ in range(4)] == [True, False, True, False]
+    assert evaluator.stats()["submitted"] == 2
+
+    assert ShadowEvaluator(_Slot(), "unused.db", sample_rate=0).submit("face", {}) is False
+
+
+def test_full_queue_drops_instead_of_blocking():
+    evaluator = ShadowEvaluator(_Slot(), "unused.db", sample_rate=1.0, queue_size=2)  # not started: nothing drains
+
+    assert [evaluator.submit("face", {}) for _ in range(4)] == [True, True, False, False]
+    stats = evaluator.stats()
+    assert (stats["submitted"], stats["dropped"], stats["queue_depth"]) == (2, 2, 2)
+
+
+@pytest.fixture
+def logged(monkeypatch):
+    rows = []
+    monkeypatch.setattr("app.inference.predict_face", lambda model, model_type, face, labels: ("sad", 0.7, {}))
+    monkeypatch.setattr("app.db_logger.log_shadow_prediction", lambda db_path, row: rows.append(row))
+    return rows
+
+
+def test_worker_scores_queued_crops_and_logs_the_comparison(logged):
+    slot = _Slot()
+    evaluator = ShadowEvaluator(slot, "unused.db", sample_rate=1.0).start()
+    evaluator.submit("face", {"filename": "a.jpg", "model_version": "base-1", "emotion": "happy", "confidence": 0.9})
+    evaluator.queue.join()
+
+    assert len(logged) == 1
+    row = logged[0]
+    assert (row["primary_emotion"], row["shadow_emotion"], row["shadow_model_version"]) == ("happy", "sad", "ft-1")
+    assert row["shadow_latency_ms"] >= 0
+    assert evaluator.stats()["processed"] == 1 and slot.released == 1
+
+
+def test_unloaded_shadow_model_is_skipped(logged):
+    evaluator = ShadowEvaluator(_Slot(loaded=False), "unused.db", sample_rate=1.0).start()
+    evaluator.submit("face", {})
+    evaluator.queue.join()
+
+    stats = evaluator.stats()
+    assert logged == [] and stats["processed"] == 0 and stats["errors"] == 0
@@ -0,0 +1,62 @@
+import threading
+
+import pytest
+
+from app.side_effects import SideEffectQueue
+
+
+def test_sync_mode_runs_steps_in_order_before_returning():
+    calls = []
+    queue = SideEffectQueue(mode="sync")
+    queue.submit("t", (calls.append, (1,)), (calls.append, (2,)))
+    assert calls == [1, 2]
+    assert queue.stats()["completed"] == 1
+
+
+def test_async_mode_runs_on_flush():
+    calls = []
+    queue = SideEffectQueue(mode="async")
+    queue.submit("t", (calls.append, ("a",)))
+    assert queue.flush(timeout=5)
+    assert calls == ["a"]
+
+
+def test_failed_step_is_retried_and_later_steps_still_run():
+    attempts, calls = [], []
+
+    def flaky():
+        attempts.append(1)
+        if len(attempts) < 3:
+            raise OSError("disk busy")
+
+    def broken():
+        raise OSError("gone")
+
+    queue = SideEffectQueue(mode="sync", retries=2, retry_backoff=0.001)
+    queue.submit("ok", (flaky, ()), (calls.append, ("logged",)))
+    queue.submit("bad", (broken, ()), (calls.append, ("logged anyway",)))
+
+    stats = queue.stats()
+    assert len(attempts) == 3
+    assert calls == ["logged", "logged anyway"]
+    assert (stats["completed"], stats["failed"], stats["retried"]) == (1, 1, 4)
+
+
+def test_full_queue_runs_the_task_inline():
+    started, release = threading.Event(), threading.Event()
+    calls = []
+    queue = SideEffectQueue(mode="async", queue_size=1)
+    queue.submit("block", (started.set, ()), (release.wait, (5,)))
+    assert started.wait(5)
+    # The worker is busy with the first task: one task fills the queue, the next overflows
+    queue.submit("fill", (calls.append, ("queued",)))
+    queue.submit("overflow", (calls.append, ("inline",)))
+    assert calls == ["inline"]
+    assert queue.stats()["inline"] == 1
+    release.set()
+    assert queue.flush(timeout=5)
+
+
+def test_unknown_mode_is_rejected():
+    with pytest.raises(ValueError):
+        SideEffectQueue(mode="later")
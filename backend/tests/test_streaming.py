@@ -0,0 +1,35 @@
+import threading
+import time
+
+from app.streaming import LatestFrameMailbox
+
+
+def test_mailbox_keeps_only_the_newest_frame():
+    mailbox = LatestFrameMailbox()
+    assert mailbox.put(1) is True
+    assert mailbox.put(2) is False
+    assert mailbox.dropped == 1
+    assert mailbox.get() == 2
+
+
+def test_mailbox_get_ignores_wakeups_without_a_frame():
+    mailbox = LatestFrameMailbox()
+    got = []
+    reader = threading.Thread(target=lambda: got.append(mailbox.get()))
+    reader.start()
+    time.sleep(0.05)
+    with mailbox._cond:
+        mailbox._cond.notify_all()  # wakeup with no frame and no close
+    time.sleep(0.05)
+    assert reader.is_alive() and not got
+
+    mailbox.put("frame")
+    reader.join(1)
+    assert got == ["frame"]
+
+
+def test_mailbox_returns_none_once_closed():
+    mailbox = LatestFrameMailbox()
+    assert mailbox.get(timeout=0.01) is None
+    mailbox.close()
+    assert mailbox.get() is None
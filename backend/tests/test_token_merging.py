@@ -0,0 +1,70 @@
+import copy
+
+import pytest
+
+torch = pytest.importorskip("torch")
+transformers = pytest.importorskip("transformers")
+
+from app.token_merging import (
+    MAX_MERGE_RATIO, _merge_weighted, bipartite_soft_matching, enable_token_merging, token_merging,
+    validate_merge_ratio,
+)
+
+
+def _tiny_vit():
+    config = transformers.ViTConfig(
+        image_size=32, patch_size=4, hidden_size=32, num_hidden_layers=3, num_attention_heads=2,
+        intermediate_size=64, num_labels=7,
+    )
+    torch.manual_seed(0)
+    return transformers.ViTForImageClassification(config).eval()
+
+
+@pytest.mark.parametrize("value, expected", [(None, 0.0), ("", 0.0), ("0.25", 0.25), ("0", 0.0)])
+def test_validate_merge_ratio_accepts(value, expected):
+    assert validate_merge_ratio(value) == (expected, None)
+
+
+@pytest.mark.parametrize("value", ["abc", "-0.1", str(MAX_MERGE_RATIO)])
+def test_validate_merge_ratio_rejects(value):
+    assert validate_merge_ratio(value)[1]
+
+
+def test_matching_merges_r_tokens_and_keeps_the_class_token_first():
+    torch.manual_seed(0)
+    x = torch.randn(2, 17, 8)
+    merge = bipartite_soft_matching(x, r=5)
+    merged, size = _merge_weighted(merge, x, torch.ones(2, 17, 1))
+
+    assert merged.shape == (2, 12, 8)
+    assert torch.equal(merged[:, 0], x[:, 0])
+    assert torch.equal(size.sum(dim=1), torch.full((2, 1), 17.0))  # every token is accounted for once
+    assert torch.allclose((merged * size).sum(dim=1), x.sum(dim=1), atol=1e-5)
+
+
+def test_matching_without_merges_is_the_identity():
+    x = torch.randn(1, 5, 4)
+    assert bipartite_soft_matching(x, r=0)(x) is x
+    assert bipartite_soft_matching(x[:, :2], r=3)(x[:, :2]).shape == (1, 2, 4)
+
+
+def test_patched_vit_merges_tokens_only_inside_the_context():
+    model = _tiny_vit()
+    reference = copy.deepcopy(model)
+    assert enable_token_merging(model) and enable_token_merging(model)
+
+    seen = []
+    model.vit.encoder.layer[-1].layernorm_after.register_forward_hook(lambda m, i, o: seen.append(o.shape[1]))
+    pixels = torch.rand(2, 3, 32, 32)
+    with torch.no_grad():
+        expected = reference(pixel_values=pixels).logits
+        assert torch.allclose(model(pixel_values=pixels).logits, expected, atol=1e-6)
+        with token_merging(0.25):
+            merged = model(pixel_values=pixels).logits
+
+    assert seen[0] == 65 and seen[1] < 65
+    assert merged.shape == expected.shape and torch.isfinite(merged).all()
+
+
+def test_models_without_a_vit_encoder_are_left_alone():
+    assert enable_token_merging(torch.nn.Linear(4, 4)) is False
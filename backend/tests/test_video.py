@@ -0,0 +1,74 @@
+import pytest
+
+from app import video
+from app.video import _segment_summary, analyze_video
+
+LABELS = ["happy", "sad"]
+
+
+def _point(t, emotion=None):
+    point = {"frame": int(t * 10), "t": t}
+    if emotion:
+        probs = {"happy": 0.8, "sad": 0.2} if emotion == "happy" else {"happy": 0.3, "sad": 0.7}
+        point.update({"emotion": emotion, "confidence": max(probs.values()), "all_probabilities": probs})
+    return point
+
+
+def test_segment_summary_averages_faces_and_counts_frames():
+    summary = _segment_summary(1.0, 2.0, [_point(1.0, "happy"), _point(1.5, "sad"), _point(1.8)], LABELS)
+    assert (summary["start"], summary["end"], summary["frames"], summary["faces"]) == (1.0, 2.0, 3, 2)
+    assert summary["emotion"] == "happy" and summary["confidence"] == 0.55
+    assert summary["counts"] == {"happy": 1, "sad": 1}
+
+
+def test_segment_summary_without_faces():
+    summary = _segment_summary(0.0, 1.0, [_point(0.2)], LABELS)
+    assert (summary["emotion"], summary["confidence"], summary["counts"]) == (None, None, {})
+
+
+class _Handle:
+    model, model_type, labels = object(), "vit", LABELS
+
+
+class _InlineExecutor:
+    def run(self, fn, *args, **kwargs):
+        return fn(*args, **kwargs)
+
+
+@pytest.fixture
+def fake_pipeline(monkeypatch):
+    """Frames at the given timestamps, each with a face classified as happy."""
+    times = []
+
+    def decode(path, stride, max_frames, out, stop, info):
+        info.update(fps=10.0, frame_count=len(times), frames_decoded=len(times))
+        for i, t in enumerate(times):
+            video._put(out, (i, t, "frame"), stop)
+        video._put(out, video._DONE, stop)
+
+    def detect(inp, out, stop):
+        while (item := inp.get()) is not video._DONE:
+            video._put(out, (item[0], item[1], "crop"), stop)
+        video._put(out, item, stop)
+
+    monkeypatch.setattr(video, "_decode", decode)
+    monkeypatch.setattr(video, "_detect", detect)
+    monkeypatch.setattr("app.inference.predict_faces",
+                        lambda model, model_type, crops, labels: [("happy", 0.8, {"happy": 0.8, "sad": 0.2})] * len(crops))
+    return times
+
+
+def test_points_land_in_their_segment_and_empty_segments_are_skipped(fake_pipeline):
+    fake_pipeline.extend([0.0, 0.9, 1.0, 4.5, 3599.9])
+    result = analyze_video("clip.mp4", _Handle(), _InlineExecutor(), segment_seconds=1.0, batch_size=2)
+
+    assert [(s["start"], s["end"], s["frames"]) for s in result["segments"]] == [
+        (0.0, 1.0, 2), (1.0, 2.0, 1), (4.0, 5.0, 1), (3599.0, 3600.0, 1),
+    ]
+    assert result["frames_with_face"] == 5
+
+
+def test_tiny_segments_do_not_step_through_every_boundary(fake_pipeline):
+    fake_pipeline.extend([0.0, 60.0])
+    result = analyze_video("clip.mp4", _Handle(), _InlineExecutor(), segment_seconds=1e-9, include_frames=False)
+    assert len(result["segments"]) == 2 and "frames" not in result